@@ -0,0 +1,57 @@
+"""
+Per call overhead of cooking a pipeline with `obj` against running its compiled plan
+
+    python -m benchmarks.compiled_pipeline --stages 30 --rows 10 --runs 200
+
+The overhead is the time per run beyond calling the stage functions directly.
+"""
+import argparse
+import json
+import time
+
+import pandas as pd
+
+from maeve import Session
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stages", type=int, default=30)
+    parser.add_argument("--rows", type=int, default=10)
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    s = Session(conf=json.dumps({"env": {"load_package_recipes": []}}))
+    recipe = {"recipe_type": "pipeline", "pipeline": {
+        f"stage_{i}": {"function": "rename", "kwargs": {"columns": {"a": "b", "b": "a"}}}
+        for i in range(args.stages)
+    }}
+    df = pd.DataFrame({"a": range(args.rows), "b": range(args.rows)})
+
+    def direct(obj):
+        for _ in range(args.stages):
+            obj = obj.rename(columns={"a": "b", "b": "a"})
+        return obj
+
+    start = time.perf_counter()
+    plan = s.compile(recipe)
+    compile_time = time.perf_counter() - start
+
+    timings = {}
+    for name, fn in [("direct", direct),
+                     ("cook", lambda obj: s.cook(recipe, obj=obj, add_to_catalogue=False)),
+                     ("compiled", plan)]:
+        fn(df)
+        start = time.perf_counter()
+        for _ in range(args.runs):
+            fn(df)
+        timings[name] = (time.perf_counter() - start) / args.runs
+
+    print(f"{args.stages} stages, {args.rows} rows, compiled in {compile_time * 1e3:.2f}ms")
+    for name, t in timings.items():
+        overhead = t - timings["direct"]
+        print(f"{name:<10}{t * 1e3:>10.3f}ms per run{overhead * 1e6:>12.1f}us overhead")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Cold vs. warm recipe book startup using the Confscade snapshot cache
+
+    python -m benchmarks.confscade_startup --files 2000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from maeve.conf import Confscade
+from benchmarks.synthetic import write_recipe_book
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    ret = func(*args, **kwargs)
+    return ret, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=1000)
+    parser.add_argument("--recipes-per-file", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.join(tmp, "recipes")
+        cache = os.path.join(tmp, "cache")
+        files = write_recipe_book(root, args.files, args.recipes_per_file)
+
+        _, no_cache = timed(Confscade, root)
+        _, cold = timed(Confscade, root, cache_dir=cache)
+        _, warm = timed(Confscade, root, cache_dir=cache)
+
+        with open(files[len(files) // 2], "a") as fh:
+            fh.write("\n")
+        os.utime(files[0])
+        with open(files[-1], "a") as fh:
+            fh.write("\n# edited\n")
+        _, warm_changed = timed(Confscade, root, cache_dir=cache)
+
+        print(f"{args.files} files, {args.files * (args.recipes_per_file + 1)} recipes")
+        print(f"{'no cache':<28}{no_cache:>9.3f}s")
+        print(f"{'cold (writes snapshot)':<28}{cold:>9.3f}s")
+        print(f"{'warm':<28}{warm:>9.3f}s")
+        print(f"{'warm, 2 files changed':<28}{warm_changed:>9.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Throughput of cooking a list of independent loader recipes in parallel by worker count
+
+    python -m benchmarks.list_cook --recipes 50 --workers 1 2 4 8 16 --latency 0.05
+
+Each load is given `latency` seconds of extra wait, standing in for the time spent
+waiting on network or object storage, which is what the thread pool overlaps.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from maeve import Session
+
+
+def write_loader_book(root: str, n: int, rows: int) -> list:
+    recipes = {}
+    for i in range(n):
+        path = os.path.join(root, f"{i}.csv")
+        pd.DataFrame({"i": range(rows), "x": [i * 0.5] * rows}).to_csv(path, index=False)
+        recipes[f"Load{i}"] = {"recipe_type": "data_loader", "backend": "pandas", "function": "read_csv",
+                               "location": path, "result_cache": False}
+    with open(os.path.join(root, "recipes.hjson"), "w") as fh:
+        json.dump(recipes, fh)
+    return list(recipes.keys())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--recipes", type=int, default=50)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    read_csv = pd.read_csv
+
+    def read_csv_with_latency(*a, **kw):
+        time.sleep(args.latency)
+        return read_csv(*a, **kw)
+    pd.read_csv = read_csv_with_latency
+
+    with tempfile.TemporaryDirectory() as tmp:
+        names = write_loader_book(tmp, args.recipes, args.rows)
+        conf = json.dumps({"env": {"recipes_root": tmp, "load_package_recipes": []}})
+        print(f"{len(names)} recipes, {os.cpu_count()} cpus, {args.latency}s latency")
+
+        s = Session(conf=conf)
+        start = time.perf_counter()
+        s.cook(names, use_from_catalogue=False, add_to_catalogue=False)
+        serial = time.perf_counter() - start
+        print(f"{'sequence':<10}{'':>8}{serial:>9.2f}s{'1.00x':>8}")
+
+        for w in args.workers:
+            s = Session(conf=conf)
+            start = time.perf_counter()
+            s.cook(names, list_mode="parallel", workers=w, use_from_catalogue=False, add_to_catalogue=False)
+            t = time.perf_counter() - start
+            print(f"{'parallel':<10}{w:>8}{t:>9.2f}s{serial / t:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
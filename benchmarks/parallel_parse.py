@@ -0,0 +1,42 @@
+"""
+Recipe file parse throughput by worker count on a synthetic recipe tree
+
+    python -m benchmarks.parallel_parse --files 10000 --workers 1 2 4 8
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from maeve.util.os import FSUtils
+from benchmarks.synthetic import write_recipe_book
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=10000)
+    parser.add_argument("--recipes-per-file", type=int, default=2)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--executors", nargs="+", default=["process", "thread"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files = write_recipe_book(tmp, args.files, args.recipes_per_file)
+        print(f"{len(files)} files, {os.cpu_count()} cpus")
+
+        start = time.perf_counter()
+        for f in files:
+            FSUtils.read_conf_file(f)
+        serial = time.perf_counter() - start
+        print(f"{'serial':<10}{'':>8}{serial:>9.2f}s{'1.00x':>8}")
+
+        for executor in args.executors:
+            for w in args.workers:
+                start = time.perf_counter()
+                FSUtils.read_conf_files(files, workers=w, executor=executor)
+                t = time.perf_counter() - start
+                print(f"{executor:<10}{w:>8}{t:>9.2f}s{serial / t:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Recipe file parse throughput per parser backend, on the package recipe book and on a
+synthetic book. Each HJSON file is also converted to JSON so the JSON backends can be
+compared on the same contents.
+
+    python -m benchmarks.parsers --files 2000 --repeat 50
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from maeve.models.core import GlobalConst
+from maeve.util.os import FSUtils, JSON_BACKENDS
+from benchmarks.synthetic import write_recipe_book
+
+
+def package_recipe_files() -> list:
+    g = GlobalConst()
+    roots = [v for k, v in g.package_paths.items() if k != "_package_root"]
+    files = []
+    for r in roots:
+        files.extend(FSUtils.os_walk_and_filter(r, fileregex=r".+\.hjson$"))
+    return sorted(set(files))
+
+
+def copy_as_json(files: list, root: str) -> list:
+    out = []
+    for i, f in enumerate(files):
+        j = os.path.join(root, f"{i:05d}.json")
+        with open(j, "w") as fh:
+            json.dump(FSUtils.read_conf_file(f), fh)
+        out.append(j)
+    return out
+
+
+def timed(files: list, repeat: int, **kwargs) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for f in files:
+            FSUtils.read_conf_file(f, **kwargs)
+    return time.perf_counter() - start
+
+
+def report(label: str, files: list, repeat: int, t: float):
+    mb = sum(os.path.getsize(f) for f in files) * repeat / 1e6
+    print(f"  {label:<22}{t:>9.3f}s{len(files) * repeat / t:>12.0f} files/s{mb / t:>9.1f} MB/s")
+
+
+def bench(name: str, hjson_files: list, repeat: int):
+    print(f"{name}: {len(hjson_files)} files x {repeat}")
+    with tempfile.TemporaryDirectory() as tmp:
+        local = []
+        for i, f in enumerate(hjson_files):
+            dst = os.path.join(tmp, f"{i:05d}.hjson")
+            shutil.copyfile(f, dst)
+            local.append(dst)
+        report("hjson", local, repeat, timed(local, repeat))
+        report("hjson compiled (cold)", local, 1, timed(local, 1, compiled_cache=True))
+        report("hjson compiled (warm)", local, repeat, timed(local, repeat, compiled_cache=True))
+
+        json_dir = os.path.join(tmp, "json")
+        os.makedirs(json_dir)
+        json_files = copy_as_json(local, json_dir)
+        for backend, loads in JSON_BACKENDS.items():
+            if not loads:
+                print(f"  json ({backend}) not installed")
+                continue
+            FSUtils.set_json_backend(backend)
+            report(f"json ({backend})", json_files, repeat, timed(json_files, repeat))
+        FSUtils.set_json_backend()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=2000, help="files in the synthetic book")
+    parser.add_argument("--recipes-per-file", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=50, help="passes over the package recipe book")
+    args = parser.parse_args()
+
+    bench("package recipe book", package_recipe_files(), args.repeat)
+    with tempfile.TemporaryDirectory() as tmp:
+        bench("synthetic recipe book", write_recipe_book(tmp, args.files, args.recipes_per_file), 1)
+
+
+if __name__ == "__main__":
+    main()
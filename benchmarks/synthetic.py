@@ -0,0 +1,60 @@
+"""
+Generators for synthetic recipe books used by the benchmarks
+"""
+import os
+import random
+
+
+def recipe_hjson(file_no: int, recipe_no: int, n_recipes: int) -> str:
+    name = f"Recipe_{file_no}_{recipe_no}"
+    lines = [
+        f"  {name}: {{",
+        f"    # synthetic recipe {recipe_no} of file {file_no}",
+        "    recipe_type: pipeline",
+        f"    description: Synthetic recipe number {recipe_no}",
+        "    pipeline: {",
+        "      load: {",
+        "        recipe_type: data_loader",
+        "        backend: pandas",
+        "        function: read_csv",
+        f"        location: @Location_{file_no}",
+        "      }",
+        "      rename: {",
+        "        function: rename",
+        f'        kwargs: {{ columns: {{ col_{recipe_no}: "renamed_{recipe_no}" }} }}',
+        "      }",
+        "    }",
+    ]
+    if recipe_no > 0:
+        lines.append(f"    inherits: Recipe_{file_no}_{random.randrange(recipe_no)}")
+    lines.append("  }")
+    return "\n".join(lines)
+
+
+def write_recipe_book(root: str, n_files: int, recipes_per_file: int = 5, seed: int = 0) -> list:
+    """
+    Writes `n_files` HJSON recipe files under `root`, spread over sub directories of
+    100 files each. Every file has a location recipe that its other recipes anchor to,
+    and recipes inherit from earlier recipes in the same file.
+
+    Returns
+    -------
+    The list of files written
+    """
+    random.seed(seed)
+    files = []
+    for i in range(n_files):
+        d = os.path.join(root, f"dir_{i // 100:04d}")
+        os.makedirs(d, exist_ok=True)
+        body = [
+            "{",
+            '  default: { metadata: { owner: "benchmarks" } }',
+            f'  Location_{i}: {{ recipe_type: "location", path: "file_{i}.csv" }}',
+        ]
+        body.extend(recipe_hjson(i, j, recipes_per_file) for j in range(recipes_per_file))
+        body.append("}")
+        f = os.path.join(d, f"recipes_{i:05d}.hjson")
+        with open(f, "w") as fh:
+            fh.write("\n".join(body))
+        files.append(f)
+    return files
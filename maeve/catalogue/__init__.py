@@ -0,0 +1,567 @@
+import hashlib
+import os
+import re
+import string
+import sys
+import threading
+from copy import deepcopy
+from datetime import datetime, timedelta
+from typing import Any, Optional, Literal, Union
+
+import pandas
+import polars as pl
+from pydantic import BaseModel
+
+from maeve.catalogue.eviction import EvictionPolicy, get_policy
+from maeve.catalogue.index import CatalogueIndex
+from maeve.catalogue.lazy import LazyHandle
+from maeve.catalogue.fingerprint import FingerprintCache, Hashers, register_hasher, version_token
+from maeve.catalogue.results import ResultCache
+from maeve.catalogue.spill import SpillStore
+from maeve.models.core import CatalogueConf, parse_bytes
+from maeve.util.concurrency import AsyncSingleFlight, SingleFlight, locked
+from maeve.util.dict import DictUtils
+from maeve.util.recipe import RecipeUtils
+
+
+class CatalogueItemModel(BaseModel):
+    obj: Any
+    id: Optional[str] = None
+    name: Optional[str] = None
+    recipe_hash: Optional[str] = None
+    raw_recipe_hash: Optional[str] = None
+    obj_hash: Optional[str] = None
+    metadata: Optional[dict] = None
+    # the qualified name of the object's type, e.g. "pandas.core.frame.DataFrame"
+    obj_type: Optional[str] = None
+    # the names of the recipes the object was cooked from
+    lineage: list = []
+    size: int = 0
+    pinned: bool = False
+    cook_time: Optional[float] = None
+    hits: int = 0
+    last_access: int = 0
+    # where the object was written when it was evicted, if it's not in memory
+    spill: Optional[dict] = None
+
+
+class Catalogue:
+
+    def __init__(self, logger, conf: CatalogueConf = None):
+        """
+        Parameters
+        ----------
+        logger: object
+            A maeve logger instance
+        conf: CatalogueConf
+            The memory budget and eviction policy. By default the catalogue is unbounded.
+        """
+        self.log = logger
+        self.alpha = string.ascii_lowercase + string.digits
+        self.obj = {}
+        self.names = {}
+        self.hashes = {}
+        self.index = CatalogueIndex()
+
+        self.memory_used = 0
+        self._clock = 0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "evicted_bytes": 0, "spills": 0, "reloads": 0}
+        self.conf = None
+        self.policy = None
+        self.spill = None
+        self.results = None
+        self.fingerprints = FingerprintCache()
+        # guards the indexes, memory accounting and stats. Hashing and copying objects is
+        # done outside of it.
+        self._lock = threading.RLock()
+        # deduplicates concurrent cooks of the same recipe, see Session.cook
+        self.flights = SingleFlight()
+        # and the same for Session.acook
+        self.aflights = AsyncSingleFlight()
+        self.configure(conf if conf else CatalogueConf())
+
+    @locked
+    def configure(self, conf: CatalogueConf, policy: EvictionPolicy = None):
+        """
+        Sets the memory budget, eviction policy and persistent result cache, evicting items
+        straight away if the catalogue is already over the new budget
+
+        Parameters
+        ----------
+        conf: CatalogueConf
+        policy: EvictionPolicy
+            An eviction policy instance to use instead of conf.eviction_policy
+        """
+        if conf.copy_mode == "cow" and not pandas.get_option("mode.copy_on_write"):
+            # shallow copies are only independent of the original with copy on write, which is a
+            # global pandas option, so it's left to the user to turn on
+            raise ValueError('copy_mode "cow" needs pandas\' copy on write mode, '
+                             'i.e. pandas.set_option("mode.copy_on_write", True)')
+        self.conf = conf
+        self.policy = get_policy(policy if policy else conf.eviction_policy)
+        spill_dir = os.path.expanduser(conf.spill_dir) if conf.spill_dir else None
+        if self.spill and (self.spill.root, self.spill.fmt, self.spill.memory_map) != (
+                spill_dir, conf.spill_format, conf.spill_memory_map):
+            # bring back anything in the old store before it's removed
+            for item in list(self.obj.values()):
+                if item.spill:
+                    self._load(item, enforce=False)
+            self.spill.close()
+            self.spill = None
+        if spill_dir and not self.spill:
+            self.spill = SpillStore(spill_dir, fmt=conf.spill_format, memory_map=conf.spill_memory_map)
+        if conf.result_cache_dir:
+            self.results = ResultCache(
+                conf.result_cache_dir,
+                max_bytes=conf.result_cache_max_bytes,
+                fmt=conf.spill_format,
+                memory_map=conf.result_cache_memory_map,
+                content_hash=conf.result_cache_content_hash
+            )
+        else:
+            self.results = None
+        self.enforce_budget()
+
+    def copy_obj(self, obj: Any) -> Any:
+        """
+        Copies an object that is being added to the catalogue, according to conf.copy_mode
+        """
+        if self.conf.copy_mode == "cow":
+            if isinstance(obj, (pandas.DataFrame, pandas.Series)):
+                return obj.copy(deep=False)
+            if isinstance(obj, (pl.DataFrame, pl.Series, pl.LazyFrame)):
+                # polars objects are immutable
+                return obj
+        return deepcopy(obj)
+
+    def _share(self, obj: Any) -> Any:
+        # in cow mode pandas objects are handed out as shallow copies, so that changes made
+        # by the caller are never seen by the catalogue (or anyone else that has it)
+        if self.conf.copy_mode == "cow" and isinstance(obj, (pandas.DataFrame, pandas.Series)):
+            return obj.copy(deep=False)
+        return obj
+
+    def add(self,
+            obj: Any,
+            recipe: dict = None,
+            name: str = None,
+            metadata: dict = None,
+            on_exists: Literal["return", "replace"] = "replace",
+            copy_obj: bool = True,
+            hash_recipe_with_obj: bool = True,
+            return_item: Literal["id", "object"] = "id",
+            cook_time: float = None,
+            pin: bool = False,
+            fingerprint: Literal["exact", "sampled"] = None,
+            recipe_hash: str = None,
+            lineage: list = None
+            ):
+
+        # to get round the whole truth of df is ambiguous thing
+        have_obj = True if obj is not None else False
+
+        obj_hash = None
+        if have_obj:
+            # hash before copying so that the fingerprint is cached against the caller's object
+            try:
+                obj_hash = self.generate_obj_hash(obj, fingerprint=fingerprint)
+            except ValueError:
+                obj_hash = None
+            if copy_obj:
+                obj = self.copy_obj(obj)
+
+        if recipe:
+            # callers that already have the recipe's hash (e.g. from Confscade.get) can pass it
+            recipe_hash = recipe_hash if recipe_hash else self.generate_obj_hash(recipe)
+            raw_recipe_hash = recipe_hash
+            if on_exists == "return":
+                try:
+                    return self.get(recipe_hash, method="hash")
+                except ValueError:
+                    pass
+                if have_obj and hash_recipe_with_obj:
+                    self.log.debug("Using recipe + obj recipe_hash")
+                    recipe_hash = recipe_hash + obj_hash
+        else:
+            self.log.debug("No recipe_hash generated")
+            recipe_hash = raw_recipe_hash = None
+
+        metadata = self.generate_metadata(metadata)
+        catalogue_item = CatalogueItemModel(
+            obj=obj,
+            name=name,
+            recipe_hash=recipe_hash,
+            raw_recipe_hash=raw_recipe_hash,
+            obj_hash=obj_hash,
+            metadata=metadata,
+            obj_type=CatalogueIndex.type_name(type(obj)) if have_obj else None,
+            lineage=sorted(set(lineage)) if lineage else [],
+            size=self.sizeof(obj) if have_obj else 0,
+            pinned=pin,
+            cook_time=cook_time
+        )
+        key = self._add(catalogue_item)
+        if return_item == "id":
+            return key
+        else:
+            return catalogue_item
+
+    @locked
+    def _add(self, item):
+        key = DictUtils.generate_random_key(charset=self.alpha)
+        item.id = key
+        self.obj[key] = item
+        self.names[item.name] = item
+        self.hashes[item.recipe_hash] = item
+        self.hashes[item.obj_hash] = item
+        self.index.add(item)
+        self.memory_used += item.size
+        self._touch(item, hit=False)
+        self.enforce_budget(keep=item)
+        return key
+
+    @locked
+    def remove(self, catalogue_id: str):
+        item = self.obj.pop(catalogue_id)
+        if item.spill:
+            self.spill.delete(item.spill)
+        else:
+            self.memory_used -= item.size
+        if self.names.get(item.name) is item:
+            del self.names[item.name]
+        for h in [item.recipe_hash, item.obj_hash]:
+            if self.hashes.get(h) is item:
+                del self.hashes[h]
+        self.index.remove(item)
+        return item
+
+    @locked
+    def remove_by_name(self, names: list) -> list:
+        """
+        Removes all items with any of the given names, e.g. items cooked from recipes that
+        have since changed. Returns the ids of the removed items.
+        """
+        names = set(names)
+        ids = [k for k, v in self.obj.items() if v.name in names]
+        for i in ids:
+            self.remove(i)
+        return ids
+
+    @locked
+    def pin(self, catalogue_id: str, pinned: bool = True):
+        """
+        Pinned items are never evicted
+        """
+        self.obj[catalogue_id].pinned = pinned
+
+    def unpin(self, catalogue_id: str):
+        self.pin(catalogue_id, pinned=False)
+
+    def _touch(self, item, hit: bool = True):
+        self._clock += 1
+        item.last_access = self._clock
+        if hit:
+            item.hits += 1
+
+    @locked
+    def enforce_budget(self, keep: CatalogueItemModel = None) -> list:
+        """
+        Evicts unpinned items in the order given by the eviction policy until the catalogue
+        is within its memory budget
+
+        Parameters
+        ----------
+        keep: CatalogueItemModel
+            An item that must not be evicted, e.g. the one that has just been added
+
+        Returns
+        -------
+        The ids of the evicted items
+        """
+        budget = self.conf.memory_budget
+        if budget is None or self.memory_used <= budget:
+            return []
+        evicted = []
+        # lazy handles hold no data so there's nothing to gain from evicting them
+        candidates = [
+            i for i in self.obj.values()
+            if not i.pinned and not i.spill and i is not keep and not isinstance(i.obj, LazyHandle)
+        ]
+        for item in self.policy.order(candidates):
+            if self.memory_used <= budget:
+                break
+            self._stats["evictions"] += 1
+            self._stats["evicted_bytes"] += item.size
+            evicted.append(item.id)
+            if self.spill and self._spill(item):
+                continue
+            self.remove(item.id)
+            self.log.info(f"Evicted {item.name or item.id} ({item.size} bytes) from the catalogue")
+        if self.memory_used > budget:
+            self.log.warning(
+                f"Catalogue is using {self.memory_used} bytes which is over its budget of {budget} "
+                f"but everything else is pinned or in use"
+            )
+        if evicted:
+            self.log.info(f"Catalogue stats: {self.stats()}")
+        return evicted
+
+    def _spill(self, item: CatalogueItemModel) -> bool:
+        try:
+            item.spill = self.spill.write(item.id, item.obj)
+        except Exception as e:
+            self.log.warning(f"Unable to spill {item.name or item.id} to disk so dropping it instead: {e}")
+            return False
+        item.obj = None
+        self.memory_used -= item.size
+        self._stats["spills"] += 1
+        self.log.info(f"Spilled {item.name or item.id} ({item.size} bytes) to {item.spill['path']}")
+        return True
+
+    @locked
+    def _load(self, item: CatalogueItemModel, enforce: bool = True) -> CatalogueItemModel:
+        # bring a spilled item back into memory
+        if not item.spill:
+            return item
+        item.obj = self.spill.read(item.spill)
+        self.spill.delete(item.spill)
+        item.spill = None
+        self.memory_used += item.size
+        self._stats["reloads"] += 1
+        self.log.debug(f"Reloaded {item.name or item.id} from disk")
+        if enforce:
+            self.enforce_budget(keep=item)
+        return item
+
+    @locked
+    def stats(self) -> dict:
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "hit_rate": self._stats["hits"] / lookups if lookups else None,
+            "items": len(self.obj),
+            "spilled_items": len([i for i in self.obj.values() if i.spill]),
+            "memory_used": self.memory_used,
+            "memory_budget": self.conf.memory_budget,
+            "eviction_policy": type(self.policy).__name__
+        }
+
+    @locked
+    def query(self,
+              name_prefix: str = None,
+              source: str = None,
+              obj_type: Union[type, str] = None,
+              created_after: Union[datetime, timedelta] = None,
+              created_before: datetime = None,
+              min_size: Union[int, str] = None,
+              max_size: Union[int, str] = None,
+              lineage: str = None
+              ) -> list:
+        """
+        Finds items using the catalogue's indexes. Every filter given must match.
+
+        Parameters
+        ----------
+        name_prefix: str
+        source: str
+            The plugin that cooked the item, e.g. "data_loader"
+        obj_type: type, str
+            A type, or the name of one e.g. "DataFrame"
+        created_after: datetime, timedelta
+            A timedelta means that long ago, e.g. timedelta(hours=1) for the last hour
+        created_before: datetime
+        min_size, max_size: int, str
+            In bytes or as a string e.g. "1GB"
+        lineage: str
+            The name of a recipe that the item was cooked from, directly or via inheritance or anchors
+
+        Returns
+        -------
+        A list of CatalogueItemModel, oldest first
+        """
+        if isinstance(created_after, timedelta):
+            created_after = datetime.now() - created_after
+        found = []
+        if name_prefix is not None:
+            found.append(self.index.names.prefix(name_prefix))
+        if source is not None:
+            found.append(self.index.sources.get(source, set()))
+        if obj_type is not None:
+            found.append(self.index.by_type(obj_type))
+        if created_after is not None or created_before is not None:
+            found.append(self.index.created.range(created_after, created_before))
+        if min_size is not None or max_size is not None:
+            found.append(self.index.sizes.range(parse_bytes(min_size, "min_size"), parse_bytes(max_size, "max_size")))
+        if lineage is not None:
+            found.append(self.index.lineage.get(lineage, set()))
+        ids = set.intersection(*found) if found else set(self.obj.keys())
+        items = [self.obj[i] for i in ids]
+        return sorted(items, key=CatalogueIndex.created_of)
+
+    @locked
+    def summary(self) -> pandas.DataFrame:
+        """
+        Returns
+        -------
+        A DataFrame with one row per item, largest first, showing its memory use along with
+        what the eviction policies look at. Nothing is loaded or measured to build it.
+        """
+        columns = ["id", "name", "obj_type", "source", "size", "in_memory", "pinned",
+                   "hits", "last_access", "cook_time", "created"]
+        rows = [{
+            "id": i.id,
+            "name": i.name,
+            "obj_type": i.obj_type,
+            "source": CatalogueIndex.source_of(i),
+            "size": i.size,
+            "in_memory": not i.spill,
+            "pinned": i.pinned,
+            "hits": i.hits,
+            "last_access": i.last_access,
+            "cook_time": i.cook_time,
+            "created": CatalogueIndex.created_of(i)
+        } for i in self.obj.values()]
+        df = pandas.DataFrame(rows, columns=columns)
+        return df.sort_values("size", ascending=False, ignore_index=True)
+
+    @classmethod
+    def sizeof(cls, obj, _seen: set = None) -> int:
+        """
+        Estimates the memory held by `obj` in bytes. pandas objects are measured including the
+        contents of object columns (e.g. strings), polars objects use estimated_size and
+        dicts and lists are measured along with their contents.
+        """
+        if isinstance(obj, LazyHandle):
+            # not loaded yet, and measuring it mustn't load it
+            return 0
+        if isinstance(obj, (pandas.DataFrame, pandas.Series, pandas.Index)):
+            usage = obj.memory_usage(deep=True)
+            return int(usage.sum()) if hasattr(usage, "sum") else int(usage)
+        if hasattr(obj, "estimated_size"):
+            # polars DataFrame or Series
+            return int(obj.estimated_size())
+        if hasattr(obj, "nbytes") and type(obj.nbytes) is int:
+            # numpy and arrow arrays
+            return obj.nbytes
+        size = sys.getsizeof(obj)
+        if type(obj) in [dict, list, tuple, set]:
+            _seen = _seen if _seen is not None else set()
+            if id(obj) in _seen:
+                return 0
+            _seen.add(id(obj))
+            for v in (obj.values() if type(obj) is dict else obj):
+                size += cls.sizeof(v, _seen=_seen)
+        return size
+
+    def increment_name(self, name):
+        try:
+            n = int(re.match(r"_(\d+)$", name).groups()[0])
+        except AttributeError:
+            return name + "_1"
+
+        return re.sub(r"\d+$", str(n + 1), name)
+
+    def has(self, name):
+        if name in self.obj.keys():
+            return True
+        else:
+            return False
+
+    def get(self,
+            obj: Any,
+            method: Literal["hash", "name", "id", "obj"],
+            return_obj: bool = True,
+            fingerprint: Literal["exact", "sampled"] = None
+            ):
+        funcmap = {
+            "hash": self.get_using_hash,
+            "name": self.get_using_name,
+            "id": self.get_using_id,
+            "obj": self.get_using_obj
+        }
+        if method not in funcmap.keys():
+            raise ValueError("Unknown method")
+        if method == "obj":
+            # hashing can be slow so is done before taking the lock
+            obj = self.generate_obj_hash(obj, fingerprint=fingerprint)
+        with self._lock:
+            try:
+                item = self.get_using_hash(obj) if method == "obj" else funcmap[method](obj)
+            except KeyError:
+                self._stats["misses"] += 1
+                raise ValueError(f"No item with that {method} in the catalogue")
+            self._stats["hits"] += 1
+            if type(item) is list:
+                return item
+            self._touch(item)
+            if not return_obj:
+                return item
+            # taken while locked since another thread could evict the item straight after
+            return self._share(item.obj)
+
+    def get_using_hash(self, item: int, gen_hash=False, fingerprint: Literal["exact", "sampled"] = None):
+        if gen_hash:
+            item = self.generate_obj_hash(item, fingerprint=fingerprint)
+        with self._lock:
+            return self._load(self.hashes[item])
+
+    def get_using_obj(self, item, fingerprint: Literal["exact", "sampled"] = None):
+        return self.get_using_hash(item, gen_hash=True, fingerprint=fingerprint)
+
+    @locked
+    def get_using_name(self, name: str):
+        return self._load(self.names[name])
+
+    @locked
+    def get_using_id(self, catalogue_id: str):
+        return self._load(self.obj[catalogue_id])
+
+    def generate_obj_hash(self, obj, fingerprint: Literal["exact", "sampled"] = None):
+        """
+        Parameters
+        ----------
+        obj: Any
+        fingerprint: str
+            "exact" hashes every row of a DataFrame and "sampled" only its schema, shape and
+            a strided sample of rows. Defaults to the catalogue's fingerprint setting.
+            If conf.fingerprint_cache is set, fingerprints are cached against the object, see
+            FingerprintCache.
+        """
+        if type(obj) is dict:
+            self.log.debug("Generating hash from dict")
+            return RecipeUtils.hash_recipe(obj)
+
+        hasher, _ = Hashers.lookup(obj)
+        if not hasher:
+            return hashlib.sha256(str(obj).encode("utf-8")).hexdigest()
+        mode = fingerprint if fingerprint else self.conf.fingerprint
+        try:
+            if not self.conf.fingerprint_cache:
+                self.log.debug(f"Generating {mode} hash from {type(obj).__name__}")
+                return hasher(obj, mode, self.conf.fingerprint_sample_rows)
+            token = version_token(obj)
+            cached = self.fingerprints.get(obj, mode, token)
+            if cached:
+                return cached
+            self.log.debug(f"Generating {mode} hash from {type(obj).__name__}")
+            h = hasher(obj, mode, self.conf.fingerprint_sample_rows)
+        except TypeError:
+            # e.g. pandas can't hash object data holding lists, such as the result of .str.split()
+            return hashlib.sha256(str(obj).encode("utf-8")).hexdigest()
+        if token is not None:
+            self.fingerprints.put(obj, mode, token, h)
+        return h
+
+    def generate_metadata(self, metadata: dict = None):
+        metadata = metadata if metadata else {}
+        _metadata = {
+            "created": datetime.now()
+        }
+        return {**_metadata, **metadata}
+
+
+class Register:
+    def __init__(self):
+        self.env = None
+        self._org = None
+        self.org = None
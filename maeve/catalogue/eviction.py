@@ -0,0 +1,67 @@
+class EvictionPolicy:
+    """
+    Decides the order in which catalogue items are evicted when the catalogue is over its
+    memory budget. Subclasses implement `priority`, and items with the lowest priority are
+    evicted first.
+    """
+
+    def priority(self, item):
+        raise NotImplementedError
+
+    def order(self, items: list) -> list:
+        return sorted(items, key=self.priority)
+
+
+class LRUPolicy(EvictionPolicy):
+    """
+    Least recently used first
+    """
+
+    def priority(self, item):
+        return item.last_access
+
+
+class LFUPolicy(EvictionPolicy):
+    """
+    Least frequently used first, then least recently used
+    """
+
+    def priority(self, item):
+        return item.hits, item.last_access
+
+
+class CostAwarePolicy(EvictionPolicy):
+    """
+    Cheapest to recreate per byte first, i.e. the time it took to cook the item, multiplied
+    by the number of times it has been used, divided by its size. Items with no recorded
+    cook time count as free to recreate.
+    """
+
+    def priority(self, item):
+        return (item.cook_time or 0) * (item.hits + 1) / max(item.size or 0, 1), item.last_access
+
+
+POLICIES = {
+    "lru": LRUPolicy,
+    "lfu": LFUPolicy,
+    "cost": CostAwarePolicy
+}
+
+
+def register_policy(name: str, policy: type):
+    """
+    Makes an EvictionPolicy subclass available by name, e.g. to the catalogue
+    eviction_policy env setting
+    """
+    if not (isinstance(policy, type) and issubclass(policy, EvictionPolicy)):
+        raise ValueError("policy must be a subclass of EvictionPolicy")
+    POLICIES[name] = policy
+
+
+def get_policy(policy) -> EvictionPolicy:
+    if isinstance(policy, EvictionPolicy):
+        return policy
+    try:
+        return POLICIES[policy]()
+    except KeyError:
+        raise ValueError(f"Unknown eviction policy {policy}. Available policies are {list(POLICIES.keys())}")
@@ -0,0 +1,246 @@
+import hashlib
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+import numpy as np
+import pandas
+import polars as pl
+import pyarrow as pa
+from pandas.util import hash_pandas_object, hash_array
+
+
+class Hashers:
+    """
+    Fingerprinting functions for the types of object that can be catalogued, looked up by
+    type along the object's MRO (i.e. like functools.singledispatch). Anything without a
+    hasher, or that its hasher raises a TypeError for (e.g. object columns holding lists),
+    is fingerprinted from its str.
+
+    A hasher is called as hasher(obj, mode, sample_rows) where mode is "exact" or
+    "sampled", and returns a str. An optional token function returns a cheap version
+    token for the object, which allows its fingerprint to be cached (see FingerprintCache).
+    """
+    registry = {}
+
+    @classmethod
+    def register(cls, obj_type: type, hasher: Callable, token: Callable = None):
+        cls.registry[obj_type] = (hasher, token)
+
+    @classmethod
+    def lookup(cls, obj: Any) -> tuple:
+        """
+        Returns
+        -------
+        A (hasher, token) tuple for `obj`, or (None, None) if there isn't a hasher for its type
+        """
+        for t in type(obj).__mro__:
+            if t in cls.registry.keys():
+                return cls.registry[t]
+        return None, None
+
+
+def register_hasher(obj_type: type, hasher: Callable, token: Callable = None):
+    """
+    Registers a hasher for a type of object, e.g. from a plugin. See Hashers.
+    """
+    Hashers.register(obj_type, hasher, token=token)
+
+
+# parts of an object larger than this are hashed on a thread pool, since hashlib releases
+# the GIL while it hashes large buffers
+PARALLEL_MIN_BYTES = 2 ** 26
+
+
+def _digest(parts: list, size: int = 0) -> str:
+    # parts is a list of (label, callable returning buffers to hash)
+    def hash_part(part):
+        h = hashlib.sha256(repr(part[0]).encode("utf-8"))
+        for b in part[1]():
+            h.update(b)
+        return h.digest()
+
+    if len(parts) > 1 and size >= PARALLEL_MIN_BYTES:
+        with ThreadPoolExecutor() as pool:
+            digests = list(pool.map(hash_part, parts))
+    else:
+        digests = [hash_part(p) for p in parts]
+    return hashlib.sha256(b"".join(digests)).hexdigest()
+
+
+def _stride(n: int, rows: int) -> int:
+    return max(1, n // max(rows, 1))
+
+
+def sampled_pandas_hash(df: pandas.DataFrame, rows: int) -> str:
+    """
+    Hashes the schema and shape of `df` along with roughly `rows` evenly strided rows
+    (always including the last). This is cheap whatever the size of the frame, but only
+    changes to the sampled rows change the hash.
+    """
+    h = hashlib.sha256()
+    h.update(repr((df.shape, [str(c) for c in df.columns], [str(d) for d in df.dtypes])).encode("utf-8"))
+    if len(df):
+        step = max(1, len(df) // max(rows, 1))
+        h.update(hash_pandas_object(df.iloc[::step], index=True).values.tobytes())
+        h.update(hash_pandas_object(df.iloc[[-1]], index=True).values.tobytes())
+    return f"sampled-{h.hexdigest()}"
+
+
+def pandas_frame_hash(df: pandas.DataFrame, mode: str, rows: int) -> str:
+    if mode == "sampled":
+        return sampled_pandas_hash(df, rows)
+    h = hashlib.sha256(repr(([str(c) for c in df.columns], [str(d) for d in df.dtypes])).encode("utf-8"))
+    h.update(hash_pandas_object(df, index=True).values.tobytes())
+    return h.hexdigest()
+
+
+def pandas_series_hash(s: pandas.Series, mode: str, rows: int) -> str:
+    h = hashlib.sha256(repr((s.name, str(s.dtype), len(s))).encode("utf-8"))
+    if mode == "sampled" and len(s):
+        h.update(hash_pandas_object(s.iloc[::_stride(len(s), rows)], index=True).values.tobytes())
+        h.update(hash_pandas_object(s.iloc[[-1]], index=True).values.tobytes())
+        return f"sampled-{h.hexdigest()}"
+    h.update(hash_pandas_object(s, index=True).values.tobytes())
+    return h.hexdigest()
+
+
+def polars_frame_hash(df: pl.DataFrame, mode: str, rows: int) -> str:
+    # hash_rows is vectorised and runs on the polars thread pool
+    h = hashlib.sha256(repr((df.shape, [(c, str(t)) for c, t in df.schema.items()])).encode("utf-8"))
+    if mode == "sampled" and len(df):
+        h.update(df[::_stride(len(df), rows)].hash_rows(seed=0).to_numpy().tobytes())
+        h.update(df[-1:].hash_rows(seed=0).to_numpy().tobytes())
+        return f"sampled-{h.hexdigest()}"
+    if df.width:
+        h.update(df.hash_rows(seed=0).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def polars_series_hash(s: pl.Series, mode: str, rows: int) -> str:
+    h = hashlib.sha256(repr((s.name, str(s.dtype), len(s))).encode("utf-8"))
+    if mode == "sampled" and len(s):
+        h.update(s[::_stride(len(s), rows)].hash(seed=0).to_numpy().tobytes())
+        h.update(s[-1:].hash(seed=0).to_numpy().tobytes())
+        return f"sampled-{h.hexdigest()}"
+    h.update(s.hash(seed=0).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def numpy_hash(a: np.ndarray, mode: str, rows: int) -> str:
+    prefix = ""
+    if mode == "sampled" and a.ndim and len(a):
+        a = np.concatenate([a[::_stride(len(a), rows)], a[-1:]])
+        prefix = "sampled-"
+    if a.dtype.hasobject:
+        # the buffer of an object array holds pointers, so hash the values instead
+        buffers = [hash_array(np.asarray(a, dtype=object).ravel()).tobytes()]
+    else:
+        # hashed straight from the array's memory when it's contiguous
+        buffers = [np.ascontiguousarray(a).data]
+    return prefix + _digest([((str(a.dtype), a.shape), lambda: buffers)])
+
+
+def _arrow_buffers(chunked: pa.ChunkedArray):
+    # buffers of sliced arrays cover the whole of the parent, so the offset and length are
+    # hashed too. Equal slices of different parents may hash differently, but never the reverse.
+    out = []
+    for chunk in chunked.chunks:
+        out.append(repr((chunk.offset, len(chunk))).encode("utf-8"))
+        out.extend(b for b in chunk.buffers() if b is not None)
+    return out
+
+
+def arrow_table_hash(t: pa.Table, mode: str, rows: int) -> str:
+    prefix = ""
+    if mode == "sampled" and t.num_rows:
+        indices = list(range(0, t.num_rows, _stride(t.num_rows, rows))) + [t.num_rows - 1]
+        t = t.take(pa.array(indices))
+        prefix = "sampled-"
+    parts = [((name, str(col.type)), lambda col=col: _arrow_buffers(col))
+             for name, col in zip(t.column_names, t.columns)]
+    return prefix + _digest([(("table", t.num_rows), lambda: [])] + parts, size=t.nbytes)
+
+
+def arrow_array_hash(a: pa.Array, mode: str, rows: int) -> str:
+    chunked = a if isinstance(a, pa.ChunkedArray) else pa.chunked_array([a], type=a.type)
+    return arrow_table_hash(pa.table({"": chunked}), mode, rows)
+
+
+class FingerprintCache:
+    """
+    Fingerprints keyed by object identity, so hashing the same object again only costs its
+    version token. Used when CatalogueConf.fingerprint_cache is set.
+
+    Each entry holds the object's version token from when it was hashed and is only used
+    while the token still matches. The token is deliberately cheap so it won't notice
+    every in place change (e.g. editing a single value in a large frame); call `forget`
+    after changes like that. Entries are dropped when their object is garbage collected.
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    def get(self, obj: Any, mode: str, token) -> str:
+        entry = self._entries.get(id(obj))
+        if entry and entry["ref"]() is obj and entry["token"] == token:
+            return entry["hashes"].get(mode)
+        return None
+
+    def put(self, obj: Any, mode: str, token, fingerprint: str):
+        key = id(obj)
+        entry = self._entries.get(key)
+        if not entry or entry["ref"]() is not obj or entry["token"] != token:
+            try:
+                ref = weakref.ref(obj, lambda r, k=key: self._drop(k, r))
+            except TypeError:
+                return
+            entry = {"ref": ref, "token": token, "hashes": {}}
+            self._entries[key] = entry
+        entry["hashes"][mode] = fingerprint
+
+    def _drop(self, key: int, ref: weakref.ref):
+        # ids are reused, so only drop the entry if it still belongs to the dead object
+        if key in self._entries.keys() and self._entries[key]["ref"] is ref:
+            del self._entries[key]
+
+    def forget(self, obj: Any):
+        self._entries.pop(id(obj), None)
+
+    def clear(self):
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def version_token(obj: Any):
+    """
+    A cheap token that changes when an object changes shape, schema or (for mutable types)
+    a small sample of its values. Returns None for objects whose fingerprints shouldn't be
+    cached.
+    """
+    _, token = Hashers.lookup(obj)
+    return token(obj) if token else None
+
+
+def _sampled_token(obj: Any):
+    hasher, _ = Hashers.lookup(obj)
+    return hasher(obj, "sampled", 16)
+
+
+def _shape_token(obj: Any):
+    # arrow objects are immutable so their length and type are enough
+    return repr((len(obj), str(getattr(obj, "schema", getattr(obj, "type", None)))))
+
+
+Hashers.register(pandas.DataFrame, pandas_frame_hash, token=_sampled_token)
+Hashers.register(pandas.Series, pandas_series_hash, token=_sampled_token)
+Hashers.register(pl.DataFrame, polars_frame_hash, token=_sampled_token)
+Hashers.register(pl.Series, polars_series_hash, token=_sampled_token)
+Hashers.register(np.ndarray, numpy_hash, token=_sampled_token)
+Hashers.register(pa.Table, arrow_table_hash, token=_shape_token)
+Hashers.register(pa.RecordBatch, lambda b, mode, rows: arrow_table_hash(pa.Table.from_batches([b]), mode, rows),
+                 token=_shape_token)
+Hashers.register(pa.Array, arrow_array_hash, token=_shape_token)
+Hashers.register(pa.ChunkedArray, arrow_array_hash, token=_shape_token)
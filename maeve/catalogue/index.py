@@ -0,0 +1,99 @@
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime
+
+
+class _SortedIndex:
+    # (value, id) pairs kept sorted, for range and prefix lookups
+
+    def __init__(self):
+        self._entries = []
+
+    def add(self, value, catalogue_id: str):
+        insort(self._entries, (value, catalogue_id))
+
+    def remove(self, value, catalogue_id: str):
+        i = bisect_left(self._entries, (value, catalogue_id))
+        if i < len(self._entries) and self._entries[i] == (value, catalogue_id):
+            del self._entries[i]
+
+    def range(self, low=None, high=None) -> set:
+        # ids with low <= value <= high
+        start = 0 if low is None else bisect_left(self._entries, (low,))
+        end = len(self._entries) if high is None else bisect_right(self._entries, (high, chr(0x10ffff)))
+        return set(i for _, i in self._entries[start:end])
+
+    def prefix(self, prefix: str) -> set:
+        start = bisect_left(self._entries, (prefix,))
+        out = set()
+        for value, i in self._entries[start:]:
+            if not value.startswith(prefix):
+                break
+            out.add(i)
+        return out
+
+
+class CatalogueIndex:
+    """
+    Secondary indexes over catalogue items: name, source plugin, object type, creation time,
+    size and lineage (the recipes an item was cooked from). Used by Catalogue.query so that
+    finding items doesn't mean walking every item.
+    """
+
+    def __init__(self):
+        self.names = _SortedIndex()
+        self.created = _SortedIndex()
+        self.sizes = _SortedIndex()
+        self.sources = {}
+        self.types = {}
+        self.lineage = {}
+
+    def add(self, item):
+        self.names.add(item.name or "", item.id)
+        self.created.add(self.created_of(item), item.id)
+        self.sizes.add(item.size, item.id)
+        self.sources.setdefault(self.source_of(item), set()).add(item.id)
+        self.types.setdefault(self._type(item), set()).add(item.id)
+        for n in item.lineage:
+            self.lineage.setdefault(n, set()).add(item.id)
+
+    def remove(self, item):
+        self.names.remove(item.name or "", item.id)
+        self.created.remove(self.created_of(item), item.id)
+        self.sizes.remove(item.size, item.id)
+        for index, keys in [(self.sources, [self.source_of(item)]),
+                            (self.types, [self._type(item)]),
+                            (self.lineage, item.lineage)]:
+            for k in keys:
+                ids = index.get(k, set())
+                ids.discard(item.id)
+                if not ids:
+                    index.pop(k, None)
+
+    def by_type(self, obj_type) -> set:
+        """
+        Ids of items whose object is of `obj_type`, which is either a type or the name of
+        one, e.g. "DataFrame" or "pandas.core.frame.DataFrame"
+        """
+        if type(obj_type) is not str:
+            obj_type = self.type_name(obj_type)
+        return set().union(*[
+            ids for t, ids in self.types.items()
+            if obj_type in [t, t.rsplit(".", 1)[-1]]
+        ])
+
+    @staticmethod
+    def type_name(t: type) -> str:
+        return f"{t.__module__}.{t.__qualname__}"
+
+    @staticmethod
+    def created_of(item) -> datetime:
+        created = (item.metadata or {}).get("created")
+        return created if isinstance(created, datetime) else datetime.min
+
+    @staticmethod
+    def source_of(item):
+        return (item.metadata or {}).get("source")
+
+    @classmethod
+    def _type(cls, item) -> str:
+        return item.obj_type if item.obj_type else cls.type_name(type(None))
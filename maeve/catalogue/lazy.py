@@ -0,0 +1,76 @@
+import threading
+from typing import Any
+
+from maeve.catalogue.fingerprint import register_hasher
+
+
+class LazyHandle:
+    """
+    A recipe that has been resolved but not yet cooked, as returned by Session.cook(lazy=True).
+
+    The recipe is cooked the first time anything reads the object, e.g. an attribute such
+    as `handle.mv` or `handle.columns`, an item, its length, or when the handle is passed as
+    `obj` to cook (so pipeline stages get the real object). Use `materialize` to get the
+    object itself, e.g. to pass it to functions that check its type.
+    """
+
+    def __init__(self, session, recipe: dict, recipe_hash: str = None, name: str = None,
+                 lineage: list = None, add_to_catalogue: bool = True, catalogue_metadata: dict = None):
+        self.session = session
+        self.recipe = recipe
+        self.recipe_hash = recipe_hash
+        self.name = name
+        self.lineage = lineage
+        self.add_to_catalogue = add_to_catalogue
+        self.catalogue_metadata = catalogue_metadata
+        # the id of the handle's own catalogue item, which is replaced once it's cooked
+        self.catalogue_id = None
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._obj = None
+
+    @property
+    def materialized(self) -> bool:
+        return self._loaded
+
+    def materialize(self) -> Any:
+        with self._lock:
+            if not self._loaded:
+                self._obj = self.session.materialize(self)
+                self._loaded = True
+        return self._obj
+
+    def __getattr__(self, name: str):
+        # only called for attributes the handle doesn't have. Dunder lookups (e.g. by copy
+        # or pickle) are not passed through since they'd cook the recipe.
+        if name.startswith("__") and name.endswith("__"):
+            raise AttributeError(name)
+        return getattr(self.materialize(), name)
+
+    def __getitem__(self, key):
+        return self.materialize()[key]
+
+    def __setitem__(self, key, value):
+        self.materialize()[key] = value
+
+    def __len__(self):
+        return len(self.materialize())
+
+    def __iter__(self):
+        return iter(self.materialize())
+
+    def __array__(self, *args, **kwargs):
+        return self.materialize().__array__(*args, **kwargs)
+
+    def __repr__(self):
+        if self._loaded:
+            return repr(self._obj)
+        return f"<LazyHandle {self.name or self.recipe_hash} (not loaded)>"
+
+
+def _lazy_hash(handle: LazyHandle, mode: str, rows: int) -> str:
+    # handles of unhashable recipes must not collide with each other
+    return f"lazy-{handle.recipe_hash if handle.recipe_hash else id(handle)}"
+
+
+register_hasher(LazyHandle, _lazy_hash)
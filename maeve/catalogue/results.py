@@ -0,0 +1,180 @@
+import glob
+import hashlib
+import json
+import os
+import pickle
+import threading
+from typing import Any, Literal
+
+from maeve.catalogue.spill import read_object, write_object
+from maeve.util.os import FSUtils
+
+
+class ResultCache:
+    """
+    Results of cooking recipes that read files, kept on disk so that they can be reused
+    by later sessions.
+
+    Entries are keyed by the hash of the resolved recipe together with fingerprints of the
+    files it reads (path, size, mtime and optionally a hash of the contents), so changing
+    either the recipe or any of its inputs misses the cache. DataFrames are stored as Arrow
+    IPC or Parquet and anything else is pickled. Whenever the cache grows beyond max_bytes
+    the least recently used entries are removed.
+
+    Each entry is a data file plus a small json file which is written last, so an entry
+    that was only partly written is never used. The json file's mtime is the entry's last use.
+    """
+
+    # bump to invalidate existing caches if the way entries are written changes
+    version = 1
+
+    def __init__(self,
+                 cache_dir: str,
+                 max_bytes: int = None,
+                 fmt: Literal["arrow", "parquet"] = "arrow",
+                 memory_map: bool = False,
+                 content_hash: bool = False
+                 ):
+        self.path = os.path.expanduser(cache_dir)
+        os.makedirs(self.path, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.fmt = fmt
+        self.memory_map = memory_map
+        self.content_hash = content_hash
+        self._fingerprints = {}
+
+    def input_fingerprints(self, files: list) -> list:
+        """
+        Returns
+        -------
+        A list of dicts with the path, mtime_ns, size and (if content_hash) sha256 of each file
+        """
+        fps = []
+        for f in sorted(set(os.path.abspath(f) for f in files)):
+            fp = FSUtils.file_fingerprint(f, previous=self._fingerprints.get(f), content_hash=self.content_hash)
+            self._fingerprints[f] = fp
+            fps.append({"path": f, **fp})
+        return fps
+
+    def key(self, recipe_hash: str, files: list) -> str:
+        """
+        The key of the result of a recipe with hash `recipe_hash` that reads `files`.
+        Raises OSError if any of the files can't be read.
+        """
+        key = [self.version, recipe_hash, self.input_fingerprints(files)]
+        return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Any:
+        """
+        Returns
+        -------
+        The object stored under `key`, or None if there isn't one
+        """
+        meta_path = self._meta_path(key)
+        try:
+            with open(meta_path) as fh:
+                meta = json.load(fh)
+            obj = read_object(self._info(meta), memory_map=self.memory_map)
+        except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+            self.remove(key)
+            return None
+        try:
+            os.utime(meta_path)
+        except OSError:
+            pass
+        return obj
+
+    def put(self, key: str, obj: Any, inputs: list = None) -> dict:
+        """
+        Stores `obj` under `key` and then removes least recently used entries if the cache
+        is over max_bytes
+
+        Parameters
+        ----------
+        key: str
+            From `key`
+        obj: Any
+        inputs: list
+            The files the result was made from, which are only recorded for reference
+        """
+        # written under temporary names and then renamed, so readers never see partial files
+        suffix = f"tmp-{os.getpid()}-{threading.get_ident()}"
+        info = write_object(os.path.join(self.path, f"{key}.{suffix}"), obj, fmt=self.fmt)
+        filename = key + os.path.splitext(info["path"])[1]
+        os.replace(info["path"], os.path.join(self.path, filename))
+        meta = {
+            "key": key,
+            "file": filename,
+            "kind": info["kind"],
+            "format": info["format"],
+            "size": os.path.getsize(os.path.join(self.path, filename)),
+            "inputs": inputs if inputs else []
+        }
+        with open(f"{self._meta_path(key)}.{suffix}", "w") as fh:
+            json.dump(meta, fh)
+        os.replace(f"{self._meta_path(key)}.{suffix}", self._meta_path(key))
+        self.cleanup()
+        return meta
+
+    def remove(self, key: str):
+        for f in glob.glob(os.path.join(glob.escape(self.path), f"{key}.*")):
+            try:
+                os.remove(f)
+            except OSError:
+                pass
+
+    def entries(self) -> list:
+        """
+        Returns
+        -------
+        The metadata of every entry, least recently used first, each with a `last_used` mtime
+        """
+        entries = []
+        for f in glob.glob(os.path.join(glob.escape(self.path), "*.json")):
+            try:
+                with open(f) as fh:
+                    meta = json.load(fh)
+                meta["last_used"] = os.stat(f).st_mtime_ns
+            except (OSError, ValueError):
+                continue
+            entries.append(meta)
+        return sorted(entries, key=lambda m: m["last_used"])
+
+    def size(self) -> int:
+        return sum(m["size"] for m in self.entries())
+
+    def cleanup(self, max_bytes: int = None) -> list:
+        """
+        Removes least recently used entries until the cache is no larger than `max_bytes`,
+        which defaults to the cache's own max_bytes
+
+        Returns
+        -------
+        The keys that were removed
+        """
+        max_bytes = max_bytes if max_bytes is not None else self.max_bytes
+        if max_bytes is None:
+            return []
+        entries = self.entries()
+        total = sum(m["size"] for m in entries)
+        removed = []
+        for m in entries:
+            if total <= max_bytes:
+                break
+            self.remove(m["key"])
+            total -= m["size"]
+            removed.append(m["key"])
+        return removed
+
+    def clear(self):
+        for m in self.entries():
+            self.remove(m["key"])
+
+    def __len__(self):
+        return len(self.entries())
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.json")
+
+    def _info(self, meta: dict) -> dict:
+        return {"path": os.path.join(self.path, meta["file"]), "kind": meta["kind"], "format": meta["format"]}
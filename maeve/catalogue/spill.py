@@ -0,0 +1,127 @@
+import os
+import pickle
+import shutil
+import tempfile
+import weakref
+from typing import Any, Literal
+
+import pandas
+import polars as pl
+import pyarrow as pa
+import pyarrow.ipc
+
+
+class SpillStore:
+    """
+    Files holding catalogue items that have been evicted from memory.
+
+    pandas and polars DataFrames are written as Arrow IPC or Parquet and everything else
+    is pickled. Arrow IPC files are memory-mapped when they're read back, so a reloaded
+    frame is backed by the file rather than by fresh memory. For pandas this means that
+    numeric columns are read only: adding or replacing columns works but assigning to
+    individual values raises an error. Set memory_map=False to get ordinary frames.
+
+    Each store uses its own directory inside `spill_dir` which is removed when the store
+    is garbage collected or closed.
+    """
+
+    def __init__(self,
+                 spill_dir: str,
+                 fmt: Literal["arrow", "parquet"] = "arrow",
+                 memory_map: bool = True
+                 ):
+        self.root = os.path.expanduser(spill_dir)
+        os.makedirs(self.root, exist_ok=True)
+        self.path = tempfile.mkdtemp(prefix="catalogue-", dir=self.root)
+        self.fmt = fmt
+        self.memory_map = memory_map
+        self._n = 0
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.path, ignore_errors=True)
+
+    def write(self, name: str, obj: Any) -> dict:
+        """
+        Writes `obj` to a new file
+
+        Returns
+        -------
+        A dict describing the file, to be passed to `read` and `delete`
+        """
+        self._n += 1
+        return write_object(os.path.join(self.path, f"{name}-{self._n}"), obj, fmt=self.fmt)
+
+    def read(self, info: dict) -> Any:
+        return read_object(info, memory_map=self.memory_map)
+
+    @staticmethod
+    def delete(info: dict):
+        # a memory-mapped file stays readable after it's removed (other than on Windows,
+        # where it's left for close to clean up)
+        try:
+            os.remove(info["path"])
+        except OSError:
+            pass
+
+    def close(self):
+        self._finalizer()
+
+
+def write_object(base: str, obj: Any, fmt: Literal["arrow", "parquet"] = "arrow") -> dict:
+    """
+    Writes `obj` to `base` plus an extension: DataFrames in a columnar format and anything
+    else as a pickle
+
+    Returns
+    -------
+    A dict describing the file, to be passed to `read_object`
+    """
+    if type(obj) is pandas.DataFrame:
+        try:
+            return _write_pandas(obj, base, fmt)
+        except (pa.ArrowException, TypeError, ValueError):
+            # e.g. object columns with mixed types, so fall back to pickle
+            pass
+    elif type(obj) is pl.DataFrame:
+        if fmt == "parquet":
+            obj.write_parquet(f"{base}.parquet")
+            return {"path": f"{base}.parquet", "kind": "polars", "format": "parquet"}
+        obj.write_ipc(f"{base}.arrow")
+        return {"path": f"{base}.arrow", "kind": "polars", "format": "arrow"}
+
+    with open(f"{base}.pickle", "wb") as fh:
+        pickle.dump(obj, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    return {"path": f"{base}.pickle", "kind": "object", "format": "pickle"}
+
+
+def _write_pandas(df: pandas.DataFrame, base: str, fmt: str) -> dict:
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        pq.write_table(table, f"{base}.parquet")
+        return {"path": f"{base}.parquet", "kind": "pandas", "format": "parquet"}
+    with pa.OSFile(f"{base}.arrow", "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return {"path": f"{base}.arrow", "kind": "pandas", "format": "arrow"}
+
+
+def read_object(info: dict, memory_map: bool = True) -> Any:
+    """
+    Reads an object written by `write_object`. Arrow IPC files are memory-mapped if
+    memory_map is True, see SpillStore.
+    """
+    path, kind, fmt = info["path"], info["kind"], info["format"]
+    if fmt == "pickle":
+        with open(path, "rb") as fh:
+            return pickle.load(fh)
+    if kind == "polars":
+        if fmt == "parquet":
+            return pl.read_parquet(path)
+        return pl.read_ipc(path, memory_map=memory_map)
+    if fmt == "parquet":
+        return pandas.read_parquet(path)
+    if memory_map:
+        table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+        # split_blocks stops pandas consolidating columns, which would copy them
+        return table.to_pandas(split_blocks=True)
+    with pa.OSFile(path, "rb") as source:
+        return pa.ipc.open_file(source).read_all().to_pandas()
@@ -0,0 +1,217 @@
+import importlib
+import inspect
+from typing import Any, Union
+
+from maeve.catalogue.lazy import LazyHandle
+from maeve.models.core import FuncRecipe, PipelineRecipe
+from maeve.util.function import FuncUtils
+
+
+class _Step:
+    # a recipe bound to what's needed to run it. With no obj it's cooked just as a pipeline
+    # stage would be, i.e. with cook and via the catalogue.
+
+    def __init__(self, session, recipe: Union[str, dict], resolved: dict):
+        self.s = session
+        self.recipe = recipe
+        self.resolved = resolved
+        self.add_to_catalogue = resolved.get("add_to_catalogue", True)
+
+    def __call__(self, obj: Any = None) -> Any:
+        if obj is None:
+            return self.s.cook(self.recipe, add_to_catalogue=self.add_to_catalogue, use_from_catalogue=True)
+        return self.run(obj)
+
+    def run(self, obj: Any) -> Any:
+        return self.s.cook(self.recipe, obj=obj, add_to_catalogue=False, use_from_catalogue=False)
+
+    def __repr__(self):
+        name = self.recipe if type(self.recipe) is str else self.resolved.get("function", "")
+        return f"{type(self).__name__}({name})"
+
+
+class _CookStep(_Step):
+    # stages that have to go through cook every time, e.g. to be catalogued
+
+    def run(self, obj: Any) -> Any:
+        return self.s.cook(self.recipe, obj=obj, add_to_catalogue=self.add_to_catalogue, use_from_catalogue=False)
+
+
+class _PluginStep(_Step):
+    # a plugin instance and method, found once
+
+    def __init__(self, session, recipe: Union[str, dict], resolved: dict, plugin: str):
+        super().__init__(session, recipe, resolved)
+        mod, method = session.plugins.get_plugin(plugin, resolved.get(session.g.conf.init_params_field, {}))
+        self.fn = getattr(mod, method if method else session.g.conf.plugin_default_entrypoint)
+
+    def run(self, obj: Any) -> Any:
+        return self.fn(self.resolved, obj=obj)
+
+
+class _FuncStep(_Step):
+    """
+    A function recipe, validated once. How the function is found on an object (a method of
+    its class, or of one of its accessors such as `.mv`) is worked out the first time an
+    object of each type is passed, see FuncUtils.run_func.
+    """
+
+    def __init__(self, session, recipe: Union[str, dict], resolved: dict):
+        super().__init__(session, recipe, resolved)
+        r = FuncRecipe(**resolved)
+        self.function = r.function
+        self.args = r.args if r.args else []
+        self.kwargs = r.kwargs if r.kwargs else {}
+        self.fail_silently = r.fail_silently
+        self.ns = None
+        if r.namespace:
+            try:
+                self.ns = importlib.import_module(r.namespace)
+            except ImportError:
+                self.ns = r.namespace
+        self._finders = {}
+
+    def run(self, obj: Any) -> Any:
+        try:
+            finder = self._finders[type(obj)]
+        except KeyError:
+            finder = self._finders[type(obj)] = self._finder(obj)
+        if finder is None:
+            # not something that can be bound, so look it up as FuncUtils would
+            return FuncUtils.run_func(self.function, obj=obj, ns=self.ns, func_args=self.args,
+                                      func_kwargs=self.kwargs, fail_silently=self.fail_silently)
+        accessor, func, with_obj = finder
+        try:
+            if accessor:
+                return func(getattr(obj, accessor), *self.args, **self.kwargs)
+            if with_obj:
+                return func(obj, *self.args, **self.kwargs)
+            return func(*self.args, **self.kwargs)
+        except Exception as e:
+            return FuncUtils.handle_func_fail(e, func)
+
+    def _finder(self, obj: Any) -> Union[tuple, None]:
+        # returns (accessor, function, pass obj) for objects of obj's type, or None
+        if hasattr(obj, self.function):
+            if isinstance(inspect.getattr_static(type(obj), self.function, None), (staticmethod, classmethod)):
+                return None, getattr(type(obj), self.function), False
+            func = getattr(type(obj), self.function, None)
+            return (None, func, True) if self._is_method(func) else None
+        if self.ns is not None:
+            func = getattr(self.ns, self.function, None)
+            # FuncUtils doesn't pass the obj to functions from a namespace
+            return (None, func, False) if callable(func) else None
+        for n in FuncUtils.g.func_namespaces:
+            accessor = getattr(obj, n, None)
+            func = getattr(type(accessor), self.function, None) if accessor is not None else None
+            if self._is_method(func):
+                return n, func, True
+        return None
+
+    @staticmethod
+    def _is_method(func) -> bool:
+        # plain functions on a class, including those of extension types
+        return inspect.isfunction(func) or inspect.ismethoddescriptor(func)
+
+
+class _PipelineStep(_Step):
+    # a pipeline, whose stages are compiled in turn
+
+    def __init__(self, session, recipe: Union[str, dict], resolved: dict, steps: list):
+        super().__init__(session, recipe, resolved)
+        self.steps = steps
+
+    def run(self, obj: Any) -> Any:
+        for step in self.steps:
+            obj = step(obj)
+        return obj
+
+
+class CompiledPlan:
+    """
+    A recipe resolved, validated and bound to its plugins and functions once, from
+    Session.compile, which can then be run against any number of objects, e.g.
+
+        plan = maeve.compile("my_pipeline")
+        for df in dfs:
+            out = plan(df)
+
+    Running a plan gives the same result as cooking the recipe with `obj`, without the
+    per cook overhead. Unlike cook, results aren't added to the catalogue, other than
+    by stages that are cooked with no obj (e.g. loaders) or that ask to be. A plan doesn't
+    see changes made to recipes after it was compiled.
+    """
+
+    def __init__(self, step: _Step):
+        self.step = step
+
+    @property
+    def recipe(self) -> dict:
+        return self.step.resolved
+
+    @property
+    def steps(self) -> list:
+        return self.step.steps if isinstance(self.step, _PipelineStep) else [self.step]
+
+    def run(self, obj: Any = None) -> Any:
+        if isinstance(obj, LazyHandle):
+            obj = obj.materialize()
+        return self.step(obj)
+
+    __call__ = run
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __repr__(self):
+        return f"CompiledPlan({len(self)} steps)"
+
+
+class Compiler:
+    """
+    Compiles recipes into CompiledPlans
+    """
+
+    def __init__(self, session):
+        self.s = session
+
+    def compile(self, recipe: Union[str, dict], anchors: dict = None, overrides: dict = None) -> CompiledPlan:
+        if type(recipe) is str:
+            resolved = self.s.recipes.get(recipe, anchors=anchors, overrides=overrides, exceptonmissing=True)
+        elif type(recipe) is dict:
+            resolved = recipe
+        else:
+            raise ValueError("recipe must be either str or dict")
+        if anchors or overrides:
+            # cooking by name would lose them
+            recipe = resolved
+        return CompiledPlan(self._step(recipe, resolved, []))
+
+    def _step(self, recipe: Union[str, dict], resolved: dict, chain: list) -> _Step:
+        if type(recipe) is str:
+            if recipe in chain:
+                raise ValueError(f"Recipe {recipe} is a stage of itself")
+            chain = chain + [recipe]
+        if resolved.get("add_to_catalogue", False):
+            return _CookStep(self.s, recipe, resolved)
+
+        plugin = self.s._plugin_name(resolved)
+        if plugin == "pipeline":
+            stages = PipelineRecipe(**resolved).pipeline
+            if type(stages) is dict:
+                stages = list(stages.values())
+            elif type(stages) is str:
+                stages = [stages]
+            steps = []
+            for stage in stages:
+                stage_resolved = self.s.recipes.get(stage, exceptonmissing=True) if type(stage) is str else stage
+                steps.append(self._step(stage, stage_resolved, chain))
+            return _PipelineStep(self.s, recipe, resolved, steps)
+        if plugin == "function":
+            return _FuncStep(self.s, recipe, resolved)
+
+        step = _PluginStep(self.s, recipe, resolved, plugin)
+        if inspect.iscoroutinefunction(step.fn):
+            # async entry points are left to cook to run
+            return _Step(self.s, recipe, resolved)
+        return step
@@ -1,15 +1,20 @@
 from maeve.util.log import Logger
-from maeve.util.os import FSUtils
+from maeve.util.os import FSUtils, KeyScanner
 from maeve.util.dict import DictUtils
-from maeve.util.recipe import AnchorUtils
+from maeve.util.recipe import AnchorUtils, RecipeUtils
 from maeve.models.core import ConfscadeDefaults, GlobalConst, EnvConf
+from maeve.conf.snapshot import ConfSnapshot
+from maeve.conf.graph import InheritanceGraph, AnchorGraph
+from maeve.util.concurrency import locked
 
+from copy import deepcopy
 from datetime import datetime
 import json
 from os import path, listdir
 import re
+import threading
 
-from typing import Union, Optional
+from typing import Union, Optional, Literal
 
 
 class Confscade:
@@ -23,7 +28,12 @@ class Confscade:
                  recursive_dir: bool = None,
                  log_level: str = None,
                  log_location: str = None,
-                 logger=None
+                 logger=None,
+                 cache_dir: str = None,
+                 parse_workers: int = None,
+                 parse_executor: Literal["auto", "process", "thread"] = None,
+                 lazy: bool = None,
+                 compiled_cache: bool = None
                  ):
         """
         Read and parse JSON config file
@@ -43,6 +53,22 @@ class Confscade:
             The log level,
         logger: object
             A logger instance - either a python or maeve logger instance should work
+        cache_dir: str
+            If set, a compiled snapshot of the recipe book is kept in this directory. Subsequent
+            loads of the same locations read the snapshot and only re-parse files that have changed.
+        parse_workers: int
+            If greater than 1, recipe files are parsed in parallel using this many workers. The
+            results are always merged in the original file order.
+        parse_executor: str
+            "process", "thread" or "auto" (the default) which uses processes for HJSON
+            and threads for JSON.
+        lazy: bool
+            If True, files are only indexed by their top level keys when the conf is loaded.
+            A file is parsed the first time one of its recipes (or a recipe it inherits from
+            or anchors to) is requested.
+        compiled_cache: bool
+            If True, a JSON copy of each HJSON file is kept in a __confcache__ directory next to
+            it and read instead of the HJSON for as long as the file's contents don't change.
         """
         if env_conf:
             self.e = env_conf
@@ -62,11 +88,40 @@ class Confscade:
             "GLOBAL_DEFAULT_CONF": global_default_conf,
             "RECURSIVE_FLAG": recursive_dir,
             "ERROR_ON_NOTFOUND": error_on_notfound,
-            "DEFAULT_CONF_KEY": defaultkey
+            "DEFAULT_CONF_KEY": defaultkey,
+            "CACHE_DIR": cache_dir,
+            "PARSE_WORKERS": parse_workers,
+            "PARSE_EXECUTOR": parse_executor,
+            "LAZY": lazy,
+            "COMPILED_CACHE": compiled_cache
         })
 
         self.d = ConfscadeDefaults(**confdict)
 
+        # resolved recipes keyed by (name, anchors, overrides, flags), and for each recipe name
+        # the cache keys of the resolutions that inherited from or anchored to it
+        self._resolved = {}
+        self._dependents = {}
+        # per thread state of the resolutions in progress, see _resolving and _chain
+        self._local = threading.local()
+        # guards the caches, the lazy file index and reloading. Recipes are resolved outside
+        # of it, and a resolution is only cached if nothing was invalidated while it ran,
+        # which is what the generation counts.
+        self._lock = threading.RLock()
+        self._generation = 0
+        self._cache_stats = {"hits": 0, "misses": 0}
+        # each recipe merged with all of its ancestors, keyed by name
+        self._flattened = {}
+        self.inheritance = InheritanceGraph()
+        self.anchor_graph = AnchorGraph()
+
+        # the files the conf was built from, in load order, with their fingerprint and analysed contents
+        self._sources = None
+        self._fileregex = None
+        self._files = {}
+        # lazy mode only: top level key -> the files that define it, in load order
+        self._index = {}
+
         self.conf = {}
         self.get_conf(config)
 
@@ -81,8 +136,9 @@ class Confscade:
             parse_anchors: bool = True,
             parse_directives: bool = True,
             anchors: dict = None,
-            overrides: Union[str, list, tuple] = None
-            ) -> dict:
+            overrides: Union[str, list, tuple] = None,
+            return_hash: bool = False
+            ) -> Union[dict, tuple]:
         """
         Given a valid conf name returns a fully resolved config
 
@@ -95,28 +151,260 @@ class Confscade:
         exceptonmissing: bool
             If True and excpetion is thrown if the requested item is missing, otherwise will fall be on defualts
             (probably an empty dict)
+        return_hash: bool
+            If True also returns the recipe's hash (see RecipeUtils.hash_recipe), which is
+            computed once and cached along with the resolved recipe
+
+        Returns
+        -------
+        The requested item in dictionary form. Resolved recipes are cached, so the dict returned
+        is always a copy that the caller is free to modify. If return_hash, a (recipe, hash)
+        tuple where hash is None if the recipe holds values that can't be hashed.
 
+        """
+        ret = self._get_shared(
+            name,
+            inherits=inherits,
+            exceptonmissing=exceptonmissing,
+            parse_anchors=parse_anchors,
+            parse_directives=parse_directives,
+            anchors=anchors,
+            overrides=overrides,
+            return_hash=return_hash
+        )
+        if return_hash:
+            return self._copy(ret[0]), ret[1]
+        return self._copy(ret)
+
+    @classmethod
+    def _copy(cls, obj):
+        # a deep copy in which values that are shared within the resolution (e.g. a recipe
+        # anchored to twice) get a copy each, so modifying one doesn't change the others
+        if type(obj) is dict:
+            return {k: cls._copy(v) for k, v in obj.items()}
+        if type(obj) is list:
+            return [cls._copy(v) for v in obj]
+        return deepcopy(obj)
+
+    def _get_shared(self,
+                   name: str,
+                   inherits: dict = None,
+                   exceptonmissing: bool = False,
+                   parse_anchors: bool = True,
+                   parse_directives: bool = True,
+                   anchors: dict = None,
+                   overrides: Union[str, list, tuple] = None,
+                   return_hash: bool = False
+                   ) -> Union[dict, tuple]:
+        """
+        As `get` but returns the cached resolution itself rather than a copy. This is how
+        anchors are resolved, so each anchor is resolved once and then shared by reference.
+        The result shares structure with the conf and with other cached resolutions so
+        must not be modified.
+        """
+        anchors = anchors if anchors else None
+        key = None if inherits else self._resolution_key(name, anchors, overrides, parse_anchors, parse_directives)
+        with self._lock:
+            entry = self._resolved.get(key) if key is not None else None
+            if entry is not None:
+                self._cache_stats["hits"] += 1
+            generation = self._generation
+        if entry is not None:
+            self._record_dependencies(entry["deps"])
+            return self._entry_result(entry, return_hash)
+
+        if name in self._chain:
+            cycle = self._chain[self._chain.index(name):] + [name]
+            raise ValueError(f"Recipe {name} has cyclic anchors: {' -> '.join(cycle)}")
+
+        self._resolving.append({name})
+        self._chain.append(name)
+        try:
+            # every step is copy on write so nothing in self.conf or the cache is modified
+            d = self.confscade(self.conf, name, inherits=inherits, exceptonmissing=exceptonmissing)
+            if parse_anchors:
+                d = AnchorUtils.resolve_anchors(self, d, anchors=anchors, env_conf=self.e)
+
+            if parse_directives:
+                # currently only parsing dict order_by
+                d = DictUtils.order_dicts(d, log=self.log)
+
+            if overrides:
+                d = DictUtils.apply_overrides(d, overrides, inplace=False)
+        finally:
+            deps = self._resolving.pop()
+            self._chain.pop()
+        self._record_dependencies(deps)
+
+        entry = {"name": name, "recipe": d, "deps": frozenset(deps)}
+        if name not in self.conf.keys():
+            # the defaults returned for a missing recipe aren't cached, so that a later call
+            # with exceptonmissing still raises
+            key = None
+        if key is None:
+            return self._entry_result(entry, return_hash)
+        with self._lock:
+            self._cache_stats["misses"] += 1
+            if generation == self._generation:
+                self._resolved[key] = entry
+                for n in deps:
+                    self._dependents.setdefault(n, set()).add(key)
+        return self._entry_result(entry, return_hash)
+
+    @property
+    def _resolving(self) -> list:
+        # for each resolution in progress, the names it has depended on so far
+        if not hasattr(self._local, "resolving"):
+            self._local.resolving = []
+        return self._local.resolving
+
+    @property
+    def _chain(self) -> list:
+        # the names of the recipes currently being resolved, outermost first
+        if not hasattr(self._local, "chain"):
+            self._local.chain = []
+        return self._local.chain
+
+    @staticmethod
+    def _entry_result(entry: dict, return_hash: bool):
+        if not return_hash:
+            return entry["recipe"]
+        if "hash" not in entry.keys():
+            try:
+                entry["hash"] = RecipeUtils.hash_recipe(entry["recipe"])
+            except TypeError:
+                entry["hash"] = None
+        return entry["recipe"], entry["hash"]
+
+    def lineage(self, name: str) -> set:
+        """
         Returns
         -------
-        The requested item in dictionary form
+        `name` and every recipe that it inherits from or anchors to, directly or indirectly
+        """
+        found = set()
+        pending = [name]
+        while pending:
+            n = pending.pop()
+            if n in found:
+                continue
+            found.add(n)
+            pending.extend(self.inheritance.ancestors(n))
+            pending.extend(self.anchor_graph.anchors.get(n, set()))
+        return found
 
+    def warm_cache(self, names: list = None) -> list:
         """
-        d = self.confscade(self.conf, name, inherits=inherits, exceptonmissing=exceptonmissing)
-        if parse_anchors:
-            d = AnchorUtils.resolve_anchors(self, d, anchors=anchors, env_conf=self.e)
+        Resolves recipes into the cache in anchor dependency order, so that every anchor is
+        resolved exactly once before the recipes that use it.
 
-        if parse_directives:
-            # currently only parsing dict order_by
-            d = DictUtils.order_dicts(d, log=self.log)
+        Parameters
+        ----------
+        names: list
+            The recipes to resolve. Defaults to every recipe that is anchored to.
 
-        if overrides:
-            d = DictUtils.apply_overrides(d, overrides)
-        return d
+        Returns
+        -------
+        The names of the recipes that were resolved, in the order they were resolved
+        """
+        known = set(self.items())
+        targets = set(self.anchor_graph.anchored_by.keys()) if names is None else set(names)
+        order = self.anchor_graph.topological_order()
+        order += sorted(targets.difference(order))
+        resolved = []
+        for n in order:
+            if n not in targets or n not in known:
+                continue
+            if self.anchor_graph.is_cyclic(n) or self.inheritance.is_cyclic(n):
+                self.log.warning(f"Not resolving {n} as it is part of a cycle")
+                continue
+            self._get_shared(n)
+            resolved.append(n)
+        return resolved
+
+    def _resolution_key(self, name, anchors, overrides, parse_anchors, parse_directives):
+        try:
+            return name, DictUtils.freeze(anchors), DictUtils.freeze(overrides), parse_anchors, parse_directives
+        except TypeError:
+            # e.g. an anchor has been passed a DataFrame, so don't cache
+            return None
+
+    def _record_dependencies(self, names):
+        # attribute names to the recipe currently being resolved (if any)
+        if self._resolving:
+            self._resolving[-1].update(names)
+
+    @locked
+    def invalidate(self, names: Union[str, list, set, tuple]) -> set:
+        """
+        Evicts cached resolutions of the given recipes and of any recipes that inherit from
+        or anchor to them. Everything else stays cached.
+
+        Parameters
+        ----------
+        names: str, list
+            The recipe names that have changed
+
+        Returns
+        -------
+        The names of the recipes whose cached resolutions were evicted
+        """
+        names = [names] if type(names) is str else names
+        self._generation += 1
+        self._evict_flattened(names)
+        evicted = set()
+        for n in names:
+            for key in self._dependents.pop(n, set()):
+                entry = self._resolved.pop(key, None)
+                if entry:
+                    evicted.add(entry["name"])
+        if evicted:
+            self.log.debug(f"Evicted cached resolutions for {sorted(evicted)}")
+        return evicted
+
+    def _evict_flattened(self, names):
+        for n in names:
+            if n == self.d.DEFAULT_CONF_KEY:
+                self._flattened = {}
+                return
+            self._flattened.pop(n, None)
+            for d in self.inheritance.descendants(n):
+                self._flattened.pop(d, None)
+
+    @locked
+    def clear_cache(self):
+        self._generation += 1
+        self._resolved = {}
+        self._dependents = {}
+        self._flattened = {}
+
+    def _update_graphs(self, names: list = None):
+        """
+        Updates the inheritance and anchor graphs for `names`, or rebuilds them if names is
+        None, and logs any new cycles. Recipes in a cycle can still be loaded but raise an
+        error when requested.
+        """
+        seen = set(tuple(c) for c in self.inheritance.cycles + self.anchor_graph.cycles)
+        if names is None:
+            self.inheritance = InheritanceGraph(self.conf)
+            self.anchor_graph = AnchorGraph(self.conf, parents=self.inheritance.parents)
+        else:
+            self.inheritance.update(self.conf, names)
+            self.anchor_graph.update(self.conf, names, parents=self.inheritance.parents)
+        for kind, graph in [("inheritance", self.inheritance), ("anchors", self.anchor_graph)]:
+            for c in graph.cycles:
+                if tuple(c) not in seen:
+                    self.log.error(f"Cyclic {kind} between recipes: {' -> '.join(c)}")
+
+    @locked
+    def cache_info(self) -> dict:
+        return {**self._cache_stats, "size": len(self._resolved)}
 
     def items(self):
-        return list(self.conf.keys())
+        return list(dict.fromkeys(list(self.conf.keys()) + list(self._index.keys())))
 
     def get_conf(self, config: Optional[Union[list, dict, str]] = None):
+        self.clear_cache()
         if config:
             type_config = type(config)
             if type_config is str:
@@ -138,52 +426,347 @@ class Confscade:
             self.conf = {}
 
         # We add in a global default so that there's always something for cascading confs to roll up to
-        if not self.conf:
+        if not self.conf and not self._index:
             self.log.warning("No valid JSON config files found, using global_default_conf")
-        self.conf = DictUtils.mergedicts(self.d.GLOBAL_DEFAULT_CONF, self.conf)
+        self.conf = DictUtils.merge_shared(self.d.GLOBAL_DEFAULT_CONF, self.conf)
+        self._update_graphs()
 
     def get_conf_from_files(
             self,
             filepath: Union[str, list],
             fileregex: str = r".+\.h?json$",
     ):
-
+        self._sources = filepath
+        self._fileregex = fileregex
+        files = self.find_conf_files(filepath, fileregex=fileregex)
+        if self.d.LAZY:
+            self.build_key_index(filepath, files, fileregex=fileregex)
+        elif self.d.CACHE_DIR:
+            self.load_from_snapshot(filepath, files, fileregex=fileregex)
+        else:
+            fingerprints = {}
+            for f in files:
+                try:
+                    fingerprints[f] = self.fs.file_fingerprint(f, content_hash=False)
+                except OSError as e:
+                    self.log.error(e)
+            confs = self.read_and_analyse_files(list(fingerprints.keys()))
+            for f, fp in fingerprints.items():
+                self._files[f] = {"fingerprint": fp, "conf": confs[f]}
+            self.build_conf()
+
+    def find_conf_files(
+            self,
+            filepath: Union[str, list],
+            fileregex: str = r".+\.h?json$",
+    ) -> list:
+        """
+        Lists the conf files in the given locations in the order they should be merged
+        """
         if type(filepath) is not list:
             filepath = [filepath]
 
+        files = []
         for i in filepath:
             if path.exists(i):
                 if path.isdir(i):
                     self.log.debug("Found JSON conf directory, searching for valid files")
                     if self.d.RECURSIVE_FLAG:
-                        for j in self.fs.os_walk_and_filter(i, fileregex=fileregex):
-                            self.load_and_merge(j)
+                        files.extend(self.fs.os_walk_and_filter(i, fileregex=fileregex))
                     else:
-                        for j in listdir(i):
-                            if re.match(fileregex, j):
-                                self.load_and_merge(j)
+                        files.extend([path.join(i, j) for j in listdir(i) if re.match(fileregex, j)])
                 else:
                     if re.match(fileregex, i):
-                        self.load_and_merge(i)
+                        files.append(i)
                     else:
                         self.log.debug("Skipping file as it file extension not recognised {}".format(i))
             else:
                 self.log.warning(f"Config location {i} doesn't exist, ignoring")
+        return files
 
-    def load_and_merge(self, filepath: str):
+    def load_from_snapshot(self, sources: Union[str, list], files: list, fileregex: str = None):
+        """
+        Builds the conf from `files` using the compiled snapshot in the cache dir. Files whose
+        content hash is unchanged since the snapshot was written are not parsed again.
+        """
+        snapshot = self._snapshot(sources, fileregex)
+        cached = snapshot.load() or {}
+        manifest = cached.get("manifest", {})
+        file_confs = cached.get("files", {})
+
+        new_manifest = {}
+        changed = []
+        for f in files:
+            try:
+                fp = self.fs.file_fingerprint(f, previous=manifest.get(f))
+            except OSError as e:
+                self.log.error(e)
+                continue
+            new_manifest[f] = fp
+            if f not in file_confs or manifest[f]["sha256"] != fp["sha256"]:
+                changed.append(f)
+
+        if cached and not changed and list(new_manifest) == list(manifest):
+            self.log.debug(f"Recipe snapshot {snapshot.path} is up to date, using it")
+            self.conf = cached["conf"]
+            self._files = {f: {"fingerprint": fp, "conf": file_confs[f]} for f, fp in new_manifest.items()}
+            if new_manifest != manifest:
+                # files were touched but their contents are the same
+                snapshot.save(new_manifest, file_confs, self.conf)
+            return
+
+        self.log.debug(f"Recipe snapshot is stale, parsing {len(changed)} of {len(new_manifest)} files")
+        confs = self.read_and_analyse_files(changed)
+        for f in new_manifest.keys():
+            if f not in confs:
+                confs[f] = file_confs[f]
+            self._files[f] = {"fingerprint": new_manifest[f], "conf": confs[f]}
+        self.build_conf()
+        snapshot.save(new_manifest, confs, self.conf)
+
+    def _snapshot(self, sources: Union[str, list], fileregex: str, kind: str = "conf") -> ConfSnapshot:
+        return ConfSnapshot(
+            self.d.CACHE_DIR,
+            sources if type(sources) is list else [sources],
+            settings={
+                "fileregex": fileregex,
+                "recursive": self.d.RECURSIVE_FLAG,
+                "default_key": self.d.DEFAULT_CONF_KEY
+            },
+            kind=kind,
+            logger=self.log
+        )
+
+    def build_key_index(self, sources: Union[str, list], files: list, fileregex: str = None):
+        """
+        Lazy mode: indexes the top level keys of each of `files` without parsing them. If there
+        is a cache dir, the keys of files whose mtime and size haven't changed are reused from
+        the previous index.
+        """
+        snapshot = self._snapshot(sources, fileregex, kind="index") if self.d.CACHE_DIR else None
+        cached = (snapshot.load() if snapshot else None) or {}
+        manifest = cached.get("manifest", {})
+        cached_keys = cached.get("files", {})
+
+        for f in files:
+            try:
+                fp = self.fs.file_fingerprint(f, content_hash=False)
+            except OSError as e:
+                self.log.error(e)
+                continue
+            if f in cached_keys and not self.fs.fingerprint_changed(manifest.get(f), fp):
+                self._files[f] = {"fingerprint": fp, "conf": None, "keys": cached_keys[f]}
+            else:
+                self._files[f] = self._index_file(f, fp)
+        self._build_index()
+        self.log.debug(f"Indexed {len(self._index)} recipes in {len(self._files)} files")
+
+        if snapshot:
+            snapshot.save(
+                {f: v["fingerprint"] for f, v in self._files.items()},
+                {f: v["keys"] for f, v in self._files.items()},
+                None
+            )
+
+    def _index_file(self, filepath: str, fingerprint: dict) -> dict:
+        keys = KeyScanner.scan_file(filepath)
+        if keys is None:
+            self.log.debug(f"Unable to index {filepath} without parsing it")
+            c = self.read_and_analyse(filepath)
+            return {"fingerprint": fingerprint, "conf": c, "keys": list(c.keys())}
+        return {
+            "fingerprint": fingerprint,
+            "conf": None,
+            "keys": [k for k in keys if k != self.d.DEFAULT_CONF_KEY]
+        }
+
+    @locked
+    def _build_index(self):
+        # built aside and then swapped in, so readers never see it part built
+        index = {}
+        for f, v in self._files.items():
+            for k in v["keys"]:
+                index.setdefault(k, []).append(f)
+        self._index = index
+
+    @locked
+    def _ensure_loaded(self, key: str):
+        """
+        Lazy mode: makes sure `key` is in the conf, parsing any files that define it. Every
+        other file that defines a key from a newly parsed file is parsed too, so that shared
+        keys are always merged from all their files in load order.
+        """
+        if not self.d.LAZY or key in self.conf.keys() or key not in self._index.keys():
+            return
+        keys = {key}
+        pending = [f for f in self._index[key] if self._files[f]["conf"] is None]
+        while pending:
+            for f, c in self.read_and_analyse_files(pending).items():
+                self._files[f]["conf"] = c
+                self._files[f]["keys"] = list(c.keys())
+                keys.update(c.keys())
+            pending = list(dict.fromkeys(
+                f for k in keys for f in self._index.get(k, []) if self._files[f]["conf"] is None
+            ))
+        self._build_index()
+        for k in keys:
+            if k not in self.conf.keys():
+                self._rebuild_key(k)
+        self._update_graphs(list(keys))
+
+    @locked
+    def load_all(self):
+        """
+        Lazy mode: parses every file that hasn't been parsed yet
+        """
+        pending = [f for f, v in self._files.items() if v["conf"] is None]
+        if not pending:
+            return
+        for f, c in self.read_and_analyse_files(pending).items():
+            self._files[f]["conf"] = c
+            self._files[f]["keys"] = list(c.keys())
+        self._build_index()
+        for k in self._index.keys():
+            self._rebuild_key(k)
+        self._update_graphs()
+
+    @locked
+    def refresh(self) -> set:
+        """
+        Incrementally reloads the recipe book. The locations the conf was loaded from are
+        re-scanned and only files that have been added, deleted or whose mtime or size has
+        changed are parsed. Just the top level keys from those files are rebuilt in the conf
+        and any cached resolutions that depend on them are evicted.
+
+        Returns
+        -------
+        The names of the recipes that changed, along with those which depend on them
+        """
+        if self._sources is None:
+            self.log.debug("Conf wasn't loaded from files so there is nothing to refresh")
+            return set()
+
+        files = self.find_conf_files(self._sources, fileregex=self._fileregex)
+        changed_keys = set()
+        for f in set(self._files.keys()).difference(files):
+            self.log.debug(f"Config file {f} has been removed")
+            changed_keys.update(self._file_keys(self._files[f]))
+
+        new_files = {}
+        for f in files:
+            previous = self._files.get(f)
+            try:
+                fp = self.fs.file_fingerprint(f, content_hash=False)
+            except OSError as e:
+                self.log.error(e)
+                continue
+            if previous and not self.fs.fingerprint_changed(previous["fingerprint"], fp):
+                new_files[f] = previous
+                continue
+            self.log.debug(f"Config file {f} has changed, reloading")
+            if previous:
+                changed_keys.update(self._file_keys(previous))
+            if self.d.LAZY:
+                new_files[f] = self._index_file(f, fp)
+                changed_keys.update(new_files[f]["keys"])
+            else:
+                new_files[f] = {"fingerprint": fp, "conf": None}
+
+        if not self.d.LAZY:
+            confs = self.read_and_analyse_files([f for f, v in new_files.items() if v["conf"] is None])
+            for f, c in confs.items():
+                changed_keys.update(c.keys())
+                new_files[f]["conf"] = c
+
+        self._files = new_files
+        if self.d.LAZY:
+            # changed keys are merged again the next time they're requested
+            self._build_index()
+            for k in changed_keys:
+                self.conf.pop(k, None)
+        else:
+            for k in changed_keys:
+                self._rebuild_key(k)
+        self._update_graphs(list(changed_keys))
+        return changed_keys.union(self.invalidate(changed_keys))
+
+    @staticmethod
+    def _file_keys(entry: dict) -> list:
+        return entry["keys"] if "keys" in entry.keys() else list(entry["conf"].keys())
+
+    def _rebuild_key(self, key: str):
+        # re-merge a single top level key from every file that defines it, in load order
+        merged = {}
+        for f in self._files.values():
+            if f["conf"] and key in f["conf"].keys():
+                merged = DictUtils.merge_shared(merged, {key: f["conf"][key]})
+        if key in merged.keys():
+            self.conf[key] = merged[key]
+        else:
+            self.conf.pop(key, None)
+
+    def read_and_analyse(self, filepath: str) -> dict:
         try:
-            c = self.fs.read_conf_file(filepath)
+            c = self.fs.read_conf_file(filepath, compiled_cache=self.d.COMPILED_CACHE)
         except RuntimeError as e:
             self.log.error(e)
-            return
+            return {}
 
         if not c:
-            return
+            return {}
+        return self.analyse_conf(c, filepath)
+
+    def read_and_analyse_files(self, files: list) -> dict:
+        """
+        Reads and analyses `files`, in parallel if parse_workers is set
+
+        Returns
+        -------
+        A dict of file path to analysed conf in the same order as `files`
+        """
+        if not self.d.PARSE_WORKERS or self.d.PARSE_WORKERS < 2 or len(files) < 2:
+            return {f: self.read_and_analyse(f) for f in files}
+
+        self.log.debug(f"Parsing {len(files)} files with {self.d.PARSE_WORKERS} {self.d.PARSE_EXECUTOR} workers")
+        confs = {}
+        results = self.fs.read_conf_files(
+            files,
+            workers=self.d.PARSE_WORKERS,
+            executor=self.d.PARSE_EXECUTOR,
+            compiled_cache=self.d.COMPILED_CACHE
+        )
+        for f, (c, error) in zip(files, results):
+            if error:
+                self.log.error(error)
+            confs[f] = self.analyse_conf(c, f) if c else {}
+        return confs
+
+    def build_conf(self):
+        """
+        Builds the conf from the analysed files in load order. Each top level key is taken
+        as is from the first file that defines it and only keys defined by more than one
+        file are merged, so the cost is proportional to the total size of the files.
+        """
+        self.conf = {}
+        for f, entry in self._files.items():
+            self.load_and_merge(f, c=entry["conf"])
+
+    def load_and_merge(self, filepath: str, c: dict = None):
+        if c is None:
+            c = self.read_and_analyse(filepath)
 
-        self.log.debug("Merging config file: {}".format(filepath))
-        c = self.analyse_conf(c, filepath)
         if c:
-            self.conf = DictUtils.mergedicts(self.conf, c)
+            self.log.debug("Merging config file: {}".format(filepath))
+            for k, v in c.items():
+                if k in self.conf.keys():
+                    self.log.warning(
+                        "Key {} from {} already seen. Will attempt to merge but results may be unpredictable.".format(
+                            k, filepath
+                        )
+                    )
+                    self.conf[k] = DictUtils.merge_shared({k: self.conf[k]}, {k: v})[k]
+                else:
+                    self.conf[k] = v
         else:
             self.log.debug("No valid conf found in file {}. Check if ignore=True in default section.".format(filepath))
 
@@ -199,21 +782,16 @@ class Confscade:
         if self.d.DEFAULT_CONF_KEY in c.keys():
             del c[self.d.DEFAULT_CONF_KEY]
 
-        for k, v in c.items():
-
-            if k in self.conf.keys():
-                self.log.warning(
-                    "Key {} from {} already seen. Will attempt to merge but results may be unpredictable.".format(k, f)
-                )
+        for k, v in list(c.items()):
 
             if v.get("ignore", False):
                 del c[k]
                 continue
 
-            # merge up to the local (file) default
-            v = DictUtils.mergedicts(default, v)
-            if "metadata" not in v.keys():
-                v["metadata"] = {}
+            # merge up to the local (file) default. Recipes share any parts of the default
+            # they don't change, so only the top level and metadata are modified from here on
+            v = DictUtils.merge_shared(default, v)
+            v["metadata"] = dict(v.get("metadata", {}))
             v["metadata"]["conf_file"] = f
             # v["metadata"]["loaded"] = self.str_date_time_now()
 
@@ -227,11 +805,15 @@ class Confscade:
             c[k] = v
         return c
 
+    @locked
     def add_conf(self, name, cfg):
         self.conf[name] = cfg
+        self._update_graphs([name])
+        self.invalidate([name])
 
     def find_key(self, key, name=None):
         if not name:
+            self.load_all()
             return DictUtils.search_dict(self.conf, key)
         else:
             return DictUtils.search_dict(self.confscade(self.conf, name), key)
@@ -247,6 +829,7 @@ class Confscade:
         if resolve:
             c = self.get(name, parse_anchors=parse_anchors)
         else:
+            self._ensure_loaded(name)
             c = self.conf[name]
         return self.pretty_print(c)
 
@@ -275,9 +858,17 @@ class Confscade:
         Returns
         -------
         dict
-            a conf dict
+            a conf dict. This shares structure with `conf` so must not be modified in place.
 
         """
+        self._record_dependencies([key])
+        own_conf = conf is self.conf and not inherits
+        generation = self._generation
+        if conf is self.conf:
+            self._ensure_loaded(key)
+            if own_conf and key in self._flattened.keys():
+                self._record_dependencies(self.inheritance.ancestors(key) + [self.d.DEFAULT_CONF_KEY])
+                return self._flattened[key]
         try:
             c = conf[key]
         except KeyError:
@@ -288,13 +879,23 @@ class Confscade:
 
         if not inherits:
             if "inherits" in c.keys():
+                if conf is self.conf and self.inheritance.is_cyclic(key):
+                    raise ValueError(
+                        f"Recipe {key} has cyclic inheritance: {' -> '.join(self.inheritance.cycle(key))}"
+                    )
                 default = self.confscade(conf, c['inherits'])
             else:
-                default = DictUtils.mergedicts(
+                self._record_dependencies([self.d.DEFAULT_CONF_KEY])
+                default = DictUtils.merge_shared(
                     self.d.GLOBAL_DEFAULT_CONF[self.d.DEFAULT_CONF_KEY],
                     conf.get(self.d.DEFAULT_CONF_KEY, self.d.MINIMUM_CONF)
                 )
         else:
             default = inherits
 
-        return DictUtils.mergedicts(default, c)
+        merged = DictUtils.merge_shared(default, c)
+        if own_conf:
+            with self._lock:
+                if generation == self._generation:
+                    self._flattened[key] = merged
+        return merged
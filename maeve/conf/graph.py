@@ -0,0 +1,228 @@
+from maeve.util.recipe import AnchorUtils
+
+
+class InheritanceGraph:
+    """
+    The `inherits` relationships between the recipes in a conf.
+
+    Each recipe has at most one parent, so the graph is a forest unless recipes inherit
+    from each other in a loop. Any such loops are found whenever the graph is updated
+    and are listed in `cycles`.
+    """
+
+    def __init__(self, conf: dict = None, inherits_key: str = "inherits"):
+        self.inherits_key = inherits_key
+        self.parents = {}
+        self.children = {}
+        self.cycles = []
+        self._cyclic = set()
+        if conf:
+            self.update(conf)
+
+    def update(self, conf: dict, names: list = None):
+        """
+        (Re)reads the parents of `names` from `conf`, or of every recipe if names is None.
+        Names that are no longer in the conf are removed.
+        """
+        names = list(conf.keys()) if names is None else names
+        for n in names:
+            previous = self.parents.pop(n, None)
+            if previous is not None:
+                self.children.get(previous, set()).discard(n)
+            recipe = conf.get(n)
+            if type(recipe) is dict and type(recipe.get(self.inherits_key)) is str:
+                parent = recipe[self.inherits_key]
+                self.parents[n] = parent
+                self.children.setdefault(parent, set()).add(n)
+        self.cycles = self.find_cycles()
+        self._cyclic = set(n for c in self.cycles for n in c)
+
+    def find_cycles(self) -> list:
+        """
+        Returns
+        -------
+        A list of cycles, each as a list of names where the first and last are the same,
+        e.g. ["a", "b", "a"]
+        """
+        cycles = []
+        visited = {}
+        for start in self.parents.keys():
+            path = []
+            n = start
+            while n in self.parents.keys() and n not in visited.keys():
+                visited[n] = start
+                path.append(n)
+                n = self.parents[n]
+            if visited.get(n) == start and n in path:
+                cycles.append(path[path.index(n):] + [n])
+        return cycles
+
+    def is_cyclic(self, name: str) -> bool:
+        return name in self._cyclic
+
+    def cycle(self, name: str) -> list:
+        """
+        Returns
+        -------
+        The cycle that `name` is part of, or an empty list
+        """
+        for c in self.cycles:
+            if name in c:
+                return c
+        return []
+
+    def parent(self, name: str):
+        return self.parents.get(name)
+
+    def ancestors(self, name: str) -> list:
+        """
+        Returns
+        -------
+        The chain of parents of `name`, nearest first
+        """
+        chain = []
+        n = self.parents.get(name)
+        while n is not None and n not in chain and n != name:
+            chain.append(n)
+            n = self.parents.get(n)
+        return chain
+
+    def descendants(self, name: str) -> set:
+        """
+        Returns
+        -------
+        Every recipe that directly or indirectly inherits from `name`
+        """
+        found = set()
+        pending = list(self.children.get(name, set()))
+        while pending:
+            n = pending.pop()
+            if n not in found:
+                found.add(n)
+                pending.extend(self.children.get(n, set()))
+        return found
+
+    def topological_order(self) -> list:
+        """
+        Returns
+        -------
+        Every recipe in the graph (excluding those in cycles) with parents before their children
+        """
+        order = []
+        pending = [n for n in self.children.keys() if n not in self.parents.keys()]
+        while pending:
+            n = pending.pop(0)
+            order.append(n)
+            pending.extend(sorted(c for c in self.children.get(n, set()) if c not in self._cyclic))
+        return order
+
+    def to_dict(self) -> dict:
+        return {"parents": dict(self.parents), "cycles": [list(c) for c in self.cycles]}
+
+
+class AnchorGraph:
+    """
+    The recipes that each recipe anchors to.
+
+    A recipe is resolved along with everything it inherits, so when looking for cycles a
+    recipe also depends on its parent. Cycles made up only of `inherits` are left to
+    the InheritanceGraph.
+    """
+
+    def __init__(self, conf: dict = None, parents: dict = None):
+        self.anchors = {}
+        self.anchored_by = {}
+        self.cycles = []
+        self._cyclic = set()
+        if conf:
+            self.update(conf, parents=parents)
+
+    def update(self, conf: dict, names: list = None, parents: dict = None):
+        """
+        (Re)scans `names` in `conf` for anchors, or every recipe if names is None. `parents`
+        maps recipe names to the name of the recipe they inherit from.
+        """
+        names = list(conf.keys()) if names is None else names
+        for n in names:
+            for a in self.anchors.pop(n, set()):
+                self.anchored_by.get(a, set()).discard(n)
+            recipe = conf.get(n)
+            if type(recipe) in [dict, list]:
+                found = AnchorUtils.find_anchors(recipe)
+                if found:
+                    self.anchors[n] = found
+                    for a in found:
+                        self.anchored_by.setdefault(a, set()).add(n)
+        self.cycles = self.find_cycles(parents)
+        self._cyclic = set(n for c in self.cycles for n in c)
+
+    def find_cycles(self, parents: dict = None) -> list:
+        """
+        Returns
+        -------
+        A list of cycles that include at least one anchor, each as a list of names where
+        the first and last are the same, e.g. ["a", "b", "a"]
+        """
+        parents = parents if parents else {}
+
+        def edges(n):
+            out = sorted(self.anchors.get(n, set()))
+            if n in parents.keys():
+                out.append(parents[n])
+            return out
+
+        cycles = []
+        # 1 = on the current path, 2 = fully explored
+        state = {}
+        for start in sorted(set(self.anchors.keys()).union(parents.keys())):
+            if start in state.keys():
+                continue
+            path = [start]
+            state[start] = 1
+            stack = [iter(edges(start))]
+            while stack:
+                n = next(stack[-1], None)
+                if n is None:
+                    state[path.pop()] = 2
+                    stack.pop()
+                elif state.get(n) == 1:
+                    cycle = path[path.index(n):] + [n]
+                    if any(b in self.anchors.get(a, set()) for a, b in zip(cycle, cycle[1:])):
+                        cycles.append(cycle)
+                elif n not in state.keys():
+                    state[n] = 1
+                    path.append(n)
+                    stack.append(iter(edges(n)))
+        return cycles
+
+    def is_cyclic(self, name: str) -> bool:
+        return name in self._cyclic
+
+    def topological_order(self) -> list:
+        """
+        Returns
+        -------
+        Every recipe that anchors or is anchored to (excluding those in cycles), with
+        each recipe after all of the recipes it anchors to
+        """
+        waiting = {
+            n: len(self.anchors.get(n, set()))
+            for n in set(self.anchors.keys()).union(self.anchored_by.keys())
+            if n not in self._cyclic
+        }
+        order = sorted(n for n, count in waiting.items() if count == 0)
+        i = 0
+        while i < len(order):
+            for n in sorted(self.anchored_by.get(order[i], set())):
+                if n in waiting.keys():
+                    waiting[n] -= 1
+                    if waiting[n] == 0:
+                        order.append(n)
+            i += 1
+        return order
+
+    def to_dict(self) -> dict:
+        return {
+            "anchors": {k: sorted(v) for k, v in self.anchors.items()},
+            "cycles": [list(c) for c in self.cycles]
+        }
@@ -0,0 +1,86 @@
+import hashlib
+import json
+import os
+import pickle
+from typing import Optional
+
+
+class ConfSnapshot:
+    """
+    A compiled, on-disk copy of a recipe book.
+
+    The snapshot holds the merged conf, the analysed contents of every file that went
+    into it and a manifest of per-file fingerprints (mtime, size and content hash) so
+    that a later load can tell which files need to be parsed again. In lazy mode the
+    same structure holds just the top level keys of each file.
+    """
+    format_version = 1
+
+    def __init__(self, cache_dir: str, sources: list, settings: dict = None, kind: str = "conf", logger=None):
+        """
+        Parameters
+        ----------
+        cache_dir: str
+            The directory the snapshot is written to. Created if it doesn't exist.
+        sources: list
+            The config locations the recipe book was built from. Together with `settings`
+            these identify the snapshot so that different books don't share a file.
+        settings: dict
+            Any Confscade settings which change how files are analysed
+        kind: str
+            What is being stored, e.g. "conf" for a whole recipe book or "index" for
+            just the keys of each file
+        logger: object
+            A maeve logger instance
+        """
+        self.log = logger
+        self.cache_dir = os.path.expanduser(cache_dir)
+        key = json.dumps(
+            {"sources": [str(s) for s in sources], "settings": settings or {}, "version": self.format_version},
+            sort_keys=True,
+            default=str
+        )
+        self.path = os.path.join(
+            self.cache_dir,
+            f"confscade-{kind}-{hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]}.pickle"
+        )
+
+    def load(self) -> Optional[dict]:
+        """
+        Returns
+        -------
+        The snapshot as a dict with the keys manifest, files and conf, or None if there
+        is no usable snapshot.
+        """
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, 'rb') as fh:
+                snapshot = pickle.load(fh)
+        except Exception as e:
+            # a truncated or incompatible snapshot is just a cache miss
+            self.log.warning(f"Unable to read recipe snapshot {self.path}, rebuilding: {e}")
+            return None
+        if snapshot.get("version") != self.format_version:
+            self.log.debug("Recipe snapshot has an old format version, ignoring")
+            return None
+        return snapshot
+
+    def save(self, manifest: dict, files: dict, conf: dict):
+        """
+        Atomically writes the snapshot, replacing any previous version
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, 'wb') as fh:
+                pickle.dump(
+                    {"version": self.format_version, "manifest": manifest, "files": files, "conf": conf},
+                    fh,
+                    protocol=pickle.HIGHEST_PROTOCOL
+                )
+            os.replace(tmp, self.path)
+        except OSError as e:
+            self.log.warning(f"Unable to write recipe snapshot {self.path}: {e}")
+            if os.path.exists(tmp):
+                os.remove(tmp)
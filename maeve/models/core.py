@@ -3,12 +3,14 @@ from pydantic import (
     BaseModel,
     model_validator,
     field_validator,
+    ValidationInfo,
     Field,
     ValidationError
 )
 from typing import Literal, Optional, Union
 
 import os
+import re
 from importlib import resources
 
 
@@ -145,11 +147,68 @@ class OrgConf(BaseModel):
     plugins: Optional[OrgConfPlugins] = OrgConfPlugins()
 
 
+class CatalogueConf(BaseModel):
+    # the most memory the catalogue may hold, in bytes or as a string e.g. "4GB". None is unlimited
+    memory_budget: Optional[Union[int, str]] = None
+    eviction_policy: str = "lru"
+    # if set, evicted items are written to files here rather than dropped
+    spill_dir: Optional[str] = None
+    spill_format: Literal["arrow", "parquet"] = "arrow"
+    spill_memory_map: bool = True
+    # "cow" stores and returns pandas objects as copy on write shallow copies and polars objects
+    # without copying. Anything else is deep copied. It needs pandas' copy_on_write mode, which
+    # changes how all pandas code in the process behaves, so it must be turned on beforehand.
+    copy_mode: Literal["deepcopy", "cow"] = "deepcopy"
+    # "sampled" fingerprints DataFrames from their schema, shape and a strided sample of
+    # rows rather than every row. Can be overridden per recipe with a `fingerprint` field.
+    fingerprint: Literal["exact", "sampled"] = "exact"
+    fingerprint_sample_rows: int = 1000
+    # cache fingerprints against the object, so hashing the same large frame again (e.g. on
+    # add and then get) is free. The cache only notices changes to shape, schema and a small
+    # sample of values, so after other in place edits call Catalogue.fingerprints.forget(obj).
+    fingerprint_cache: bool = False
+    # if set, the results of data loader recipes are kept here and reused by later sessions
+    # until the recipe or the files it reads change. See ResultCache.
+    result_cache_dir: Optional[str] = None
+    result_cache_max_bytes: Optional[Union[int, str]] = None
+    # also hash the contents of input files, rather than relying on their size and mtime
+    result_cache_content_hash: bool = False
+    result_cache_memory_map: bool = False
+
+    @field_validator('memory_budget', 'result_cache_max_bytes')
+    @classmethod
+    def parse_memory_budget(cls, memory_budget: Optional[Union[int, str]], info: ValidationInfo) -> Optional[int]:
+        return parse_bytes(memory_budget, name=info.field_name)
+
+
+def parse_bytes(size: Optional[Union[int, str]], name: str = "size") -> Optional[int]:
+    """
+    Converts sizes such as "4GB" or "2GiB" to bytes. ints and None are returned as they are.
+    """
+    if type(size) is not str:
+        return size
+    units = {"": 1, "B": 1, "KB": 1e3, "MB": 1e6, "GB": 1e9, "TB": 1e12,
+             "KIB": 2**10, "MIB": 2**20, "GIB": 2**30, "TIB": 2**40}
+    m = re.match(r"^\s*([\d.]+)\s*([a-zA-Z]*)\s*$", size)
+    if not m or m.group(2).upper() not in units.keys():
+        raise ValueError(f"Invalid {name} {size}")
+    return int(float(m.group(1)) * units[m.group(2).upper()])
+
+
 class EnvConf(BaseModel):
     name: str = "default"
     log_maxlen: int = int(1e+5)
     type: Optional[str] = None
     recipes_root: Union[str, dict, list] = None
+    recipe_cache_dir: Optional[str] = None
+    recipe_parse_workers: Optional[int] = None
+    recipe_parse_executor: Literal["auto", "process", "thread"] = "auto"
+    recipe_lazy_load: bool = False
+    recipe_compiled_cache: bool = False
+    # the pool used to cook a recipe's dependencies concurrently, see Session.prefetch
+    cook_workers: Optional[int] = None
+    cook_executor: Literal["thread", "process"] = "thread"
+    catalogue: CatalogueConf = CatalogueConf()
     paths: Union[dict] = {}
     load_package_recipes: list = [
         "demo_recipes",
@@ -182,6 +241,11 @@ class ConfscadeDefaults(BaseModel):
     DEFAULT_CONF_KEY: Optional[str] = "default"
     MINIMUM_CONF: Optional[dict] = {}
     ERROR_ON_NOTFOUND: Optional[bool] = False
+    CACHE_DIR: Optional[str] = None
+    PARSE_WORKERS: Optional[int] = None
+    PARSE_EXECUTOR: Optional[Literal["auto", "process", "thread"]] = "auto"
+    LAZY: Optional[bool] = False
+    COMPILED_CACHE: Optional[bool] = False
     OUTPUT_DATETIME_FMT: Optional[str] = "%Y-%m-%d %H:%M:%S"
 
 ########################################################
@@ -197,6 +261,9 @@ class FuncRecipe(BaseModel):
     namespace: Optional[str] = None
     add_to_catalogue: bool = False
     catalogue_name: Optional[str] = None
+    catalogue_pin: bool = False
+    fingerprint: Optional[Literal["exact", "sampled"]] = None
+    result_cache: bool = True
     fail_silently: bool = False
 
 
@@ -0,0 +1,396 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Literal, Union
+
+from maeve.models.core import ModelInfo
+from maeve.util.dict import DictUtils
+
+
+class PlanNode:
+    """
+    A recipe that gets cooked with no `obj` while cooking another recipe, e.g. the first
+    stage of a pipeline, so it can be cooked ahead of time and picked up from the catalogue.
+    """
+
+    def __init__(self, key: str, recipe: Union[str, dict], name: str = None, deps: set = None):
+        # the recipe hash, which is what the catalogue looks the result up by
+        self.key = key
+        # a recipe name or a resolved recipe, exactly as it will be passed to cook
+        self.recipe = recipe
+        self.name = name
+        self.deps = deps if deps else set()
+
+    def __repr__(self):
+        return f"PlanNode({self.name or self.key[:12]}, deps={len(self.deps)})"
+
+
+class RecipePlan:
+    """
+    The dependency DAG of a recipe (or a list of recipes), from Planner.plan
+    """
+
+    def __init__(self, nodes: dict, root: str = None):
+        self.nodes = nodes
+        self.root = root
+
+    def levels(self) -> list:
+        """
+        Returns
+        -------
+        Lists of node keys, where every node only depends on nodes in earlier lists so each
+        list can be cooked concurrently
+        """
+        done = set()
+        levels = []
+        remaining = set(self.nodes.keys())
+        while remaining:
+            level = sorted(k for k in remaining if self.nodes[k].deps.issubset(done))
+            levels.append(level)
+            done.update(level)
+            remaining.difference_update(level)
+        return levels
+
+    def to_dict(self) -> dict:
+        return {
+            "root": self.root,
+            "nodes": {k: {"name": n.name, "deps": sorted(n.deps)} for k, n in self.nodes.items()}
+        }
+
+    def __len__(self):
+        return len(self.nodes)
+
+
+class Planner:
+    """
+    Statically extracts the recipes that cooking a recipe will cook along the way: the
+    first stage of pipelines, the data_recipe of plots and the files of file concat
+    loaders, along with anything those depend on in turn. Anchors are already resolved
+    into the recipe by this point so the recipes they point to are found too.
+
+    Only recipes cooked with no `obj` are included, since anything that's passed an obj has
+    to wait for it anyway.
+    """
+
+    def __init__(self, session):
+        self.s = session
+
+    def plan(self, recipe: Union[str, dict, list], recipe_hash: str = None) -> RecipePlan:
+        nodes = {}
+        if type(recipe) is list:
+            for r in recipe:
+                self._add(r, nodes, [])
+            return RecipePlan(nodes)
+        root = self._add(recipe, nodes, [], key=recipe_hash)
+        return RecipePlan(nodes, root=root)
+
+    def _add(self, recipe: Union[str, dict], nodes: dict, chain: list, key: str = None):
+        # adds a node for `recipe` and its dependencies, returning its key
+        if type(recipe) is str:
+            name = recipe
+            resolved, key = self.s.recipes.get(recipe, exceptonmissing=True, return_hash=True)
+        elif type(recipe) is dict:
+            name = None
+            resolved = recipe
+            if key is None:
+                try:
+                    key = self.s.c.generate_obj_hash(recipe)
+                except TypeError:
+                    key = None
+        else:
+            return None
+        if key is None or key in chain:
+            # results without a hash can't be found in the catalogue, and cycles are left
+            # for cook to report
+            return None
+        if key in nodes.keys():
+            return key
+
+        node = PlanNode(key, recipe, name=name)
+        nodes[key] = node
+        for dep in self.sources(resolved):
+            dep_key = self._add(dep, nodes, chain + [key])
+            if dep_key:
+                node.deps.add(dep_key)
+        return key
+
+    def sources(self, recipe: dict) -> list:
+        """
+        Returns
+        -------
+        The recipes (names or dicts) that cooking `recipe` cooks with no obj
+        """
+        t = recipe.get(self.s.g.conf.type_field)
+        if t is None:
+            try:
+                t = ModelInfo.identify_model(recipe)
+            except ValueError:
+                return []
+
+        if t == "pipeline":
+            stages = recipe.get("pipeline")
+            if type(stages) is dict:
+                stages = list(stages.values())
+            elif type(stages) is str:
+                stages = [stages]
+            if not stages:
+                return []
+            first = stages[0]
+            if type(first) is str or (type(first) is dict and first.get("add_to_catalogue", True)):
+                return [first]
+            return []
+
+        if t == "mpl_plot" and type(recipe.get("data_recipe")) in [str, dict]:
+            return [recipe["data_recipe"]]
+
+        if t in ["data_loader", "dataloader"] and recipe.get("action") == "concat":
+            from maeve.plugins.data.extensions import DataLoader
+            try:
+                return DataLoader.file_recipes(recipe)
+            except (ValueError, OSError):
+                return []
+
+        return []
+
+
+class DagExecutor:
+    """
+    Cooks the nodes of a RecipePlan, each as soon as everything it depends on has been
+    cooked, on a pool of threads or processes. Results are added to the catalogue, which
+    is where the recipes that depend on them find them.
+
+    With processes each worker cooks in its own session (built from the same conf), so the
+    cooked objects must be picklable. Threads suit loaders that spend their time in
+    pandas or polars, which release the GIL.
+    """
+
+    def __init__(self, session, workers: int = None, executor: Literal["thread", "process"] = "thread"):
+        self.s = session
+        self.workers = workers
+        self.executor = executor
+
+    def run(self, plan: RecipePlan, include_root: bool = False) -> dict:
+        """
+        Parameters
+        ----------
+        plan: RecipePlan
+        include_root: bool
+            Whether to cook the root of the plan too, or only what it depends on
+
+        Returns
+        -------
+        A dict of node key to cooked object. Nodes that failed are logged and left out, so
+        that cooking the root reports the error in the usual way.
+        """
+        nodes = {k: n for k, n in plan.nodes.items() if include_root or k != plan.root}
+        waiting = {k: len(n.deps.intersection(nodes.keys())) for k, n in nodes.items()}
+        dependents = {}
+        for k, n in nodes.items():
+            for d in n.deps.intersection(nodes.keys()):
+                dependents.setdefault(d, set()).add(k)
+
+        results = {}
+        if not nodes:
+            return results
+        pool_cls = ProcessPoolExecutor if self.executor == "process" else ThreadPoolExecutor
+        with pool_cls(self.workers) as pool:
+            futures = {}
+
+            def submit(key):
+                if self.executor == "process":
+                    futures[pool.submit(cook_in_worker, self.s.init_kwargs, nodes[key].recipe)] = \
+                        (key, time.perf_counter())
+                else:
+                    futures[pool.submit(self.s.cook, nodes[key].recipe)] = (key, None)
+
+            for k in sorted(k for k, count in waiting.items() if count == 0):
+                submit(k)
+            while futures:
+                done, _ = wait(futures.keys(), return_when=FIRST_COMPLETED)
+                for f in done:
+                    key, start = futures.pop(f)
+                    try:
+                        results[key] = f.result()
+                        if start is not None:
+                            catalogue_worker_result(self.s, nodes[key].recipe, results[key],
+                                                    time.perf_counter() - start, recipe_hash=key)
+                    except Exception as e:
+                        self.s.log.warning(f"Prefetching {nodes[key].name or key} failed with error {e}")
+                    for d in sorted(dependents.get(key, set())):
+                        waiting[d] -= 1
+                        if waiting[d] == 0:
+                            submit(d)
+        return results
+
+
+class CookError(RuntimeError):
+    """
+    A recipe in a list that failed (or timed out) when the list was cooked in parallel. It
+    takes the recipe's place in the results, see Session.cook_from_list.
+    """
+
+    def __init__(self, recipe, error: BaseException, index: int = None, elapsed: float = None):
+        self.recipe = recipe
+        self.error = error
+        self.index = index
+        self.elapsed = elapsed
+        name = recipe if type(recipe) is str else (recipe.get("catalogue_name") or recipe.get("recipe_type"))
+        super().__init__(f"Recipe {name} at index {index} failed with {type(error).__name__}: {error}")
+
+    @property
+    def timed_out(self) -> bool:
+        return isinstance(self.error, TimeoutError)
+
+
+class ListExecutor:
+    """
+    Cooks a list of independent recipes concurrently, see Session.cook_from_list.
+
+    With the "auto" executor, function recipes (which are usually CPU bound) are cooked in
+    a process pool and everything else, e.g. loaders that spend their time waiting on files,
+    in a thread pool. Recipes cooked with an `obj` stay in threads, since the obj would have
+    to be pickled to a worker and the result back. As with DagExecutor, recipes cooked in
+    processes are cooked in a session per worker and their results must be picklable.
+
+    A recipe that runs for longer than `timeout` seconds is reported as timed out, but
+    threads can't be stopped so it carries on running in the background.
+    """
+
+    def __init__(self,
+                 session,
+                 workers: int = None,
+                 executor: Literal["auto", "thread", "process"] = "auto",
+                 timeout: float = None):
+        self.s = session
+        self.workers = workers
+        self.executor = executor
+        self.timeout = timeout
+
+    def run(self, recipes: list, **kwargs) -> list:
+        """
+        Parameters
+        ----------
+        recipes: list
+            Recipe names or dicts
+        **kwargs:
+            Passed to cook for every recipe
+
+        Returns
+        -------
+        The result of each recipe in the same order as `recipes`, with a CookError in place
+        of any that failed
+        """
+        results = [None] * len(recipes)
+        pools = {}
+        futures = {}
+        kinds = {}
+        for i, r in enumerate(recipes):
+            try:
+                kind = kinds[i] = self._executor_for(r, with_obj=kwargs.get("obj") is not None)
+            except Exception as e:
+                results[i] = CookError(r, e, index=i)
+                continue
+            if kind not in pools:
+                pool_cls = ProcessPoolExecutor if kind == "process" else ThreadPoolExecutor
+                pools[kind] = pool_cls(self.workers)
+            if kind == "process":
+                worker_kwargs = {k: v for k, v in kwargs.items() if k not in ["add_to_catalogue", "catalogue_name"]}
+                futures[pools[kind].submit(cook_in_worker, self.s.init_kwargs, r, **worker_kwargs)] = i
+            else:
+                futures[pools[kind].submit(self.s.cook, r, **kwargs)] = i
+
+        started = {}
+        abandoned = False
+        # without a timeout there's no need to keep checking on running recipes
+        tick = min(0.05, self.timeout / 10) if self.timeout else None
+        try:
+            while futures:
+                done, _ = wait(futures.keys(), timeout=tick, return_when=FIRST_COMPLETED)
+                now = time.perf_counter()
+                for f in done:
+                    i = futures.pop(f)
+                    elapsed = now - started.get(f, now)
+                    try:
+                        results[i] = f.result()
+                        if kinds[i] == "process" and kwargs.get("add_to_catalogue", True):
+                            catalogue_worker_result(
+                                self.s, recipes[i], results[i], elapsed, anchors=kwargs.get("anchors"),
+                                overrides=kwargs.get("overrides"), merge=kwargs.get("merge"),
+                                with_obj=kwargs.get("obj") is not None
+                            )
+                    except Exception as e:
+                        results[i] = CookError(recipes[i], e, index=i, elapsed=elapsed)
+                for f in list(futures.keys()):
+                    if f.running():
+                        started.setdefault(f, now)
+                    if self.timeout and now - started.get(f, now) > self.timeout:
+                        i = futures.pop(f)
+                        abandoned = True
+                        results[i] = CookError(
+                            recipes[i], TimeoutError(f"Cooking took longer than {self.timeout}s"),
+                            index=i, elapsed=now - started[f]
+                        )
+        finally:
+            for pool in pools.values():
+                pool.shutdown(wait=not abandoned, cancel_futures=True)
+
+        for r in results:
+            if isinstance(r, CookError):
+                self.s.log.warning(str(r))
+        return results
+
+    def _executor_for(self, recipe, with_obj: bool = False) -> str:
+        if self.executor != "auto":
+            return self.executor
+        if with_obj:
+            return "thread"
+        resolved = self.s.recipes.get(recipe, exceptonmissing=True) if type(recipe) is str else recipe
+        return "process" if self.s._plugin_name(resolved) == "function" else "thread"
+
+
+def catalogue_worker_result(session, recipe, obj, cook_time: float, recipe_hash: str = None,
+                            anchors: dict = None, overrides: dict = None, merge: dict = None,
+                            with_obj: bool = False):
+    """
+    Adds the result of a recipe cooked in a worker process to the session's catalogue, as
+    cook would have done had it been cooked in the session with the same anchors,
+    overrides, merge and (if with_obj) an obj
+    """
+    if obj is None:
+        return
+    # as with cook, only results of recipes cooked as they are can be found by recipe hash
+    canonical = not with_obj and anchors is None and overrides is None
+    if type(recipe) is str:
+        name = recipe
+        resolved, _hash = session.recipes.get(recipe, anchors=anchors, overrides=overrides, return_hash=True)
+        lineage = session.recipes.lineage(recipe)
+    else:
+        name, resolved, lineage = None, recipe, None
+        _hash = session._hash_recipe(recipe) if recipe_hash is None else recipe_hash
+    recipe_hash = recipe_hash if recipe_hash else _hash
+    if merge and type(merge) is dict:
+        resolved = DictUtils.mergedicts(resolved, merge)
+        recipe_hash = session._hash_recipe(resolved)
+    if not resolved.get("add_to_catalogue", True):
+        return
+    session.c.add(
+        obj,
+        recipe=resolved,
+        recipe_hash=recipe_hash,
+        name=resolved.get("catalogue_name", name),
+        metadata={"source": resolved.get(session.g.conf.type_field)},
+        hash_recipe_with_obj=not canonical,
+        cook_time=cook_time,
+        lineage=lineage
+    )
+
+
+# each worker process keeps a session for cooking the nodes it's given
+_worker_session = None
+
+
+def cook_in_worker(session_kwargs: dict, recipe: Union[str, dict], **kwargs):
+    global _worker_session
+    if _worker_session is None:
+        from maeve.session import Session
+        _worker_session = Session(**session_kwargs)
+    return _worker_session.cook(recipe, add_to_catalogue=False, **kwargs)
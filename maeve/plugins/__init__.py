@@ -1,4 +1,8 @@
+import asyncio
+import concurrent.futures
 import importlib
+import inspect
+import json
 from typing import Union
 from maeve.models.core import Globals, PluginParams
 import re
@@ -29,24 +33,72 @@ class Plugins:
             "MplPlot": (f"{self.s.g.core.package_name}.plugins.plot.matplotlib", "MplPlot", "recipe_plot")
         }
 
+        # resolved plugins, see get_plugin. The class and target method of each plugin name
+        # (or the ValueError for plugins that failed to import), parsed names and init params
+        self._classes = {}
+        self._names = {}
+        self._params = {}
+        # instances of stateless plugins by plugin name and init params
+        self._instances = {}
+
     def get_plugin(
             self,
             plugin,
             params=None,
             init=True
     ):
+        """
+        Finds a plugin and, if `init`, creates an instance of it.
+
+        Plugin classes (and failures to import 3rd party plugins) are cached by name, so
+        each plugin is only imported once per session. Plugins that set a `stateless`
+        class attribute to True have a single instance per set of init params, which is
+        reused by every cook. See `clear_cache`.
+
+        Returns
+        -------
+        A (class or instance, method) tuple, where method is None for the default entry point
+        """
         name, req_method = self.parse_plugin_name(plugin)
-        params = params if params else {}
-        params = PluginParams(**params)
+        params_key, params = self._plugin_params(params)
         cls, target_method = self.find_plugin(plugin)
         if all([req_method, target_method]):
             raise ValueError("Both recipe and plugin target contained a method request. Cannot resolve")
         method = target_method if target_method else req_method  # method defaults to None
         if not init:
             return cls, method
+        if params_key is None or not getattr(cls, "stateless", False):
+            return cls(self.s, *params.class_args, **params.class_kwargs), method
+        mod = self._instances.get((plugin, params_key))
+        if mod is None:
+            mod = self._instances[(plugin, params_key)] = cls(self.s, *params.class_args, **params.class_kwargs)
+        return mod, method
+
+    def clear_cache(self):
+        """
+        Forgets the plugins that have been found, e.g. after installing a plugin that
+        previously failed to import
+        """
+        self._classes.clear()
+        self._names.clear()
+        self._params.clear()
+        self._instances.clear()
+
+    def _plugin_params(self, params: dict = None) -> tuple:
+        # returns the key and PluginParams for params, where the key is None if params
+        # aren't json (and so can't be cached)
+        if not params or not any(params.values()):
+            params_key = ""
         else:
-            mod = cls(self.s, *params.class_args, **params.class_kwargs)
-            return mod, method
+            try:
+                params_key = json.dumps(params, sort_keys=True)
+            except TypeError:
+                return None, PluginParams(**params)
+        try:
+            return params_key, self._params[params_key]
+        except KeyError:
+            p = self._params[params_key] = PluginParams(**params) if params_key else PluginParams()
+            return params_key, p
 
     def get_and_run_plugin(
             self,
@@ -71,33 +123,84 @@ class Plugins:
         if not method:
             method = self.s.g.conf.plugin_default_entrypoint
         if recipe:
-            return getattr(mod, method)(recipe, *args, **kwargs)
+            ret = getattr(mod, method)(recipe, *args, **kwargs)
         else:
-            return getattr(mod, method)(*args, **kwargs)
+            ret = getattr(mod, method)(*args, **kwargs)
+        if inspect.iscoroutine(ret):
+            # an async entry point cooked with Session.cook rather than Session.acook
+            ret = self._run_coroutine(ret)
+        return ret
+
+    @staticmethod
+    def _run_coroutine(coro):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coro)
+        # called from a running event loop, e.g. in Jupyter, which asyncio.run can't be, so the
+        # coroutine gets its own loop on another thread. Session.acook avoids blocking the loop.
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
+            return pool.submit(asyncio.run, coro).result()
+
+    def async_entrypoint(self, cls, method: str = None) -> Union[str, None]:
+        """
+        The name of the async version of a plugin method, for Session.acook. That's the
+        method itself if it's a coroutine function, else the method with an "a" prefix
+        (e.g. `aload` for `load`) if the plugin has one.
+
+        Returns
+        -------
+        The name of the coroutine function, or None if the plugin only has a sync method
+        """
+        if not method:
+            method = self.s.g.conf.plugin_default_entrypoint
+        for name in [method, f"a{method}"]:
+            if inspect.iscoroutinefunction(getattr(cls, name, None)):
+                return name
+        return None
 
     def parse_plugin_name(self, name):
+        try:
+            return self._names[name]
+        except KeyError:
+            pass
         parts = re.split(self.s.g.conf.plugin_delim, name)
         try:
-            return parts[0], parts[1]
+            parsed = parts[0], parts[1]
         except IndexError:
-            return parts[0], None
+            parsed = parts[0], None
+        self._names[name] = parsed
+        return parsed
 
     def find_plugin(self, plugin: Union[str, list, tuple]):
         if type(plugin) is str:
-            bundled_plugin, cls, method = self.resolve_plugin(plugin)
-            if bundled_plugin:
-                # see if it's a bundled plugin
-                self.s.log.debug(f"Found bundled plugin {bundled_plugin} attempting to import via {__name__}")
-                mod = importlib.import_module(bundled_plugin)
-                return getattr(mod, cls), method
-            else:
+            found = self._classes.get(plugin)
+            if found is None:
                 try:
-                    # otherwise try and import from system
-                    self.s.log.debug(f"Attempting to fetch 3rd party plugin {plugin}")
-                    mod = importlib.import_module(plugin)
-                except ModuleNotFoundError:
-                    # give up
-                    raise ValueError(f"No plugin found with name {plugin}")
-                return getattr(mod, plugin), None
+                    found = self._find_plugin(plugin)
+                except ValueError as e:
+                    found = e
+                self._classes[plugin] = found
+            if isinstance(found, ValueError):
+                # a 3rd party plugin that didn't import before won't now either
+                raise ValueError(str(found))
+            return found
         else:
             raise TypeError(f"Invalid type {type(plugin)} passed for plugin")
+
+    def _find_plugin(self, plugin: str):
+        bundled_plugin, cls, method = self.resolve_plugin(plugin)
+        if bundled_plugin:
+            # see if it's a bundled plugin
+            self.s.log.debug(f"Found bundled plugin {bundled_plugin} attempting to import via {__name__}")
+            mod = importlib.import_module(bundled_plugin)
+            return getattr(mod, cls), method
+        else:
+            try:
+                # otherwise try and import from system
+                self.s.log.debug(f"Attempting to fetch 3rd party plugin {plugin}")
+                mod = importlib.import_module(plugin)
+            except ModuleNotFoundError:
+                # give up
+                raise ValueError(f"No plugin found with name {plugin}")
+            return getattr(mod, plugin), None
@@ -2,6 +2,8 @@ from maeve.util.function import FuncUtils
 
 
 class Pipeline:
+    stateless = True
+
     def __init__(self, session):
         self.s = session
 
@@ -10,6 +12,8 @@ class Pipeline:
 
 
 class Function:
+    stateless = True
+
     def __init__(self, session):
         self.s = session
 
@@ -4,13 +4,15 @@ from .backends.pandas import PandasDataFrame
 from .backends.pandas import PandasSeries
 from .backends.polars import PolarsDataFrame
 from .backends.polars import PolarsSeries
-from maeve.models.core import DataLoaderRecipe, FileConcatDataLoaderRecipe
+from maeve.models.core import DataLoaderRecipe, FileConcatDataLoaderRecipe, LocationRecipe
 from maeve.util.function import FuncUtils
 from maeve.util.os import FSUtils as fs
 from maeve.plugins.plot.matplotlib import MplPlot
 import pandas as pd
 import polars as pl
+import asyncio
 import importlib
+import os
 
 g = Globals()
 
@@ -148,6 +150,8 @@ class Series:
 
 
 class DataLoader:
+    stateless = True
+
     def __init__(self, session):
         self.s = session
 
@@ -170,6 +174,8 @@ class DataLoader:
     def load(self, recipe, obj=None):
         if obj is not None:
             return obj
+        if recipe.get("action") == "concat":
+            return self.load_files_concat(recipe)
         recipe = DataLoaderRecipe(**recipe).model_dump()
         backend = self.get_backend(recipe["backend"])
         return FuncUtils.run_func_recipe(
@@ -179,6 +185,51 @@ class DataLoader:
 
     main = load
 
+    async def aload(self, recipe, obj=None):
+        """
+        The async version of load, used by Session.acook. The files of a file concat recipe
+        are cooked concurrently with acook_many, anything else is loaded in a thread.
+        """
+        if obj is not None:
+            return obj
+        if recipe.get("action") != "concat":
+            return await asyncio.to_thread(self.load, recipe)
+        r = FileConcatDataLoaderRecipe(**recipe)
+        file_recipes = self.file_recipes(recipe)
+        # as with load_files_concat, the files' frames are only kept if they were prefetched
+        results = await self.s.acook_many(file_recipes, return_exceptions=r.fail_mode == "ignore",
+                                          add_to_catalogue=False)
+        dfs = []
+        for fr, df in zip(file_recipes, results):
+            if isinstance(df, Exception):
+                self.s.log.warning(f"Unable to load {fr['location']}, skipping: {df}")
+                continue
+            dfs.append(df)
+        df = await asyncio.to_thread(self.get_backend(r.backend).concat, dfs, **r.concat_kwargs)
+        self._add_session_to_df(df)
+        return df
+
+    amain = aload
+
+    @staticmethod
+    def input_files(recipe, method=None):
+        """
+        The files that running `method` with `recipe` would read, so that the result can be
+        kept in the session's result cache. Returns None if they aren't known in advance,
+        e.g. for URLs or methods that search a directory.
+        """
+        if method not in [None, "main", "load"]:
+            return None
+        loc = DataLoaderRecipe(**recipe).args[0]
+        if type(loc) is str and os.path.isfile(loc):
+            return [loc]
+        return None
+
+    @add_session
+    def restore_result(self, obj):
+        # results read back from the result cache need the session adding as if just loaded
+        return obj
+
     @add_session
     def get_files_from_recipe(self, recipe):
         return fs.os_walk_and_filter(
@@ -201,9 +252,40 @@ class DataLoader:
 
     @add_session
     def load_files_concat(self, recipe):
-        recipe = FileConcatDataLoaderRecipe(**recipe).model_dump()
-        files = self.get_files_from_recipe(recipe)
-        return pd.concat(files, **recipe["concat_kwargs"])
+        # each file is cooked as its own recipe, so files can be loaded (or prefetched) in
+        # parallel and come from the catalogue. See file_recipes. They're only added to the
+        # catalogue when prefetched, since otherwise each frame would be held twice.
+        concat_kwargs = FileConcatDataLoaderRecipe(**recipe).concat_kwargs
+        dfs = []
+        for r in self.file_recipes(recipe):
+            try:
+                dfs.append(self.s.cook(r, add_to_catalogue=False))
+            except (RuntimeError, ValueError, OSError) as e:
+                if recipe["fail_mode"] != "ignore":
+                    raise
+                self.s.log.warning(f"Unable to load {r['location']}, skipping: {e}")
+        return self.get_backend(recipe.get("backend", "pandas")).concat(dfs, **concat_kwargs)
+
+    @staticmethod
+    def file_recipes(recipe) -> list:
+        """
+        The recipes for loading each of the files matched by a file concat recipe, i.e. the
+        recipe with its location replaced by the file
+        """
+        r = FileConcatDataLoaderRecipe(**recipe)
+        loc = r.location.path if isinstance(r.location, LocationRecipe) else r.location
+        if type(loc) is dict:
+            loc = loc["path"]
+        files = sorted(fs.os_walk_and_filter(loc, fileregex=r.file_regex, dirregex=r.dir_regex))
+        return [{
+            "recipe_type": "data_loader",
+            "backend": r.backend,
+            "function": r.function,
+            # the validator put the directory in args
+            "args": r.args[1:],
+            "kwargs": r.kwargs,
+            "location": f
+        } for f in files]
 
     @add_session
     def load_files_merge(self, recipe):
@@ -21,6 +21,8 @@ class Subplots:
 
 
 class MplPlot:
+    stateless = True
+
     def __init__(self, session):
         self.s = session
 
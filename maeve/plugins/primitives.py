@@ -1,4 +1,6 @@
 class Primitives:
+    stateless = True
+
     def __init__(self, session):
         self.s = session
 
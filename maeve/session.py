@@ -1,10 +1,16 @@
+import asyncio
+import functools
 import importlib
 import importlib.metadata
-from typing import Union, Any, Optional
+import time
+from typing import Union, Any, Optional, Literal
 
 from maeve.catalogue import Catalogue, Register
+from maeve.catalogue.lazy import LazyHandle
+from maeve.compiler import CompiledPlan, Compiler
 from maeve.conf import Confscade
 from maeve.models.core import Globals, OrgConf, EnvConf, ModelInfo, DataLoaderRecipe
+from maeve.planner import DagExecutor, ListExecutor, Planner, RecipePlan
 from maeve.plugins import Plugins
 from maeve.plugins.data.extensions import Data
 from maeve.util.dict import DictUtils
@@ -44,6 +50,8 @@ class Session:
         """
 
         self.__version__ = importlib.metadata.version('maeve')
+        # kept so that worker processes can build an equivalent session
+        self.init_kwargs = dict(conf=conf, log_level=log_level, log_location=log_location, log_maxlen=log_maxlen)
 
         log = Logger(
             log_level=log_level,
@@ -60,6 +68,7 @@ class Session:
         self.r.org = OrgConf(**self.r._org.get("org"))
         # env level conf e.g. locations
         self.r.env = EnvConf(**self.r._org.get("env"))
+        self.c.configure(self.r.env.catalogue)
 
         self.log = self.c.add(
             log,
@@ -70,6 +79,7 @@ class Session:
                 description="The session log. Inspect object for methods for interrogating.",
             ),
             return_item="object",
+            pin=True
         ).obj
         self.recipes = None
         self._get_recipes()
@@ -84,19 +94,43 @@ class Session:
             else:
                 self.log.debug("No recipes locations found")
         loc = RecipeUtils.add_package_recipes(loc, self.r.env.load_package_recipes)
-        self.recipes = Confscade(loc, env_conf=self.r.env, logger=self.log)
+        self.recipes = Confscade(
+            loc,
+            env_conf=self.r.env,
+            logger=self.log,
+            cache_dir=self.r.env.recipe_cache_dir,
+            parse_workers=self.r.env.recipe_parse_workers,
+            parse_executor=self.r.env.recipe_parse_executor,
+            lazy=self.r.env.recipe_lazy_load,
+            compiled_cache=self.r.env.recipe_compiled_cache
+        )
         self.r.recipes = self.recipes
 
+    def refresh_recipes(self) -> set:
+        """
+        Incrementally reloads the recipe book, re-parsing only the recipe files that have changed
+        since they were loaded. Catalogue items cooked from any changed recipe (or a recipe that
+        inherits from or anchors to one) are removed.
+
+        Returns
+        -------
+        The names of the recipes that were affected
+        """
+        changed = self.recipes.refresh()
+        if changed:
+            removed = self.c.remove_by_name(changed)
+            self.log.debug(f"Reloaded recipes {sorted(changed)}, removed {len(removed)} catalogue items")
+        return changed
+
     def router(func):
         def route(self, *args, **kwargs):
             if type(args[0]) is str and args[0] in self.g.core.cook_router_values:
                 return func(self, self._router_params(*args, **kwargs), **kwargs.get("cook_kwargs", {}))
             if type(args[0]) is list:
-                if kwargs.get("list_mode", "sequence"):
-                    return self.cook_from_list(*args, **kwargs)
-                else:
-                    args[0] = self.recipe_list_to_pipeline(args[0])
-                    return func(*args, *kwargs)
+                list_mode = kwargs.pop("list_mode", "sequence")
+                if list_mode == "pipeline":
+                    return func(self, self.recipe_list_to_pipeline(args[0]), *args[1:], **kwargs)
+                return self.cook_from_list(*args, list_mode=list_mode, **kwargs)
             return func(self, *args, **kwargs)
 
         return route
@@ -113,13 +147,16 @@ class Session:
              catalogue_metadata: dict = None,
              return_obj: bool = True,
              use_from_catalogue: bool = True,
-             reload_recipes: bool = False,
-             list_mode: str = "pipeline",
+             reload_recipes: Union[bool, Literal["full", "incremental"]] = False,
+             list_mode: Literal["sequence", "parallel", "pipeline"] = "sequence",
+             lazy: bool = False,
+             parallel: bool = False,
              *args,
              **kwargs
              ) -> Union[Any, None]:
         """
-        Cooks (runs) a recipe and returns any results
+        Cooks (runs) a recipe and returns any results. Recipes can be cooked from multiple
+        threads at once, and concurrent cooks of the same recipe share a single cook.
         Parameters
         ----------
         recipe: str
@@ -157,12 +194,26 @@ class Session:
             name exist in the catalogue, and if so will return that. This can be helpful
             when working with, for example, large base datasets that can be cached and used
             by multiple dependant recipes. Beware: since catalogue items
-            are mutable, the object returned may not be exactly as you expect.
+            are mutable, the object returned may not be exactly as you expect,
+            unless the catalogue copy_mode is "cow" in which case DataFrames
+            are returned as copy on write copies.
             Setting this ,
             Default True.
-        reload_recipes: bool
-            if True will reload the entire recipe book before cooking. This is useful
-            if you're making changes to the stored recipes.
+        reload_recipes: bool, str
+            if True or "full" will reload the entire recipe book before cooking. This is useful
+            if you're making changes to the stored recipes. "incremental" will only re-parse
+            recipe files that have changed since they were loaded, see `refresh_recipes`.
+        list_mode: str
+            How a list of recipes is cooked. "sequence" cooks them one after the other and
+            "parallel" cooks them concurrently, see `cook_from_list`. "pipeline" cooks them
+            as the stages of a pipeline.
+        lazy: bool
+            If True the recipe is resolved but not cooked, and a LazyHandle is returned (and
+            catalogued) in place of the object. The recipe is cooked the first time the
+            handle is read, see LazyHandle. Ignored if `obj` is given.
+        parallel: bool
+            If True, the recipes that this recipe depends on (e.g. the loaders at the start of
+            pipelines) are first cooked concurrently, see `prefetch`.
         *args, **kwargs:
             Any additional args and kwargs will be passed directly to the
             plugin method being run. See docs for plugin for details
@@ -172,6 +223,9 @@ class Session:
 
         """
         _obj = obj
+        if isinstance(obj, LazyHandle):
+            # a downstream stage needs the real object
+            obj = obj.materialize()
 
         # if we've not been passed an obj, and no adjustments are made to the recipe
         # then the recipe was run "as is". We will save this object in the catalogue
@@ -181,30 +235,110 @@ class Session:
         else:
             canonical = False
 
-        if reload_recipes:
+        if reload_recipes == "incremental":
+            self.refresh_recipes()
+        elif reload_recipes:
             self._get_recipes()
 
+        # the recipe hash is computed once here and used for the catalogue and result cache
+        recipe, recipe_hash, recipe_name, lineage = self._resolve(recipe, anchors, overrides)
+
+        if parallel and obj is None and not lazy:
+            self.prefetch(recipe, recipe_hash=recipe_hash)
+
+        if lazy and obj is None:
+            if merge and type(merge) is dict:
+                recipe = DictUtils.mergedicts(recipe, merge)
+                recipe_hash = self._hash_recipe(recipe)
+            return self._lazy(recipe, recipe_hash, recipe_name, lineage, add_to_catalogue,
+                              catalogue_name, catalogue_metadata, use_from_catalogue)
+
+        kw = dict(
+            recipe_name=recipe_name,
+            lineage=lineage,
+            canonical=canonical,
+            merge=merge,
+            add_to_catalogue=add_to_catalogue,
+            catalogue_name=catalogue_name,
+            catalogue_metadata=catalogue_metadata,
+            use_from_catalogue=use_from_catalogue
+        )
+        if use_from_catalogue and obj is None and recipe_hash:
+            # threads cooking the same recipe at once share a single cook
+            obj, shared = self.c.flights.do(
+                recipe_hash, lambda: self._cook_resolved(recipe, recipe_hash, None, *args, **kw, **kwargs)
+            )
+            if shared and obj is not None:
+                try:
+                    obj = self.c.get(recipe_hash, method="hash")
+                except ValueError:
+                    obj = self.c.copy_obj(obj)
+        else:
+            obj = self._cook_resolved(recipe, recipe_hash, obj, *args, **kw, **kwargs)
+        if return_obj:
+            return obj
+
+    def _resolve(self, recipe: Union[str, dict], anchors: dict = None, overrides: dict = None) -> tuple:
+        # returns the resolved recipe, its hash, its name and its lineage
         if type(recipe) is str:
-            recipe_name = recipe
-            recipe = self.recipes.get(recipe, anchors=anchors, overrides=overrides, exceptonmissing=True)
+            lineage = self.recipes.lineage(recipe)
+            resolved, recipe_hash = self.recipes.get(
+                recipe, anchors=anchors, overrides=overrides, exceptonmissing=True, return_hash=True
+            )
+            return resolved, recipe_hash, recipe, lineage
         elif type(recipe) is dict:
-            recipe_name = None
+            return recipe, self._hash_recipe(recipe), None, None
         else:
             raise ValueError("recipe must be either str or dict")
 
+    def _cook_resolved(self,
+                       recipe: dict,
+                       recipe_hash: Optional[str],
+                       obj: Any,
+                       *args,
+                       recipe_name: str = None,
+                       lineage: set = None,
+                       canonical: bool = False,
+                       merge: dict = None,
+                       add_to_catalogue: bool = True,
+                       catalogue_name: str = None,
+                       catalogue_metadata: dict = None,
+                       use_from_catalogue: bool = True,
+                       **kwargs):
+        # the rest of cook once the recipe has been resolved. Returns the cooked object.
+        job = self._prepare_cook(recipe, recipe_hash, obj, bool(args or kwargs), recipe_name, merge,
+                                 add_to_catalogue, catalogue_name, use_from_catalogue)
+        if "hit" in job:
+            if isinstance(job["hit"], LazyHandle):
+                return job["hit"].materialize()
+            return job["hit"]
+        if job["cached"] is not None:
+            obj = job["cached"]
+        else:
+            obj = self.plugins.run_plugin_method(
+                job["mod"], recipe=job["recipe"], method=job["method"], obj=obj, *args, **kwargs
+            )
+        return self._finish_cook(job, obj, lineage, canonical, catalogue_metadata)
+
+    def _prepare_cook(self, recipe, recipe_hash, obj, has_args, recipe_name, merge,
+                      add_to_catalogue, catalogue_name, use_from_catalogue) -> dict:
+        # everything cooking does before running the plugin. Returns a dict of what's needed
+        # to run it and catalogue the result, or {"hit": obj} if the recipe was in the catalogue.
+
         # use what's already in catalogue
-        if use_from_catalogue and obj is None:
+        if use_from_catalogue and obj is None and recipe_hash:
             try:
                 self.log.debug("Attempting to retrieve from catalogue via recipe_hash")
-                _obj = self.c.get(recipe, method="obj")
+                _obj = self.c.get(recipe_hash, method="hash")
                 self.log.info("Found recipe in catalogue so using that")
-                return _obj
+                return {"hit": _obj}
             except ValueError:
                 self.log.debug("hashed recipe not in catalogue")
                 pass
 
         if merge and type(merge) is dict:
             recipe = DictUtils.mergedicts(recipe, merge)
+            recipe_hash = self._hash_recipe(recipe)
         add_to_catalogue = recipe.get("add_to_catalogue", add_to_catalogue)
 
         if recipe.get("add_to_catalogue", add_to_catalogue):
@@ -214,34 +348,333 @@ class Session:
         else:
             recipe_name = catalogue_name if catalogue_name else recipe_name
 
-        try:
-            plugin = recipe[self.g.conf.type_field]
-        except KeyError:
-            # attempts to identify recipe by using model validation
-            # will raise if validates
-            plugin = ModelInfo.identify_model(recipe, log=self.log)
-
+        plugin = self._plugin_name(recipe)
         params = recipe.get(self.g.conf.init_params_field, {})
-        obj = self.plugins.get_and_run_plugin(plugin, recipe, params=params, obj=obj, *args, **kwargs)
+        start = time.perf_counter()
+        mod, method = self.plugins.get_plugin(plugin, params)
+        result_key, inputs = None, None
+        if obj is None and not has_args:
+            result_key, inputs = self._result_cache_key(mod, method, recipe, recipe_hash)
+        cached = self.c.results.get(result_key) if result_key else None
+        if cached is not None:
+            self.log.info("Found recipe in result cache so using that")
+            cached = mod.restore_result(cached) if hasattr(mod, "restore_result") else cached
+        return dict(
+            recipe=recipe,
+            recipe_hash=recipe_hash,
+            recipe_name=recipe_name,
+            add_to_catalogue=add_to_catalogue,
+            plugin=plugin,
+            mod=mod,
+            method=method,
+            result_key=result_key,
+            inputs=inputs,
+            cached=cached,
+            start=start
+        )
+
+    def _finish_cook(self, job: dict, obj: Any, lineage: set, canonical: bool, catalogue_metadata: dict):
+        # everything cooking does after running the plugin
+        if job["cached"] is None and job["result_key"] and obj is not None:
+            try:
+                self.c.results.put(job["result_key"], obj, inputs=job["inputs"])
+            except Exception as e:
+                # e.g. a full disk or an unpicklable result, neither of which should fail the cook
+                self.log.warning(f"Could not add {job['recipe_name']} to the result cache: {e}")
+                self.c.results.remove(job["result_key"])
+        cook_time = time.perf_counter() - job["start"]
         if obj is not None:
-            if add_to_catalogue:
+            if job["add_to_catalogue"]:
+                recipe = job["recipe"]
                 cm = catalogue_metadata if catalogue_metadata else {"metadata": {}}
                 if canonical:
                     cm["hash_recipe_with_obj"] = False
                 else:
                     cm["hash_recipe_with_obj"] = True
 
-                cm["name"] = cm.get("name", recipe_name)
+                cm["name"] = cm.get("name", job["recipe_name"])
                 cm["recipe"] = recipe
-                cm["metadata"]["source"] = cm.get("source", plugin)
+                cm["recipe_hash"] = job["recipe_hash"]
+                cm["lineage"] = cm.get("lineage", lineage)
+                cm["metadata"]["source"] = cm.get("source", job["plugin"])
                 cm["metadata"]["obj_type"] = cm.get("obj_type", str(type(obj)))
+                cm["cook_time"] = cook_time
+                cm["pin"] = cm.get("pin", recipe.get("catalogue_pin", False))
+                cm["fingerprint"] = cm.get("fingerprint", recipe.get("fingerprint"))
 
                 self.c.add(obj, **cm)
 
-            if return_obj:
-                return obj
+        return obj
+
+    def _plugin_name(self, recipe: dict) -> str:
+        try:
+            return recipe[self.g.conf.type_field]
+        except KeyError:
+            # attempts to identify recipe by using model validation
+            # will raise if validates
+            return ModelInfo.identify_model(recipe, log=self.log)
+
+    async def acook(self,
+                    recipe: Union[str, dict],
+                    obj: Any = None,
+                    overrides: dict = None,
+                    merge: dict = None,
+                    add_to_catalogue: bool = True,
+                    anchors: dict = None,
+                    catalogue_name: str = None,
+                    catalogue_metadata: dict = None,
+                    return_obj: bool = True,
+                    use_from_catalogue: bool = True,
+                    **kwargs
+                    ) -> Union[Any, None]:
+        """
+        Cooks a recipe from a coroutine, e.g. `df = await maeve.acook("my_recipe")`. Takes
+        the same arguments as cook.
+
+        If the recipe's plugin has an async entry point (see Plugins.async_entrypoint, e.g.
+        DataLoader.aload) it's awaited on the event loop. Otherwise the whole cook is run
+        on the loop's default executor so that the loop isn't blocked. Concurrent awaits of
+        the same recipe share a single cook.
+        """
+        loop = asyncio.get_running_loop()
+        if isinstance(obj, LazyHandle):
+            obj = await loop.run_in_executor(None, obj.materialize)
+        canonical = obj is None and anchors is None and overrides is None
+        resolved, recipe_hash, recipe_name, lineage = self._resolve(recipe, anchors, overrides)
+
+        async def run():
+            plugin_cls, method = self.plugins.get_plugin(
+                self._plugin_name(resolved), resolved.get(self.g.conf.init_params_field, {}), init=False
+            )
+            entrypoint = self.plugins.async_entrypoint(plugin_cls, method)
+            if entrypoint is None:
+                return await loop.run_in_executor(None, functools.partial(
+                    self.cook, recipe, obj=obj, overrides=overrides, merge=merge,
+                    add_to_catalogue=add_to_catalogue, anchors=anchors, catalogue_name=catalogue_name,
+                    catalogue_metadata=catalogue_metadata, use_from_catalogue=use_from_catalogue, **kwargs
+                ))
 
-    def cook_from_list(self, recipes, *args, **kwargs):
+            # catalogue lookups, result cache reads and hashing the result can all block, so
+            # only the plugin itself runs on the loop
+            job = await loop.run_in_executor(None, functools.partial(
+                self._prepare_cook, resolved, recipe_hash, obj, bool(kwargs), recipe_name, merge,
+                add_to_catalogue, catalogue_name, use_from_catalogue
+            ))
+            if "hit" in job:
+                if isinstance(job["hit"], LazyHandle):
+                    return await loop.run_in_executor(None, job["hit"].materialize)
+                return job["hit"]
+            if job["cached"] is not None:
+                cooked = job["cached"]
+            else:
+                cooked = await getattr(job["mod"], entrypoint)(job["recipe"], obj=obj, **kwargs)
+            return await loop.run_in_executor(None, functools.partial(
+                self._finish_cook, job, cooked, lineage, canonical, catalogue_metadata
+            ))
+
+        if use_from_catalogue and obj is None and recipe_hash:
+            cooked, shared = await self.c.aflights.do(recipe_hash, run)
+            if shared and cooked is not None:
+                try:
+                    cooked = self.c.get(recipe_hash, method="hash")
+                except ValueError:
+                    cooked = self.c.copy_obj(cooked)
+        else:
+            cooked = await run()
+        if return_obj:
+            return cooked
+
+    async def acook_many(self, recipes: list, return_exceptions: bool = False, **kwargs) -> list:
+        """
+        Cooks a list of recipes concurrently with acook
+
+        Parameters
+        ----------
+        recipes: list
+            Recipe names or dicts
+        return_exceptions: bool
+            If True, a recipe that fails has its exception in its place in the results,
+            otherwise the first exception is raised
+        **kwargs:
+            Passed to acook for every recipe
+
+        Returns
+        -------
+        The cooked objects, in the same order as `recipes`
+        """
+        return list(await asyncio.gather(
+            *[self.acook(r, **kwargs) for r in recipes], return_exceptions=return_exceptions
+        ))
+
+    def compile(self, recipe: Union[str, dict], anchors: dict = None, overrides: dict = None) -> CompiledPlan:
+        """
+        Resolves a recipe and binds it to its plugins and functions once, returning a plan
+        that can be run against many objects, e.g. `maeve.compile("my_pipeline")(df)`.
+        See CompiledPlan.
+
+        Parameters
+        ----------
+        recipe: str, dict
+        anchors: dict
+            As for cook
+        overrides: dict
+            As for cook
+        """
+        return Compiler(self).compile(recipe, anchors=anchors, overrides=overrides)
+
+    def plan(self, recipe: Union[str, dict, list], recipe_hash: str = None) -> RecipePlan:
+        """
+        The dependency DAG of a recipe or list of recipes, see Planner
+        """
+        return Planner(self).plan(recipe, recipe_hash=recipe_hash)
+
+    def prefetch(self,
+                 recipe: Union[str, dict, list],
+                 recipe_hash: str = None,
+                 workers: int = None,
+                 executor: Literal["thread", "process"] = None
+                 ) -> RecipePlan:
+        """
+        Cooks everything that `recipe` depends on into the catalogue, running independent
+        recipes concurrently, so that cooking `recipe` afterwards only has to wait for the
+        slowest of them. Every recipe in a list is cooked.
+
+        Parameters
+        ----------
+        recipe: str, dict, list
+        recipe_hash: str
+            The hash of `recipe` if it's a dict and it's already known
+        workers: int
+            Defaults to the env's cook_workers
+        executor: str
+            "thread" or "process", defaults to the env's cook_executor
+
+        Returns
+        -------
+        The plan that was run
+        """
+        plan = self.plan(recipe, recipe_hash=recipe_hash)
+        DagExecutor(
+            self,
+            workers=workers if workers else self.r.env.cook_workers,
+            executor=executor if executor else self.r.env.cook_executor
+        ).run(plan, include_root=type(recipe) is list)
+        return plan
+
+    def _lazy(self, recipe, recipe_hash, recipe_name, lineage, add_to_catalogue,
+              catalogue_name, catalogue_metadata, use_from_catalogue):
+        if use_from_catalogue and recipe_hash:
+            try:
+                # already cooked (or already a handle) so there's nothing to defer
+                return self.c.get(recipe_hash, method="hash")
+            except ValueError:
+                pass
+        add_to_catalogue = recipe.get("add_to_catalogue", add_to_catalogue)
+        name = recipe.get("catalogue_name", catalogue_name if catalogue_name else recipe_name)
+        handle = LazyHandle(self, recipe, recipe_hash=recipe_hash, name=name, lineage=lineage,
+                            add_to_catalogue=add_to_catalogue, catalogue_metadata=catalogue_metadata)
+        if add_to_catalogue:
+            handle.catalogue_id = self.c.add(
+                handle,
+                recipe=recipe,
+                recipe_hash=recipe_hash,
+                name=name,
+                metadata={"source": recipe.get(self.g.conf.type_field), "lazy": True},
+                copy_obj=False,
+                hash_recipe_with_obj=False,
+                lineage=lineage
+            )
+        return handle
+
+    def materialize(self, handle: LazyHandle) -> Any:
+        """
+        Cooks the recipe of a LazyHandle, replacing the handle in the catalogue with the
+        result. Use handle.materialize() rather than calling this directly.
+        """
+        cm = dict(handle.catalogue_metadata) if handle.catalogue_metadata else {"metadata": {}}
+        cm["name"] = cm.get("name", handle.name)
+        cm["lineage"] = cm.get("lineage", handle.lineage)
+        obj = self.cook(
+            handle.recipe,
+            add_to_catalogue=handle.add_to_catalogue,
+            catalogue_metadata=cm,
+            use_from_catalogue=False
+        )
+        if handle.catalogue_id:
+            try:
+                self.c.remove(handle.catalogue_id)
+            except KeyError:
+                # already evicted or removed
+                pass
+        return obj
+
+    def _hash_recipe(self, recipe: dict) -> Optional[str]:
+        try:
+            return self.c.generate_obj_hash(recipe)
+        except TypeError as e:
+            self.log.debug(f"Unable to hash recipe: {e}")
+            return None
+
+    def _result_cache_key(self, mod, method, recipe: dict, recipe_hash: str = None) -> tuple:
+        """
+        Returns
+        -------
+        The result cache key and input files for a recipe, or (None, None) if there's no
+        result cache or the plugin can't say which files the recipe reads
+        """
+        if self.c.results is None or not recipe_hash or not recipe.get("result_cache", True) \
+                or not hasattr(mod, "input_files"):
+            return None, None
+        try:
+            inputs = mod.input_files(recipe, method)
+            if not inputs:
+                return None, None
+            return self.c.results.key(recipe_hash, inputs), inputs
+        except (ValueError, OSError) as e:
+            self.log.debug(f"Not using the result cache for recipe: {e}")
+            return None, None
+
+    def cook_from_list(self,
+                       recipes: list,
+                       *args,
+                       list_mode: Literal["sequence", "parallel"] = "sequence",
+                       workers: int = None,
+                       executor: Literal["auto", "thread", "process"] = "auto",
+                       timeout: float = None,
+                       **kwargs) -> list:
+        """
+        Cooks each recipe in a list. This is what cook does when it's given a list.
+
+        Parameters
+        ----------
+        recipes: list
+            Recipe names or dicts
+        list_mode: str
+            "sequence" cooks the recipes one after the other, returning the objects that were
+            cooked and logging (and leaving out) any recipe that fails.
+            "parallel" cooks them concurrently and returns a result for every recipe in the
+            same order as `recipes`, with a CookError in place of any that failed.
+        workers: int
+            The size of the pools used in parallel mode, defaults to the env's cook_workers
+        executor: str
+            For parallel mode. "auto" cooks function recipes in processes and anything else
+            (e.g. loaders, or any recipe given an obj) in threads, see ListExecutor. "thread"
+            or "process" uses one pool for all of them.
+        timeout: float
+            For parallel mode, the seconds each recipe has to cook before it's reported as
+            timed out
+        *args, **kwargs:
+            Passed to cook for every recipe. Only kwargs are passed in parallel mode.
+        """
+        if list_mode == "parallel":
+            return ListExecutor(
+                self,
+                workers=workers if workers else self.r.env.cook_workers,
+                executor=executor,
+                timeout=timeout
+            ).run(recipes, **kwargs)
+        elif list_mode != "sequence":
+            raise ValueError(f"Unknown list_mode {list_mode}")
         objs = []
         for r in recipes:
             try:
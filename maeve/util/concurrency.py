@@ -0,0 +1,137 @@
+import asyncio
+import functools
+import threading
+from typing import Any, Callable
+
+
+def locked(method: Callable) -> Callable:
+    """
+    Runs a method while holding its instance's `_lock`
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.thread = threading.get_ident()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls by key: while a call for a key is running, other threads
+    calling with the same key wait for it to finish and share its result (or exception)
+    rather than making the call themselves.
+
+    A thread that calls again with a key it is already running, e.g. a recipe that ends up
+    cooking itself, makes the call itself rather than waiting on itself forever.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key: Any, fn: Callable) -> tuple:
+        """
+        Returns
+        -------
+        A (result, shared) tuple where shared is True if the result came from a call made
+        by another thread
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            if call.thread == threading.get_ident():
+                return fn(), False
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+class AsyncSingleFlight:
+    """
+    SingleFlight for coroutines: while a call for a key is being awaited, other tasks on the
+    same event loop awaiting the same key share its result (or exception) rather than making
+    the call themselves.
+
+    A task that calls again with a key it is already awaiting makes the call itself, as with
+    SingleFlight.
+    """
+
+    def __init__(self):
+        # calls can be made from event loops in different threads
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    async def do(self, key: Any, fn: Callable) -> tuple:
+        """
+        Parameters
+        ----------
+        key: Any
+        fn: Callable
+            Takes no arguments and returns an awaitable
+
+        Returns
+        -------
+        A (result, shared) tuple where shared is True if the result came from a call made
+        by another task
+        """
+        loop = asyncio.get_running_loop()
+        task = asyncio.current_task()
+        with self._lock:
+            call = self._calls.get((loop, key))
+            leader = call is None
+            if leader:
+                call = self._calls[(loop, key)] = (loop.create_future(), task)
+        future, owner = call
+        if not leader:
+            if owner is task:
+                return await fn(), False
+            # shielded so that cancelling a follower doesn't cancel the call
+            return await asyncio.shield(future), True
+
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # there may be no followers to retrieve it
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            with self._lock:
+                del self._calls[(loop, key)]
+        return result, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
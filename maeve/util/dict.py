@@ -118,6 +118,71 @@ class DictUtils:
 
         return a
 
+    @classmethod
+    def merge_shared(cls, a: dict, b: dict, always_override: list = None) -> dict:
+        """
+        Merges `b` on to `a` using the same rules as `mergedicts` but without copying either
+        of them. A new dict is created only along paths where `b` changes something, every
+        other subtree is shared with `a` or `b`.
+
+        Neither `a` nor `b` are modified, but since the result shares their subtrees, the
+        result (and the inputs) must be treated as read only. Deep copy the result before
+        modifying it in place.
+
+        Parameters
+        ----------
+        a : dict
+            The dict to merge into
+        b : dict
+            The dict to merge from
+
+        Returns
+        -------
+        dict
+            a merged dict
+        """
+        always_override = always_override if always_override else ["order_by"]
+        override = b.get("override_keys", [])
+        if type(override) is str:
+            override = [override]
+        elif type(override) is not list:
+            override = []
+        override = set(override + list(always_override))
+
+        merged = dict(a)
+        for i, v in b.items():
+            if i in override:
+                merged[i] = cls._strip_override_mode(v)
+            elif i in a.keys() and type(a[i]) is dict:
+                if type(v) is not dict:
+                    merged[i] = v
+                elif v.get("_mode", "merge") == "override":
+                    merged[i] = {k: x for k, x in v.items() if k != "_mode"}
+                else:
+                    merged[i] = cls.merge_shared(a[i], v)
+            elif i in a.keys() and type(a[i]) is list:
+                if type(v) is not list:
+                    merged[i] = v
+                    continue
+                appended = list(a[i])
+                for x in v:
+                    if x not in appended:
+                        appended.append(x)
+                merged[i] = appended
+            else:
+                merged[i] = v
+        return merged
+
+    @classmethod
+    def _strip_override_mode(cls, d):
+        # an overridden value loses any `_mode: override` directives in its nested dicts,
+        # as happens when mergedicts merges a value on to itself
+        if type(d) is not dict:
+            return d
+        if d.get("_mode", "merge") == "override":
+            return {k: v for k, v in d.items() if k != "_mode"}
+        return {k: cls._strip_override_mode(v) for k, v in d.items()}
+
     @classmethod
     def search_dict(cls, d: dict, name: str, vals=None):
         if not vals:
@@ -144,19 +209,27 @@ class DictUtils:
         if not type(d) == dict:
             log.warning(f"Expected dict but got {type(d)}")
 
+        # copy on write: dicts are only copied if something beneath them is reordered so
+        # the result may share structure with `d`, which is never modified
+        out = d
         for k, v in d.items():
             if type(v) is dict:
+                new_v = v
                 if "order_by" in v.keys():
                     if type(v["order_by"]) is list:
                         try:
-                            d[k] = {k: v[k] for k in v["order_by"]}
+                            new_v = {i: v[i] for i in v["order_by"]}
                         except KeyError:
                             log.warning("List passed in order_by hay values not in the keys of the dict")
                     elif type(v["order_by"]) is str:
                         if v["order_by"] == "sort":
-                            v = {k: d[k] for k in sorted(v["order_by"].keys())}
-                v = cls.order_dicts(v)
-        return d
+                            new_v = {i: v[i] for i in sorted(v.keys()) if i != "order_by"}
+                new_v = cls.order_dicts(new_v, log=log)
+                if new_v is not v:
+                    if out is d:
+                        out = dict(d)
+                    out[k] = new_v
+        return out
 
     @staticmethod
     def parse_dotted_str(string):
@@ -176,9 +249,43 @@ class DictUtils:
         cls.dict_get_by_path(root, path[:-1])[path[-1]] = value
 
     @classmethod
-    def apply_overrides(cls, obj: dict, overrides: dict[str, Union[list, tuple, str]]):
+    def apply_overrides(cls, obj: dict, overrides: dict[str, Union[list, tuple, str]], inplace: bool = True):
         for path, value in overrides.items():
-            cls.dict_set_by_path(obj, path, value)
+            if inplace:
+                cls.dict_set_by_path(obj, path, value)
+            else:
+                obj = cls.dict_replace_by_path(obj, path, value)
+        return obj
+
+    @classmethod
+    def dict_replace_by_path(cls, root, path, value):
+        """
+        As dict_set_by_path but returns a new root, copying only the containers along
+        `path` so that `root` is left unchanged
+        """
+        if type(path) is str:
+            path = cls.parse_dotted_str(path)
+        new = copy.copy(root)
+        if len(path) == 1:
+            new[path[0]] = value
+        else:
+            new[path[0]] = cls.dict_replace_by_path(root[path[0]], path[1:], value)
+        return new
+
+    @classmethod
+    def freeze(cls, obj):
+        """
+        Converts a structure of dicts, lists, tuples and sets into a hashable equivalent
+        suitable for use as a cache key. Raises TypeError if `obj` contains anything
+        unhashable that can't be converted (e.g. a DataFrame).
+        """
+        if type(obj) is dict:
+            return "dict", tuple((k, cls.freeze(v)) for k, v in obj.items())
+        elif type(obj) in (list, tuple):
+            return type(obj).__name__, tuple(cls.freeze(v) for v in obj)
+        elif type(obj) in (set, frozenset):
+            return "set", frozenset(cls.freeze(v) for v in obj)
+        hash(obj)
         return obj
 
     @staticmethod
@@ -1,11 +1,43 @@
 import re
 import json
+import hashlib
 import hjson
-from os import path, walk
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from os import path, walk, stat, makedirs, listdir, remove, replace, getpid, cpu_count
+from typing import Callable, Literal
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+# JSON decoders in order of preference. Each takes the raw bytes of a file.
+JSON_BACKENDS = {
+    "orjson": orjson.loads if orjson else None,
+    "ujson": ujson.loads if ujson else None,
+    "json": json.loads
+}
 
 
 class FSUtils:
 
+    # file extension -> name of the method that parses it. Use register_parser to add more.
+    parsers = {
+        ".json": "read_json_file",
+        ".hjson": "read_hjson_file"
+    }
+    # extensions that are slow enough to parse that it's worth caching a JSON copy
+    compilable = {".hjson"}
+    compiled_dir = "__confcache__"
+    json_backend = next(k for k, v in JSON_BACKENDS.items() if v)
+
     @staticmethod
     def os_walk_and_filter(loc, dirregex: str = None, fileregex: str = None):
         """
@@ -33,8 +65,46 @@ class FSUtils:
                 files.append(path.join(i[0], j))
         return files
 
+    @staticmethod
+    def file_fingerprint(filepath: str, previous: dict = None, content_hash: bool = True) -> dict:
+        """
+        Fingerprints a file using its mtime, size and a hash of its contents
+        Parameters
+        ----------
+        filepath: str
+            Should be a fully qualified path
+        previous: dict
+            A fingerprint previously generated for the same file. If the mtime and size
+            still match, its content hash is reused and the file is not read.
+        content_hash: bool
+            If False the file isn't read and only the mtime and size are returned
+
+        Returns
+        -------
+        A dict with the keys mtime_ns, size and (if content_hash) sha256
+        """
+        st = stat(filepath)
+        fp = {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+        if not content_hash:
+            return fp
+        if previous and "sha256" in previous and all(previous.get(k) == v for k, v in fp.items()):
+            fp["sha256"] = previous["sha256"]
+            return fp
+        with open(filepath, 'rb') as fh:
+            fp["sha256"] = hashlib.sha256(fh.read()).hexdigest()
+        return fp
+
+    @staticmethod
+    def fingerprint_changed(previous: dict, current: dict) -> bool:
+        """
+        Compares two fingerprints from `file_fingerprint` using only mtime and size
+        """
+        if not previous:
+            return True
+        return previous["mtime_ns"] != current["mtime_ns"] or previous["size"] != current["size"]
+
     @classmethod
-    def read_conf_file(cls, filepath: str):
+    def read_conf_file(cls, filepath: str, compiled_cache: bool = False):
         """
         Reads a data file in various formats given a file location
         Will infer the file type from the file suffix
@@ -42,18 +112,156 @@ class FSUtils:
         ----------
         filepath: str
             Should be a fully qualified path
+        compiled_cache: bool
+            If True, formats that are slow to parse (i.e. HJSON) are read from a JSON copy
+            kept in a __confcache__ directory next to the file, keyed by the file's content
+            hash. The copy is written the first time the file is parsed.
 
         Returns
         -------
         The contents for the file in dict form or None if it's not valid file path
 
         """
-        if re.match(r".+\.json$", filepath):
-            return cls.read_json_file(filepath)
-        elif re.match(r".+\.hjson$", filepath):
-            return cls.read_hjson_file(filepath)
-        else:
+        ext = path.splitext(filepath)[1]
+        try:
+            parser = cls.parsers[ext]
+        except KeyError:
             raise RuntimeError(f"Unknown file extension for file {filepath}")
+        parser = getattr(cls, parser) if type(parser) is str else parser
+        if compiled_cache and ext in cls.compilable:
+            return cls.read_compiled_file(filepath, parser)
+        return parser(filepath)
+
+    @classmethod
+    def register_parser(cls, ext: str, parser: Callable, compilable: bool = False):
+        """
+        Registers a parser for a file extension
+        Parameters
+        ----------
+        ext: str
+            The file extension including the dot, e.g. ".yaml"
+        parser: callable
+            Takes a fully qualified path and returns its contents. Should raise a RuntimeError
+            if the file is invalid.
+        compilable: bool
+            Whether the parsed contents can be cached as JSON when compiled_cache is used
+        """
+        cls.parsers[ext] = parser
+        if compilable:
+            cls.compilable.add(ext)
+        else:
+            cls.compilable.discard(ext)
+
+    @classmethod
+    def set_json_backend(cls, backend: Literal["auto", "orjson", "ujson", "json"] = "auto"):
+        """
+        Sets the library used to decode JSON. "auto" uses the fastest one installed.
+        """
+        if backend == "auto":
+            backend = next(k for k, v in JSON_BACKENDS.items() if v)
+        elif not JSON_BACKENDS.get(backend):
+            raise ValueError(f"JSON backend {backend} is not available")
+        cls.json_backend = backend
+
+    @classmethod
+    def loads_json(cls, b: bytes):
+        """
+        Decodes JSON using the current backend. Anything the backend rejects is tried again
+        with the standard library, which is more lenient (e.g. NaN and very large integers).
+        """
+        try:
+            return JSON_BACKENDS[cls.json_backend](b)
+        except ValueError:
+            if cls.json_backend == "json":
+                raise
+            return json.loads(b)
+
+    @classmethod
+    def compiled_path(cls, filepath: str, content_hash: str) -> str:
+        d, f = path.split(filepath)
+        return path.join(d, cls.compiled_dir, f"{f}.{content_hash[:16]}.compiled")
+
+    @classmethod
+    def read_compiled_file(cls, filepath: str, parser: Callable):
+        """
+        Reads the compiled JSON copy of `filepath` if there is one for its current contents,
+        otherwise parses it with `parser` and writes a compiled copy. Failing to write the
+        copy (e.g. a read only directory) just means the file is parsed every time.
+        """
+        with open(filepath, 'rb') as fh:
+            content_hash = hashlib.sha256(fh.read()).hexdigest()
+        compiled = cls.compiled_path(filepath, content_hash)
+        try:
+            with open(compiled, 'rb') as fh:
+                return cls.loads_json(fh.read())
+        except (OSError, ValueError):
+            pass
+
+        contents = parser(filepath)
+        try:
+            cache_dir = path.dirname(compiled)
+            makedirs(cache_dir, exist_ok=True)
+            # remove copies of previous versions of the file
+            stale = re.compile(re.escape(path.basename(filepath)) + r"\.[0-9a-f]{16}\.compiled$")
+            for old in listdir(cache_dir):
+                if stale.match(old):
+                    remove(path.join(cache_dir, old))
+            tmp = f"{compiled}.{getpid()}.tmp"
+            with open(tmp, 'wb') as fh:
+                fh.write(cls.dumps_json(contents))
+            replace(tmp, compiled)
+        except OSError:
+            pass
+        return contents
+
+    @staticmethod
+    def dumps_json(obj) -> bytes:
+        # the standard library round trips everything the parsers can produce, incl. NaN
+        # and very large integers, and this is only done once per version of a file
+        return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+    @classmethod
+    def read_conf_files(cls,
+                        filepaths: list,
+                        workers: int = None,
+                        executor: Literal["auto", "process", "thread"] = "auto",
+                        compiled_cache: bool = False
+                        ) -> list:
+        """
+        Reads many conf files using a pool of workers
+        Parameters
+        ----------
+        filepaths: list
+            Fully qualified paths
+        workers: int
+            The number of workers. None will use the executor's default.
+        executor: str
+            "process" or "thread". "auto" uses processes if any of the files are HJSON,
+            since parsing it is pure python and holds the GIL.
+        compiled_cache: bool
+            See read_conf_file
+
+        Returns
+        -------
+        A list of (contents, error) tuples in the same order as `filepaths`. Error is None
+        unless the file couldn't be read, in which case contents is None.
+        """
+        if executor == "auto":
+            executor = "process" if any(f.endswith(".hjson") for f in filepaths) else "thread"
+        if executor == "process":
+            # the pool's own default, so that it's known here
+            workers = workers if workers else (cpu_count() or 1)
+            pool = ProcessPoolExecutor(max_workers=workers)
+            chunksize = max(1, len(filepaths) // (workers * 4))
+        else:
+            pool = ThreadPoolExecutor(max_workers=workers)
+            chunksize = 1
+        with pool:
+            return list(pool.map(
+                partial(_read_conf_file_or_error, compiled_cache=compiled_cache),
+                filepaths,
+                chunksize=chunksize
+            ))
 
     @staticmethod
     def read_json_file(f):
@@ -69,8 +277,8 @@ class FSUtils:
         """
         try:
             with open(f, 'rb') as fh:
-                return json.load(fh)
-        except json.decoder.JSONDecodeError:
+                return FSUtils.loads_json(fh.read())
+        except ValueError:
             raise RuntimeError(f"Invalid or malformed JSON in file {f}")
 
     @staticmethod
@@ -91,3 +299,151 @@ class FSUtils:
         except hjson.scanner.HjsonDecodeError:
             raise RuntimeError(f"Invalid or malformed HJSON in file {f}")
 
+
+
+def _read_conf_file_or_error(filepath: str, compiled_cache: bool = False):
+    # module level so that it can be pickled for a process pool
+    try:
+        return FSUtils.read_conf_file(filepath, compiled_cache=compiled_cache), None
+    except RuntimeError as e:
+        return None, str(e)
+    except Exception as e:
+        # anything else raised in a worker, e.g. an OSError, wouldn't say which file it came from
+        return None, f"Unable to read conf file {filepath}: {type(e).__name__}: {e}"
+
+
+class KeyScanner:
+    """
+    Finds the top level keys of a JSON or HJSON document without parsing its values.
+    This is only meant to be a cheap way of indexing recipe files; anything it doesn't
+    understand makes `scan` return None so the caller can fall back to a full parse.
+    """
+    _literal = re.compile(r"^(-?\d+(\.\d+)?([eE][+-]?\d+)?|true|false|null)$")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.i = 0
+        self.n = len(text)
+
+    @classmethod
+    def scan_file(cls, filepath: str):
+        try:
+            with open(filepath, 'r', encoding='utf-8') as fh:
+                return cls(fh.read()).scan()
+        except (OSError, UnicodeDecodeError):
+            return None
+
+    def scan(self):
+        try:
+            return self._scan()
+        except (IndexError, ValueError):
+            return None
+
+    def _scan(self):
+        keys = []
+        self._skip()
+        if self.i < self.n and self.text[self.i] == "{":
+            self.i += 1
+        elif self.i < self.n and self.text[self.i] == "[":
+            raise ValueError("Root is not an object")
+        while True:
+            self._skip(commas=True)
+            if self.i >= self.n or self.text[self.i] == "}":
+                break
+            keys.append(self._key())
+            self._skip()
+            if self.text[self.i] != ":":
+                raise ValueError("Expected a colon")
+            self.i += 1
+            self._value()
+        return keys
+
+    def _skip(self, commas=False):
+        # skips whitespace and comments (and commas if requested)
+        while self.i < self.n:
+            c = self.text[self.i]
+            if c.isspace() or (commas and c == ","):
+                self.i += 1
+            elif c == "#" or self.text.startswith("//", self.i):
+                self._to_eol()
+            elif self.text.startswith("/*", self.i):
+                end = self.text.index("*/", self.i + 2)
+                self.i = end + 2
+            else:
+                break
+
+    def _to_eol(self):
+        end = self.text.find("\n", self.i)
+        self.i = self.n if end == -1 else end + 1
+
+    def _key(self):
+        c = self.text[self.i]
+        if c in "\"'":
+            start = self.i
+            self._string()
+            key = self.text[start + 1:self.i - 1]
+            if "\\" in key:
+                if c != '"':
+                    raise ValueError("Unsupported escape in key")
+                return json.loads(self.text[start:self.i])
+            return key
+        start = self.i
+        while self.i < self.n and not self.text[self.i].isspace() and self.text[self.i] not in ",:[]{}":
+            self.i += 1
+        if self.i == start:
+            raise ValueError("Empty key")
+        return self.text[start:self.i]
+
+    def _string(self):
+        if self.text.startswith("'''", self.i):
+            self.i = self.text.index("'''", self.i + 3) + 3
+            return
+        quote = self.text[self.i]
+        self.i += 1
+        while self.text[self.i] != quote:
+            if self.text[self.i] == "\\":
+                self.i += 1
+            elif self.text[self.i] == "\n":
+                raise ValueError("Unterminated string")
+            self.i += 1
+        self.i += 1
+
+    def _value(self):
+        self._skip()
+        c = self.text[self.i]
+        if c in "{[":
+            self._container()
+        elif c in "\"'":
+            self._string()
+        else:
+            self._quoteless()
+
+    def _container(self):
+        closing = "}" if self.text[self.i] == "{" else "]"
+        self.i += 1
+        while True:
+            self._skip(commas=True)
+            c = self.text[self.i]
+            if c == closing:
+                self.i += 1
+                return
+            if c in "}]":
+                raise ValueError("Mismatched brackets")
+            if closing == "}":
+                self._key()
+                self._skip()
+                if self.text[self.i] != ":":
+                    raise ValueError("Expected a colon")
+                self.i += 1
+            self._value()
+
+    def _quoteless(self):
+        # numbers and literals end at a delimiter, anything else is a string to the end of the line
+        start = self.i
+        while self.i < self.n and self.text[self.i] not in ",]}\n" \
+                and not self.text.startswith("//", self.i) and self.text[self.i] not in "#":
+            self.i += 1
+        if self._literal.match(self.text[start:self.i].strip()):
+            return
+        self.i = start
+        self._to_eol()
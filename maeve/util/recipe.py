@@ -1,5 +1,14 @@
+import hashlib
+import json
 import re
-from typing import Union
+from copy import copy
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from enum import Enum
+from pathlib import PurePath
+from typing import Any, Union
+
+import numpy as np
 
 from maeve.util.dict import DictUtils
 from maeve.models.core import AnchorConst, LocationRecipe, GlobalConst
@@ -16,8 +25,13 @@ class AnchorUtils:
                         cnf,  # Should be a confscade obj but a dict will actually work, but with limited recursion
                         obj: Union[list, dict],
                         env_conf,
-                        anchors: dict = None) -> dict:
-
+                        anchors: dict = None) -> Union[list, dict]:
+        """
+        Replaces anchor strings in `obj` with the values they point to. This is copy on write:
+        `obj` is never modified and only the containers that hold an anchor (and their parents)
+        are copied, so the result shares everything else with `obj`. Anchored values are
+        taken by reference from the resolution cache when `cnf` is a Confscade object.
+        """
         # handle both dicts and lists
         try:
             iterator = obj.items()
@@ -25,29 +39,55 @@ class AnchorUtils:
             iterator = enumerate(obj)
 
         anchors = anchors if anchors else {}
+        shared = hasattr(cnf, "_get_shared")
 
+        out = obj
         for k, v in iterator:
             if type(v) in [dict, list]:
-                cls.resolve_anchors(cnf, v, env_conf)
-            elif type(v) is str:
-                if re.match(ac.match_regex, v):
-                    identifier, keys = cls.parse_anchor(v)
+                new_val = cls.resolve_anchors(cnf, v, env_conf, anchors=anchors)
+            elif type(v) is str and re.match(ac.match_regex, v):
+                identifier, keys = cls.parse_anchor(v)
 
-                    if identifier in anchors.keys():
-                        new_val = anchors[identifier]
+                if identifier in anchors.keys():
+                    new_val = anchors[identifier]
+                else:
+                    # grab a nested object
+                    if shared:
+                        # fully resolves the anchor incl. inheritance and nested anchors
+                        sub_conf = cnf._get_shared(identifier, anchors=anchors or None)
                     else:
-                        # grab a nested object
-                        sub_conf = cnf.get(identifier)  # fully resolves the anchor incl. inheritance and nested anchors
-                        if keys:
-                            new_val = DictUtils.deep_dict(sub_conf, keys)
-                        else:
-                            new_val = sub_conf
-                    if type(new_val) is dict:
-                        new_val = cls.resolve_recipe(new_val, env_conf)
-                    obj[k] = new_val
+                        sub_conf = cnf.get(identifier)
+                    if keys:
+                        new_val = DictUtils.deep_dict(sub_conf, keys)
+                    else:
+                        new_val = sub_conf
+                if type(new_val) is dict:
+                    new_val = cls.resolve_recipe(new_val, env_conf)
             else:
                 continue
-        return obj
+            if new_val is not v:
+                if out is obj:
+                    out = copy(obj)
+                out[k] = new_val
+        return out
+
+    @classmethod
+    def find_anchors(cls, obj: Union[list, dict]) -> set:
+        """
+        Returns
+        -------
+        The identifiers (i.e. recipe names) of every anchor in `obj`
+        """
+        found = set()
+        pending = [obj]
+        while pending:
+            o = pending.pop()
+            for v in (o.values() if type(o) is dict else o):
+                if type(v) in [dict, list]:
+                    pending.append(v)
+                elif type(v) is str and re.match(ac.match_regex, v):
+                    found.add(cls.parse_anchor(v)[0])
+        return found
 
     @classmethod
     def parse_anchor(cls, a):
@@ -96,3 +136,34 @@ class RecipeUtils:
             return loc
         else:
             return loc
+
+    @classmethod
+    def hash_recipe(cls, recipe: Union[dict, list]) -> str:
+        """
+        A sha256 hash of a recipe that only depends on its contents, i.e. not on the order of
+        its keys. As well as json types, recipes may hold slices, sets, dates and times,
+        timedeltas, decimals, paths, enums and numpy scalars. Raises TypeError for anything else.
+        """
+        s = json.dumps(recipe, sort_keys=True, default=cls._canonical)
+        return hashlib.sha256(s.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _canonical(o: Any):
+        # values are tagged with their type so that e.g. a date and its isoformat str differ
+        if type(o) is slice:
+            return {"__slice__": [o.start, o.stop, o.step]}
+        if isinstance(o, (datetime, date, time)):
+            return {f"__{type(o).__name__}__": o.isoformat()}
+        if isinstance(o, timedelta):
+            return {"__timedelta__": [o.days, o.seconds, o.microseconds]}
+        if isinstance(o, (set, frozenset)):
+            return {"__set__": sorted(o, key=lambda v: json.dumps(v, sort_keys=True, default=RecipeUtils._canonical))}
+        if isinstance(o, Decimal):
+            return {"__decimal__": str(o)}
+        if isinstance(o, PurePath):
+            return {"__path__": str(o)}
+        if isinstance(o, Enum):
+            return {"__enum__": [type(o).__name__, o.value]}
+        if isinstance(o, np.generic):
+            return o.item()
+        raise TypeError(f"Object of type {type(o).__name__} can't be hashed as part of a recipe")
@@ -1,5 +1,16 @@
+import os
+import shutil
+from copy import deepcopy
+from datetime import date, datetime
+
 import pytest
+from maeve.conf import Confscade
+from maeve.util.dict import DictUtils
+from maeve.util.os import FSUtils, KeyScanner, JSON_BACKENDS
+from maeve.util.recipe import AnchorUtils, RecipeUtils
+from tests.global_fixtures import test_recipe_path
 from tests.conf.recipes_fixtures import (
+    confscade_test_paths,
     confscade_obj_base_test,
     confscade_obj_pipeline_test
 )
@@ -71,3 +82,358 @@ def test_load_with_overrides(confscade_obj_base_test):
     c = confscade_obj_base_test.get("cs_file_1", overrides={"cs_anchor1_str1": "newvalue"})
     assert c["cs_anchor1_str1"] == "newvalue"
 
+
+def _count_reads(monkeypatch):
+    reads = []
+    read = FSUtils.read_conf_file
+
+    def counting_read(filepath, **kwargs):
+        reads.append(filepath)
+        return read(filepath, **kwargs)
+
+    monkeypatch.setattr(FSUtils, "read_conf_file", staticmethod(counting_read))
+    return reads
+
+
+def test_snapshot_warm_load_skips_parsing(tmp_path, monkeypatch, confscade_test_paths):
+    recipes = tmp_path / "recipes"
+    recipes.mkdir()
+    shutil.copy(confscade_test_paths[0], recipes)
+    cold = Confscade(str(recipes), cache_dir=str(tmp_path / "cache"))
+
+    reads = _count_reads(monkeypatch)
+    warm = Confscade(str(recipes), cache_dir=str(tmp_path / "cache"))
+    assert reads == []
+    assert warm.conf == cold.conf
+    assert warm.get("cs_file_1_inherits") == cold.get("cs_file_1_inherits")
+
+
+def test_snapshot_reparses_only_changed_files(tmp_path, monkeypatch):
+    recipes = tmp_path / "recipes"
+    recipes.mkdir()
+    (recipes / "a.hjson").write_text('{"recipe_a": {"value": 1}}')
+    (recipes / "b.hjson").write_text('{"recipe_b": {"value": 1}}')
+    Confscade(str(recipes), cache_dir=str(tmp_path / "cache"))
+
+    (recipes / "b.hjson").write_text('{"recipe_b": {"value": 22}}')
+    reads = _count_reads(monkeypatch)
+    c = Confscade(str(recipes), cache_dir=str(tmp_path / "cache"))
+    assert reads == [str(recipes / "b.hjson")]
+    assert c.get("recipe_a")["value"] == 1
+    assert c.get("recipe_b")["value"] == 22
+
+
+def test_resolution_cache_hit_returns_copy(confscade_obj_base_test):
+    c = confscade_obj_base_test.get("cs_file_1")
+    c["cs_l1_anchor1"]["cs_anchor1_str1"] = "mutated"
+    misses = confscade_obj_base_test.cache_info()["misses"]
+    again = confscade_obj_base_test.get("cs_file_1")
+    assert confscade_obj_base_test.cache_info()["misses"] == misses
+    assert again["cs_l1_anchor1"]["cs_anchor1_str1"] == "cs_anchor1_str1"
+
+
+def test_resolution_cache_keyed_on_overrides(confscade_obj_base_test):
+    confscade_obj_base_test.get("cs_file_1")
+    c = confscade_obj_base_test.get("cs_file_1", overrides={"cs_l1_str_1": "newvalue"})
+    assert c["cs_l1_str_1"] == "newvalue"
+    assert confscade_obj_base_test.get("cs_file_1")["cs_l1_str_1"] == "v_l1_value_str_1"
+
+
+def test_missing_recipe_not_cached(confscade_obj_base_test):
+    assert confscade_obj_base_test.get("Missing") == {}
+    with pytest.raises(KeyError):
+        confscade_obj_base_test.get("Missing", exceptonmissing=True)
+
+
+def test_resolution_not_cached_if_invalidated_while_resolving(tmp_path, monkeypatch):
+    (tmp_path / "a.hjson").write_text('{"a": {"v": 1}}')
+    cs = Confscade(str(tmp_path), log_location="catalogue")
+    resolve_anchors = AnchorUtils.resolve_anchors
+
+    def refreshed_meanwhile(*args, **kwargs):
+        # e.g. another thread refreshing the recipes
+        cs.invalidate(["a"])
+        return resolve_anchors(*args, **kwargs)
+    monkeypatch.setattr(AnchorUtils, "resolve_anchors", refreshed_meanwhile)
+    assert cs.get("a")["v"] == 1
+    assert cs.cache_info()["size"] == 0
+
+
+def test_invalidate_evicts_only_dependents(confscade_obj_base_test):
+    cs = confscade_obj_base_test
+    for name in ["cs_file_1", "cs_file_1_inherits", "cs_file_1_inherits_2", "cs_anchor1"]:
+        cs.get(name)
+    # cs_anchor3 is only reachable via cs_anchor2, which the cs_file_1_inherits recipes anchor to
+    evicted = cs.invalidate(["cs_anchor3"])
+    assert evicted == {"cs_anchor2", "cs_anchor3", "cs_file_1_inherits", "cs_file_1_inherits_2"}
+
+
+def test_add_conf_refreshes_dependents(confscade_obj_base_test):
+    cs = confscade_obj_base_test
+    cs.get("cs_file_1")
+    cs.get("cs_file_1_inherits_2")
+    cs.add_conf("cs_anchor3", {"cs_anchor3_str1": "changed"})
+    assert cs.get("cs_file_1_inherits_2")["cs_l1_anchor1"]["cs_anchor2_anchor1"]["cs_anchor3_str1"] == "changed"
+    misses = cs.cache_info()["misses"]
+    cs.get("cs_file_1")
+    assert cs.cache_info()["misses"] == misses
+
+
+def _touch(f, content):
+    # make sure the change is visible even on filesystems with coarse mtimes
+    st = os.stat(f) if os.path.exists(f) else None
+    f.write_text(content)
+    if st:
+        os.utime(f, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_refresh_reparses_only_changed_files(tmp_path, monkeypatch, lazy):
+    (tmp_path / "a.hjson").write_text('{"recipe_a": {"value": 1}, "recipe_c": {"inherits": "recipe_b"}}')
+    (tmp_path / "b.hjson").write_text('{"recipe_b": {"value": 1}}')
+    (tmp_path / "d.hjson").write_text('{"recipe_d": {"value": 1}}')
+    cs = Confscade(str(tmp_path), lazy=lazy)
+    assert cs.get("recipe_c")["value"] == 1
+    cs.get("recipe_a")
+
+    _touch(tmp_path / "b.hjson", '{"recipe_b": {"value": 22}}')
+    (tmp_path / "d.hjson").unlink()
+    (tmp_path / "e.hjson").write_text('{"recipe_e": {"value": 3}}')
+    reads = _count_reads(monkeypatch)
+    changed = cs.refresh()
+
+    assert changed == {"recipe_b", "recipe_c", "recipe_d", "recipe_e"}
+    assert cs.get("recipe_c")["value"] == 22
+    assert "recipe_d" not in cs.items()
+    assert cs.get("recipe_e")["value"] == 3
+    assert cs.get("recipe_a")["value"] == 1
+    assert sorted(reads) == [str(tmp_path / "b.hjson"), str(tmp_path / "e.hjson")]
+    assert cs.refresh() == set()
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_parallel_parse_matches_serial(tmp_path, executor):
+    # the same key in several files must still be merged in file order
+    for i in range(6):
+        (tmp_path / f"{i}.hjson").write_text(
+            f'{{"recipe_{i}": {{"value": {i}}}, "shared": {{"value": {i}, "items": ["{i}"]}}}}'
+        )
+    serial = Confscade(str(tmp_path))
+    parallel = Confscade(str(tmp_path), parse_workers=3, parse_executor=executor)
+    assert parallel.conf == serial.conf
+    assert list(parallel.conf.keys()) == list(serial.conf.keys())
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_parallel_parse_errors_name_the_file(tmp_path, executor):
+    (tmp_path / "a.json").write_text('{"recipe": {"value": 1}}')
+    (tmp_path / "b.json").mkdir()
+    results = FSUtils.read_conf_files([str(tmp_path / "a.json"), str(tmp_path / "b.json")], workers=2,
+                                      executor=executor)
+    assert results[0] == ({"recipe": {"value": 1}}, None)
+    assert results[1][0] is None and str(tmp_path / "b.json") in results[1][1]
+
+
+def test_lazy_parses_only_requested_files(monkeypatch, test_recipe_path):
+    eager = Confscade(test_recipe_path)
+    reads = _count_reads(monkeypatch)
+    lazy = Confscade(test_recipe_path, lazy=True)
+    assert reads == []
+    assert set(lazy.items()) == set(eager.items())
+
+    # the loader recipe anchors to a location in another file
+    assert lazy.get("TestLoadPandasCSVNoPipeline") == eager.get("TestLoadPandasCSVNoPipeline")
+    assert sorted(os.path.basename(f) for f in reads) == ["locations.hjson", "test_load_csv.hjson"]
+    assert lazy.get("cs_file_1_inherits_2") == eager.get("cs_file_1_inherits_2")
+    assert lazy.find_key("recipe_type") == eager.find_key("recipe_type")
+
+
+def test_lazy_index_cached_by_mtime(tmp_path, monkeypatch, test_recipe_path):
+    Confscade(test_recipe_path, lazy=True, cache_dir=str(tmp_path))
+    scans = []
+    monkeypatch.setattr(KeyScanner, "scan_file", classmethod(lambda cls, f: scans.append(f)))
+    lazy = Confscade(test_recipe_path, lazy=True, cache_dir=str(tmp_path))
+    assert scans == []
+    assert lazy.get("cs_file_1")["cs_l1_int_1"] == 1
+
+
+def test_bulk_build_matches_sequential_merge(tmp_path):
+    for i in range(4):
+        (tmp_path / f"{i}.hjson").write_text(
+            f'{{"recipe_{i}": {{"value": {i}}}, "shared": {{"value": {i}, "items": ["{i}"], "d": {{"k{i}": {i}}}}}}}'
+        )
+    cs = Confscade(str(tmp_path), log_location="catalogue")
+    expected = {}
+    for f in cs.find_conf_files(str(tmp_path)):
+        expected = DictUtils.mergedicts(expected, cs.read_and_analyse(f))
+    expected = DictUtils.mergedicts(cs.d.GLOBAL_DEFAULT_CONF, expected)
+    assert cs.conf == expected
+    warnings = [e for e in cs.log.get_log(fmt="list") if "already seen" in str(e)]
+    assert len(warnings) == 3
+
+
+def test_inheritance_graph(confscade_obj_base_test):
+    g = confscade_obj_base_test.inheritance
+    assert g.ancestors("cs_file_1_inherits_2") == ["cs_file_1_inherits", "cs_file_1"]
+    assert {"cs_file_1_inherits", "cs_file_1_inherits_2"} <= g.descendants("cs_file_1")
+    order = g.topological_order()
+    assert order.index("cs_file_1") < order.index("cs_file_1_inherits") < order.index("cs_file_1_inherits_2")
+    assert g.cycles == []
+
+
+def test_cyclic_inheritance_detected_at_load(tmp_path):
+    (tmp_path / "a.hjson").write_text(
+        '{"a": {"inherits": "b"}, "b": {"inherits": "a"}, "c": {"inherits": "a"}, "d": {"value": 1}}'
+    )
+    cs = Confscade(str(tmp_path), log_location="catalogue")
+    assert cs.inheritance.cycles in ([["a", "b", "a"]], [["b", "a", "b"]])
+    assert any("Cyclic inheritance" in str(e) for e in cs.log.get_log(fmt="list"))
+    for name in ["a", "c"]:
+        with pytest.raises(ValueError, match="cyclic inheritance"):
+            cs.get(name)
+    assert cs.get("d")["value"] == 1
+    cs.add_conf("b", {"value": 2})
+    assert cs.inheritance.cycles == []
+    assert cs.get("c")["value"] == 2
+
+
+def test_flattened_chain_reused_and_evicted(confscade_obj_base_test, monkeypatch):
+    cs = confscade_obj_base_test
+    merges = []
+    merge_shared = DictUtils.merge_shared
+
+    def counting_merge(*args, **kwargs):
+        merges.append(args)
+        return merge_shared(*args, **kwargs)
+
+    monkeypatch.setattr(DictUtils, "merge_shared", staticmethod(counting_merge))
+    cs.get("cs_file_1_inherits_2")
+    merges.clear()
+    cs.get("cs_file_1_inherits", parse_anchors=False)
+    cs.get("cs_file_1", parse_anchors=False)
+    assert merges == []
+    cs.add_conf("cs_file_1", {**cs.conf["cs_file_1"], "cs_l1_int_1": 100})
+    assert cs.get("cs_file_1_inherits_2")["cs_l1_int_1"] == 100
+    assert len(merges) >= 3
+
+
+def test_anchor_cycles_detected(tmp_path):
+    (tmp_path / "a.hjson").write_text(
+        '{"a": {"x": "@b"}, "b": {"y": "@a"}, "c": {"inherits": "d"}, "d": {"z": "@c"}, '
+        '"e": {"v": "@f.w"}, "f": {"w": 1}}'
+    )
+    cs = Confscade(str(tmp_path), log_location="catalogue")
+    assert sorted(c[0] for c in cs.anchor_graph.cycles) == ["a", "c"]
+    assert len([e for e in cs.log.get_log(fmt="list") if "Cyclic anchors" in str(e)]) == 2
+    for name in ["a", "b", "c"]:
+        with pytest.raises(ValueError, match="cyclic anchors"):
+            cs.get(name)
+    assert cs.get("e")["v"] == 1
+
+
+def test_anchors_shared_and_conf_unchanged(confscade_obj_pipeline_test, confscade_obj_base_test):
+    for cs in [confscade_obj_pipeline_test, confscade_obj_base_test]:
+        conf = deepcopy(cs.conf)
+        for name in cs.items():
+            cs.get(name, overrides={"new_key": 1})
+            cs.get(name)
+        assert cs.conf == conf
+
+    cs.add_conf("anchored", {"value": 1})
+    cs.add_conf("x", {"a": "@anchored", "b": ["@anchored"]})
+    before = cs.cache_info()
+    x = cs.get("x")
+    after = cs.cache_info()
+    assert after["misses"] - before["misses"] == 2 and after["hits"] - before["hits"] == 1
+    assert x["a"] == x["b"][0] == cs.get("anchored")
+
+
+def test_anchored_twice_copied_separately(tmp_path):
+    (tmp_path / "a.hjson").write_text('{"Base": {"cols": ["a"]}, "R": {"x": "@Base", "y": "@Base"}}')
+    cs = Confscade(str(tmp_path), log_location="catalogue")
+    r = cs.get("R")
+    r["x"]["cols"].append("b")
+    assert r["y"]["cols"] == ["a"] and cs.get("R")["x"]["cols"] == ["a"]
+
+
+def test_anchor_overrides_apply_to_nested_anchors(tmp_path):
+    (tmp_path / "a.hjson").write_text('{"a": {"x": "@b"}, "b": {"y": "@c"}, "c": {"value": 1}}')
+    cs = Confscade(str(tmp_path), log_location="catalogue")
+    assert cs.get("a")["x"]["y"]["value"] == 1
+    assert cs.get("a", anchors={"c": 5})["x"]["y"] == 5
+
+
+def test_canonical_recipe_hash():
+    r = {"a": 1, "rows": slice(0, 10), "at": datetime(2024, 1, 2, 3), "on": date(2024, 1, 2), "tags": {"y", "x"}}
+    h = RecipeUtils.hash_recipe(r)
+    assert h == RecipeUtils.hash_recipe(dict(reversed(list(r.items()))))
+    assert h != RecipeUtils.hash_recipe({**r, "rows": slice(0, 11)})
+    assert h != RecipeUtils.hash_recipe({**r, "on": "2024-01-02"})
+    with pytest.raises(TypeError):
+        RecipeUtils.hash_recipe({"a": object()})
+
+
+def test_recipe_hash_cached_with_resolution(tmp_path, monkeypatch):
+    (tmp_path / "a.hjson").write_text('{"a": {"x": "@b"}, "b": {"y": 1}}')
+    cs = Confscade(str(tmp_path), log_location="catalogue")
+    calls = []
+    hash_recipe = RecipeUtils.hash_recipe
+    monkeypatch.setattr(RecipeUtils, "hash_recipe", lambda r: calls.append(r) or hash_recipe(r))
+    recipe, h = cs.get("a", return_hash=True)
+    assert h == hash_recipe(recipe) and cs.get("a", return_hash=True)[1] == h
+    assert len(calls) == 1
+    assert cs.get("a", overrides={"x.y": 2}, return_hash=True)[1] != h
+
+
+def test_warm_cache_resolves_anchors_first(tmp_path):
+    (tmp_path / "a.hjson").write_text('{"a": {"x": "@b"}, "b": {"y": "@c"}, "c": {"value": 1}}')
+    cs = Confscade(str(tmp_path), log_location="catalogue")
+    assert cs.anchor_graph.topological_order() == ["c", "b", "a"]
+    assert cs.warm_cache() == ["c", "b"]
+    misses = cs.cache_info()["misses"]
+    cs.get("a")
+    assert cs.cache_info()["misses"] == misses + 1
+
+
+@pytest.mark.parametrize("backend", [b for b, loads in JSON_BACKENDS.items() if loads])
+def test_json_backends_agree(tmp_path, backend):
+    f = tmp_path / "a.json"
+    f.write_text('{"a": {"i": 1, "f": 1.5, "s": "\\u00e9", "l": [true, null]}, '
+                 '"big": 123456789012345678901234567890, "n": NaN}')
+    expected = FSUtils.read_conf_file(str(f))
+    try:
+        FSUtils.set_json_backend(backend)
+        assert FSUtils.json_backend == backend
+        c = FSUtils.read_conf_file(str(f))
+    finally:
+        FSUtils.set_json_backend()
+    assert c["a"] == expected["a"] and c["big"] == expected["big"]
+
+
+def test_register_parser(tmp_path, monkeypatch):
+    monkeypatch.setattr(FSUtils, "parsers", dict(FSUtils.parsers))
+    f = tmp_path / "a.txt"
+    f.write_text("x")
+    with pytest.raises(RuntimeError, match="Unknown file extension"):
+        FSUtils.read_conf_file(str(f))
+    FSUtils.register_parser(".txt", lambda p: {"recipe": {"value": open(p).read()}})
+    assert FSUtils.read_conf_file(str(f)) == {"recipe": {"value": "x"}}
+
+
+def test_compiled_hjson_cache(tmp_path, monkeypatch):
+    f = tmp_path / "a.hjson"
+    _touch(f, "{\n  recipe_a: {\n    value: 1\n    text: quoteless string\n  }\n}")
+    parses = []
+    read = FSUtils.read_hjson_file
+    monkeypatch.setattr(FSUtils, "read_hjson_file", staticmethod(lambda p: parses.append(p) or read(p)))
+
+    cs = Confscade(str(tmp_path), compiled_cache=True, log_location="catalogue")
+    assert len(parses) == 1
+    assert len(os.listdir(tmp_path / "__confcache__")) == 1
+    assert Confscade(str(tmp_path), compiled_cache=True, log_location="catalogue").conf == cs.conf
+    assert len(parses) == 1
+
+    _touch(f, "{\n  recipe_a: {\n    value: 2\n  }\n}")
+    assert Confscade(str(tmp_path), compiled_cache=True, log_location="catalogue").get("recipe_a")["value"] == 2
+    assert len(parses) == 2
+    assert len(os.listdir(tmp_path / "__confcache__")) == 1
@@ -1,6 +1,23 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import polars as pl
+import pyarrow as pa
 import pytest
-from tests.global_fixtures import std_maeve_init_kwargs, test_data_path
+from tests.global_fixtures import std_maeve_init_kwargs, tmp_recipes_conf
 from maeve import Session
+from maeve.catalogue import Catalogue, register_hasher
+from maeve.catalogue.fingerprint import Hashers
+from maeve.catalogue.lazy import LazyHandle
+from maeve.catalogue.results import ResultCache
+from maeve.models.core import CatalogueConf
+from maeve.util.log import Logger
 
 
 def test_pandas_load_cat_exists(std_maeve_init_kwargs):
@@ -13,3 +30,413 @@ def test_pandas_load_cat_exists(std_maeve_init_kwargs):
     cdf = s.c.get(recipe, method="obj")
     assert recipe_hash in s.c.hashes.keys()
 
+
+
+def test_incremental_reload_removes_stale_items(tmp_path, tmp_recipes_conf):
+    s = Session(conf=tmp_recipes_conf({"TestDict": {"recipe_type": "dict", "value": {"a": 1}}}))
+    assert s.cook("TestDict") == {"a": 1}
+    assert "TestDict" in s.c.names
+
+    tmp_recipes_conf({"TestDict": {"recipe_type": "dict", "value": {"a": 22}}})
+    recipe_file = tmp_path / "recipes" / "recipes.hjson"
+    os.utime(recipe_file, ns=(0, os.stat(recipe_file).st_mtime_ns + 1_000_000_000))
+    assert s.cook("TestDict", reload_recipes="incremental") == {"a": 22}
+    assert len([i for i in s.c.obj.values() if i.name == "TestDict"]) == 1
+
+
+def _frames(n, rows=1000):
+    return [pd.DataFrame({"a": range(rows), "b": [f"value_{i}" for i in range(rows)]}) for _ in range(n)]
+
+
+def _catalogue(budget, policy="lru"):
+    return Catalogue(Logger(log_level="INFO", log_location="catalogue"),
+                     CatalogueConf(memory_budget=budget, eviction_policy=policy))
+
+
+def test_sizeof_is_deep():
+    df = _frames(1)[0]
+    assert Catalogue.sizeof(df) == df.memory_usage(deep=True).sum() > df.memory_usage().sum()
+    pldf = pl.from_pandas(df)
+    assert Catalogue.sizeof(pldf) == pldf.estimated_size()
+    assert Catalogue.sizeof({"x": df}) > Catalogue.sizeof(df)
+
+
+@pytest.mark.parametrize("policy, expected", [("lru", "df0"), ("lfu", "df1"), ("cost", "df2")])
+def test_eviction_policies(policy, expected):
+    dfs = _frames(4)
+    size = Catalogue.sizeof(dfs[0])
+    c = _catalogue(int(size * 3.5), policy)
+    ids = [c.add(df, name=f"df{i}", cook_time=[5, 5, 0.01][i]) for i, df in enumerate(dfs[:3])]
+    for i in [0, 0, 1, 2]:
+        c.get(ids[i], method="id")
+    c.add(dfs[3], name="df3")
+    assert expected not in c.names.keys()
+    assert len(c.obj) == 3
+    assert c.memory_used == sum(i.size for i in c.obj.values()) <= c.conf.memory_budget
+    stats = c.stats()
+    assert stats["evictions"] == 1 and stats["hit_rate"] == 1
+    assert any("Evicted" in str(e) for e in c.log.get_log(fmt="list"))
+
+
+def test_pinned_items_not_evicted():
+    dfs = _frames(3)
+    c = _catalogue(int(Catalogue.sizeof(dfs[0]) * 1.5))
+    c.add(dfs[0], name="pinned", pin=True)
+    c.add(dfs[1], name="df1")
+    c.add(dfs[2], name="df2")
+    assert set(c.names.keys()) == {"pinned", "df2"}
+
+
+def test_session_catalogue_conf(std_maeve_init_kwargs):
+    s = Session(conf=json.dumps({"env": {"catalogue": {"memory_budget": "1GB", "eviction_policy": "lfu"}}}))
+    assert s.c.conf.memory_budget == 1_000_000_000
+    assert s.c.stats()["eviction_policy"] == "LFUPolicy"
+    assert s.c.names["session_log"].pinned
+
+
+@pytest.mark.parametrize("fmt", ["arrow", "parquet"])
+@pytest.mark.parametrize("memory_map", [True, False])
+def test_evicted_items_spill_and_reload(tmp_path, fmt, memory_map):
+    df = _frames(1)[0]
+    pldf = pl.from_pandas(df)
+    size = Catalogue.sizeof(df) + Catalogue.sizeof(pldf)
+    c = Catalogue(
+        Logger(log_location="catalogue"),
+        CatalogueConf(memory_budget=size, spill_dir=str(tmp_path), spill_format=fmt, spill_memory_map=memory_map)
+    )
+    pandas_id = c.add(df, name="pandas")
+    c.add(pldf, name="polars")
+    c.add({"a": [1, 2, 3]}, name="dict", metadata={"k": "v"})
+    spilled = [i for i in c.obj.values() if i.spill]
+    assert [i.name for i in spilled] == ["pandas"]
+    assert c.obj[pandas_id].obj is None and os.path.exists(c.obj[pandas_id].spill["path"])
+    assert c.memory_used <= size
+
+    # reloading the frame spills the other items
+    reloaded = c.get("pandas", method="name")
+    pd.testing.assert_frame_equal(reloaded, df)
+    assert reloaded["a"].values.flags.writeable is not memory_map or fmt == "parquet"
+    assert c.get("polars", method="name").equals(pldf)
+    assert c.get("dict", method="name") == {"a": [1, 2, 3]}
+    assert c.names["dict"].metadata["k"] == "v"
+    assert c.stats()["reloads"] == 3
+
+    spill_path = c.spill.path
+    for i in list(c.obj.keys()):
+        c.remove(i)
+    assert os.listdir(spill_path) == []
+    c.spill.close()
+    assert not os.path.exists(spill_path)
+
+
+@pytest.fixture
+def pandas_cow():
+    cow = pd.get_option("mode.copy_on_write")
+    pd.set_option("mode.copy_on_write", True)
+    yield
+    pd.set_option("mode.copy_on_write", cow)
+
+
+def test_cow_copy_mode_needs_pandas_cow():
+    cow = pd.get_option("mode.copy_on_write")
+    pd.set_option("mode.copy_on_write", False)
+    try:
+        with pytest.raises(ValueError, match="copy_on_write"):
+            Catalogue(Logger(log_location="catalogue"), CatalogueConf(copy_mode="cow"))
+        assert pd.get_option("mode.copy_on_write") is False
+    finally:
+        pd.set_option("mode.copy_on_write", cow)
+
+
+def test_cow_copy_mode_never_corrupts_original(pandas_cow):
+    c = Catalogue(Logger(log_location="catalogue"), CatalogueConf(copy_mode="cow"))
+    df = _frames(1)[0]
+    expected = df.copy(deep=True)
+    catalogue_id = c.add(df, name="df")
+    # nothing is copied on the way in
+    assert np.shares_memory(c.obj[catalogue_id].obj["a"].values, df["a"].values)
+
+    df.loc[0, "a"] = -1
+    df["b"] = "changed"
+    out = c.get(catalogue_id, method="id")
+    out.loc[1, "a"] = -2
+    out.iloc[2, 0] = -3
+    out.drop(columns=["b"], inplace=True)
+    pd.testing.assert_frame_equal(c.get("df", method="name"), expected)
+
+    pldf = pl.from_pandas(expected)
+    assert c.obj[c.add(pldf)].obj is pldf
+    d = {"a": [1]}
+    assert c.obj[c.add(d)].obj is not d
+
+
+def test_cow_copy_mode_session_cook(std_maeve_init_kwargs, pandas_cow):
+    s = Session(**std_maeve_init_kwargs)
+    s.c.configure(CatalogueConf(copy_mode="cow"))
+    df = s.cook("TestLoadPandasCSVNoPipeline")
+    expected = df.copy(deep=True)
+    df.iloc[0, 0] = None
+    df.rename(columns={df.columns[0]: "renamed"}, inplace=True)
+    again = s.cook("TestLoadPandasCSVNoPipeline")
+    pd.testing.assert_frame_equal(again, expected)
+    again.iloc[:, 0] = None
+    pd.testing.assert_frame_equal(s.c.names["TestLoadPandasCSVNoPipeline"].obj, expected)
+
+
+def test_fingerprints_cached_by_identity(monkeypatch):
+    calls = []
+    exact = lambda: calls.count("exact")
+    hasher, token = Hashers.registry[pd.DataFrame]
+    monkeypatch.setitem(Hashers.registry, pd.DataFrame,
+                        (lambda o, mode, rows: calls.append(mode) or hasher(o, mode, rows), token))
+
+    c = Catalogue(Logger(log_location="catalogue"), CatalogueConf(fingerprint_cache=True))
+    df = _frames(1, rows=10_000)[0]
+    h = c.generate_obj_hash(df)
+    assert c.generate_obj_hash(df) == h and exact() == 1
+    assert c.generate_obj_hash(df.copy()) == h and exact() == 2
+    c.add(df, name="df")
+    assert c.get(df, method="obj") is c.names["df"].obj and exact() == 2
+    df["c"] = 1
+    assert c.generate_obj_hash(df) != h and exact() == 3
+
+    # edits the token doesn't see need the entry to be forgotten
+    h = c.generate_obj_hash(df)
+    df.iloc[500, 0] = -1
+    assert c.generate_obj_hash(df) == h
+    c.fingerprints.forget(df)
+    assert c.generate_obj_hash(df) != h
+    del df
+    assert len(c.fingerprints) == 0
+
+
+def test_fingerprints_not_cached_by_default():
+    c = Catalogue(Logger(log_location="catalogue"))
+    df = _frames(1, rows=10_000)[0]
+    h = c.generate_obj_hash(df)
+    df.iloc[500, 0] = -1
+    assert c.generate_obj_hash(df) != h
+    assert len(c.fingerprints) == 0
+
+
+def test_sampled_fingerprints():
+    c = Catalogue(Logger(log_location="catalogue"), CatalogueConf(fingerprint_sample_rows=100))
+    df = _frames(1, rows=10_000)[0]
+    exact = c.generate_obj_hash(df)
+    sampled = c.generate_obj_hash(df, fingerprint="sampled")
+    assert sampled != exact and sampled.startswith("sampled-")
+    assert c.generate_obj_hash(df.copy(), fingerprint="sampled") == sampled
+    changed = df.copy()
+    changed.iloc[0, 0] = -1
+    assert c.generate_obj_hash(changed, fingerprint="sampled") != sampled
+    # rows between the samples aren't looked at
+    changed = df.copy()
+    changed.iloc[1, 0] = -1
+    assert c.generate_obj_hash(changed, fingerprint="sampled") == sampled
+
+    c.add(df, name="df", fingerprint="sampled")
+    assert c.get(df, method="obj", fingerprint="sampled") is c.names["df"].obj
+
+
+@pytest.mark.parametrize("make", [
+    lambda v: pl.DataFrame({"a": v, "b": [str(i) for i in v]}),
+    lambda v: pl.Series("a", v),
+    lambda v: pd.Series(v, name="a"),
+    lambda v: np.array(v),
+    lambda v: np.array([str(i) for i in v], dtype=object),
+    lambda v: pa.table({"a": v}),
+    lambda v: pa.chunked_array([v[:500], v[500:]]),
+])
+def test_native_hashers(make):
+    c = Catalogue(Logger(log_location="catalogue"))
+    values = list(range(1000))
+    changed = values.copy()
+    changed[500] = -1
+    h = c.generate_obj_hash(make(values))
+    # the repr of these is the same since it only shows the first and last values
+    assert c.generate_obj_hash(make(changed)) != h
+    assert c.generate_obj_hash(make(list(values))) == h
+    assert c.generate_obj_hash(make(values), fingerprint="sampled").startswith("sampled-")
+
+
+@pytest.mark.parametrize("fingerprint", ["exact", "sampled"])
+def test_unhashable_values_hashed_from_str(fingerprint):
+    c = Catalogue(Logger(log_location="catalogue"), CatalogueConf(fingerprint=fingerprint))
+    for obj in [pd.Series([[1, 2], [3]]), pd.DataFrame({"a": [[1, 2], [3]]}), np.array([[1, 2], [3]], dtype=object)]:
+        h = c.generate_obj_hash(obj)
+        assert h == c.generate_obj_hash(obj.copy())
+        assert c.get(c.add(obj), method="id") is not None
+
+
+def test_frame_fingerprints_include_column_names():
+    c = Catalogue(Logger(log_location="catalogue"))
+    df = _frames(1)[0]
+    assert c.generate_obj_hash(df) != c.generate_obj_hash(df.rename(columns={"a": "renamed"}))
+
+
+def test_register_hasher(monkeypatch):
+    class Thing:
+        def __init__(self, v):
+            self.v = v
+
+    class SubThing(Thing):
+        pass
+
+    monkeypatch.setattr(Hashers, "registry", dict(Hashers.registry))
+    register_hasher(Thing, lambda obj, mode, rows: f"{mode}-{obj.v}")
+    c = Catalogue(Logger(log_location="catalogue"))
+    assert c.generate_obj_hash(SubThing(1)) == "exact-1"
+    c.add(Thing(2), name="thing")
+    assert c.get(Thing(2), method="obj").v == 2
+
+
+def test_result_cache_across_sessions(tmp_path, monkeypatch, tmp_recipes_conf):
+    data = tmp_path / "data.csv"
+    pd.DataFrame({"a": range(10), "b": [f"x{i}" for i in range(10)]}).to_csv(data, index=False)
+    conf = tmp_recipes_conf(
+        {"Load": {"recipe_type": "data_loader", "backend": "pandas", "function": "read_csv", "location": str(data)}},
+        catalogue={"result_cache_dir": str(tmp_path / "results"), "result_cache_max_bytes": "1MB"}
+    )
+
+    df = Session(conf=conf).cook("Load")
+    assert len(Session(conf=conf).c.results) == 1
+
+    def read_csv(*args, **kwargs):
+        raise AssertionError("result cache not used")
+    monkeypatch.setattr(pd, "read_csv", read_csv)
+    s = Session(conf=conf)
+    pd.testing.assert_frame_equal(s.cook("Load"), df)
+    assert s.c.names["Load"].obj is not None
+
+    # changing the input misses the cache
+    os.utime(data, ns=(0, os.stat(data).st_mtime_ns + 1_000_000_000))
+    with pytest.raises(RuntimeError, match="result cache not used"):
+        Session(conf=conf).cook("Load")
+
+
+def test_result_cache_lru_cleanup(tmp_path):
+    inputs = []
+    for i in range(3):
+        f = tmp_path / f"{i}.txt"
+        f.write_text(str(i))
+        inputs.append(str(f))
+    rc = ResultCache(str(tmp_path / "results"))
+    keys = [rc.key("recipe", [f]) for f in inputs]
+    assert rc.key("recipe", inputs[:1]) == keys[0] != rc.key("other", inputs[:1])
+    for k, df in zip(keys, _frames(3)):
+        rc.put(k, df)
+    for n, k in enumerate(keys):
+        os.utime(rc._meta_path(k), ns=(0, n * 1_000_000_000))
+    assert rc.get(keys[0]) is not None  # now the most recently used
+    assert rc.get("missing") is None
+
+    rc.cleanup(max_bytes=rc.size() - 1)
+    assert rc.get(keys[1]) is None
+    assert rc.get(keys[0]) is not None and rc.get(keys[2]) is not None
+
+
+def test_result_cache_failures_dont_fail_cook(tmp_path, monkeypatch, std_maeve_init_kwargs):
+    s = Session(**std_maeve_init_kwargs)
+    s.c.configure(CatalogueConf(result_cache_dir=str(tmp_path / "results")))
+
+    def put(*args, **kwargs):
+        raise OSError("No space left on device")
+    with monkeypatch.context() as m:
+        m.setattr(ResultCache, "put", put)
+        assert len(s.cook("TestLoadPart0")) == 3
+
+    # unreadable entries are dropped
+    rc = ResultCache(str(tmp_path / "results"))
+    rc.put("corrupt", {"a": 1})
+    (tmp_path / "results" / "corrupt.pickle").write_bytes(b"not a pickle")
+    assert rc.get("corrupt") is None
+    assert len(rc) == 0
+
+
+def test_cook_uses_recipe_hash_from_resolution(std_maeve_init_kwargs, monkeypatch):
+    s = Session(**std_maeve_init_kwargs)
+    columns = s.cook("TestSpotifyColumnsMin")
+    hashes = []
+    generate_obj_hash = s.c.generate_obj_hash
+    monkeypatch.setattr(s.c, "generate_obj_hash", lambda o, **kw: hashes.append(o) or generate_obj_hash(o, **kw))
+    assert s.cook("TestSpotifyColumnsMin") == columns
+    assert s.c.stats()["hits"] == 1 and not hashes
+
+    # recipes holding slices and dates can be catalogued
+    recipe = {"recipe_type": "dict", "value": {"rows": slice(1, 2)}, "at": date(2024, 1, 1)}
+    s.cook(recipe)
+    assert s.cook(recipe) == {"rows": slice(1, 2)}
+    assert s.c.stats()["hits"] == 2
+
+
+def test_concurrent_cooks_load_each_recipe_once(std_maeve_init_kwargs, monkeypatch):
+    s = Session(**std_maeve_init_kwargs)
+
+    loads = []
+    lock = threading.Lock()
+    read_csv = pd.read_csv
+
+    def slow_read_csv(*args, **kwargs):
+        with lock:
+            loads.append(args[0])
+        time.sleep(0.01)
+        return read_csv(*args, **kwargs)
+    monkeypatch.setattr(pd, "read_csv", slow_read_csv)
+
+    names = [f"TestLoadPart{i % 8}" for i in range(200)]
+    with ThreadPoolExecutor(8) as pool:
+        dfs = list(pool.map(s.cook, names))
+
+    assert sorted(os.path.basename(f) for f in loads) == [f"part_{i}.csv" for i in range(8)]
+    assert all(df["i"].iloc[0] == int(n[-1]) for n, df in zip(names, dfs))
+    assert len(s.c.obj) == 9  # the 8 recipes plus the session log
+    assert s.c.flights.in_flight() == 0
+    # nothing is left mid-resolution, which would show up as spurious anchor cycles
+    s.recipes.clear_cache()
+    assert all(s.recipes.get(n)["location"]["path"].endswith(".csv") for n in dict.fromkeys(names))
+
+
+def test_catalogue_query_and_summary():
+    c = _catalogue(None)
+    small, large = _frames(2, rows=10)[0], _frames(1, rows=100_000)[0]
+    old = c.add(small, name="loader_small", metadata={"source": "data_loader", "created": datetime(2020, 1, 1)})
+    new = c.add(large, name="loader_large", metadata={"source": "data_loader"}, lineage=["Base", "Large"])
+    other = c.add({"a": 1}, name="other", metadata={"source": "dict"})
+
+    ids = lambda items: [i.id for i in items]
+    assert ids(c.query(name_prefix="loader")) == [old, new]
+    assert ids(c.query(source="data_loader", created_after=timedelta(hours=1))) == [new]
+    assert ids(c.query(obj_type="DataFrame", min_size="100KB")) == [new]
+    assert ids(c.query(obj_type=dict)) == [other]
+    assert ids(c.query(lineage="Base")) == [new]
+    assert ids(c.query(created_before=datetime(2021, 1, 1), max_size=10**9)) == [old]
+
+    c.remove(new)
+    assert c.query(lineage="Base") == [] and c.query(min_size="100KB") == []
+
+    summary = c.summary()
+    assert list(summary["id"]) == [old, other]
+    assert summary["size"].iloc[0] == c.obj[old].size and summary["in_memory"].all()
+
+
+def test_lazy_cook(std_maeve_init_kwargs, monkeypatch):
+    s = Session(**std_maeve_init_kwargs)
+    loads = []
+    read_csv = pd.read_csv
+    monkeypatch.setattr(pd, "read_csv", lambda *a, **kw: loads.append(a[0]) or read_csv(*a, **kw))
+
+    handle, unused = s.cook("TestLoadPart0", lazy=True), s.cook("TestLoadMissingPart", lazy=True)
+    assert isinstance(handle, LazyHandle) and not loads
+    assert s.cook("TestLoadPart0", lazy=True) is handle
+    assert [i.obj for i in s.c.query(obj_type=LazyHandle)] == [handle, unused]
+
+    # mv accessor functions see the loaded frame
+    assert list(handle.mv.unspace_colnames().columns) == ["i", "part_name"]
+    assert len(handle) == 3 and handle.materialized and len(loads) == 1
+    assert [i.name for i in s.c.query(obj_type=LazyHandle)] == ["TestLoadMissingPart"]
+    assert type(s.cook("TestLoadPart0")) is pd.DataFrame
+    assert len(loads) == 1
+
+    handle = s.cook("TestLoadPart0", lazy=True, use_from_catalogue=False)
+    stage = s.cook({"recipe_type": "function", "function": "head", "args": [2]}, obj=handle)
+    assert type(stage) is pd.DataFrame and len(stage) == 2
@@ -0,0 +1,36 @@
+import pandas as pd
+from tests.global_fixtures import std_maeve_init_kwargs
+from maeve import Session
+
+
+def test_compile(std_maeve_init_kwargs):
+    s = Session(**std_maeve_init_kwargs)
+    df = s.cook("TestLoaderPandasCSV")
+    df["new col"] = "Y"
+    recipe = {"recipe_type": "pipeline", "pipeline": [
+        "TestSimplePipelineNoLoaderPandas",
+        {"function": "unspace_colnames"},
+        {"function": "from_dict", "args": [{"a": [1]}]},
+        {"function": "split", "namespace": "a,b", "args": [","]}
+    ]}
+    plan = s.compile(recipe)
+    assert len(plan) == 4 and len(plan.steps[0].steps) == 2
+    assert plan(df) == s.cook(recipe, obj=df) == ["a", "b"]
+
+    plan = s.compile({"recipe_type": "pipeline", "pipeline": recipe["pipeline"][:2]})
+    for _ in range(2):
+        out = plan(df)
+        assert out.equals(s.cook({"recipe_type": "pipeline", "pipeline": recipe["pipeline"][:2]}, obj=df))
+        assert "new_col" in out.columns and (out["released_year"] == 2023).all()
+
+    # with no obj the loader is cooked via the catalogue
+    plan = s.compile("TestSimplePipelineWithLoaderPandasMvFunc")
+    assert plan().equals(s.cook("TestSimplePipelineWithLoaderPandasMvFunc"))
+
+
+def test_compile_named_stage_added_to_catalogue(std_maeve_init_kwargs):
+    s = Session(**std_maeve_init_kwargs)
+    plan = s.compile("TestPipelineNamedStageToCatalogue")
+    out = plan(pd.DataFrame({"a b": [1]}))
+    assert list(out.columns) == ["a_b"]
+    assert "TestFunctionUnspaceToCatalogue" in s.c.names
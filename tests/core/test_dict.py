@@ -0,0 +1,50 @@
+import random
+from copy import deepcopy
+
+import pytest
+from maeve.util.dict import DictUtils
+
+KEYS = ["a", "b", "c", "d", "order_by", "override_keys", "_mode"]
+
+
+def random_value(rng, depth):
+    r = rng.random()
+    if depth > 0 and r < 0.35:
+        return random_dict(rng, depth - 1)
+    if r < 0.55:
+        return [random_value(rng, 0) if rng.random() < 0.8 else random_dict(rng, 0) for _ in range(rng.randint(0, 3))]
+    if r < 0.75:
+        return rng.randint(0, 3)
+    return rng.choice(["x", "y", "z"])
+
+
+def random_dict(rng, depth):
+    d = {}
+    for _ in range(rng.randint(0, 5)):
+        k = rng.choice(KEYS)
+        if k == "_mode":
+            d[k] = rng.choice(["override", "merge"])
+        elif k == "override_keys":
+            d[k] = rng.choice([rng.sample(KEYS[:4], rng.randint(0, 2)), rng.choice(KEYS[:4])])
+        else:
+            d[k] = random_value(rng, depth)
+    return d
+
+
+@pytest.mark.parametrize("seed", range(500))
+def test_merge_shared_matches_mergedicts(seed):
+    rng = random.Random(seed)
+    a, b = random_dict(rng, 3), random_dict(rng, 3)
+    a_before, b_before = deepcopy(a), deepcopy(b)
+    shared = DictUtils.merge_shared(a, b)
+    assert a == a_before and b == b_before
+    assert shared == DictUtils.mergedicts(a, b)
+
+
+def test_merge_shared_copies_only_modified_paths():
+    a = {"x": {"big": list(range(10))}, "y": {"z": 1}}
+    b = {"y": {"z": 2}, "w": {"v": 1}}
+    merged = DictUtils.merge_shared(a, b)
+    assert merged["x"] is a["x"]
+    assert merged["w"] is b["w"]
+    assert merged["y"] is not a["y"] and merged["y"] == {"z": 2}
@@ -0,0 +1,51 @@
+import threading
+
+import pandas as pd
+from tests.global_fixtures import std_maeve_init_kwargs
+from maeve import Session
+
+
+def test_plan_dependencies(std_maeve_init_kwargs):
+    s = Session(**std_maeve_init_kwargs)
+    plan = s.plan("TestLoadPandasRecipeNameInPipeline")
+    names = [[plan.nodes[k].name for k in level] for level in plan.levels()]
+    assert names == [[None], ["TestLoadPandasCSVNoPipeline"], ["TestLoadPandasRecipeNameInPipeline"]]
+    assert plan.nodes[plan.levels()[0][0]].recipe["recipe_type"] == "data_loader"
+
+
+def test_prefetch_runs_independent_loaders_concurrently(std_maeve_init_kwargs, monkeypatch):
+    s = Session(**std_maeve_init_kwargs)
+    names = [f"TestLoadPart{i}" for i in range(8)]
+
+    loads = []
+    read_csv = pd.read_csv
+    # only passed if all 8 loads are running at once
+    overlap = threading.Barrier(8)
+
+    def overlapping_read_csv(*args, **kwargs):
+        loads.append(args[0])
+        overlap.wait(10)
+        return read_csv(*args, **kwargs)
+    monkeypatch.setattr(pd, "read_csv", overlapping_read_csv)
+
+    plan = s.prefetch(names, workers=8)
+    assert len(plan) == 8 and len(loads) == 8
+    assert s.cook("TestLoadPart3")["i"].iloc[0] == 3 and len(loads) == 8
+
+    # the concat loader's files are its dependencies
+    monkeypatch.setattr(pd, "read_csv", lambda *a, **kw: loads.append(a[0]) or read_csv(*a, **kw))
+    assert len(s.plan("TestLoadPartsConcat").levels()) == 2
+    df = s.cook("TestLoadPartsConcat", parallel=True)
+    assert sorted(df["i"].unique()) == list(range(8)) and len(loads) == 16
+
+    # cooked without prefetching, the files' frames aren't kept
+    s = Session(**std_maeve_init_kwargs)
+    assert len(s.cook("TestLoadPartsConcat")) == 24
+    assert sorted(i.name for i in s.c.obj.values()) == ["TestLoadPartsConcat", "session_log"]
+
+
+def test_prefetch_in_processes(std_maeve_init_kwargs):
+    s = Session(**std_maeve_init_kwargs)
+    s.prefetch(["TestLoadPart0", "TestLoadPart1"], workers=2, executor="process")
+    assert sorted(s.c.names.keys()) == ["TestLoadPart0", "TestLoadPart1", "session_log"]
+    assert s.c.stats()["misses"] == 0 and s.cook("TestLoadPart1")["i"].iloc[0] == 1
@@ -0,0 +1,40 @@
+import json
+
+import pytest
+from maeve import Session
+
+
+def test_get_plugin_caches(tmp_path, monkeypatch):
+    import importlib
+    s = Session(conf=json.dumps({"env": {}}))
+    mod, method = s.plugins.get_plugin("data_loader")
+    assert s.plugins.get_plugin("data_loader")[0] is mod and method == "main"
+    assert s.plugins.get_plugin("data_loader", {"class_kwargs": {}})[0] is mod
+
+    # plugins that aren't stateless get a new instance every time
+    (tmp_path / "statefulplug.py").write_text(
+        "class statefulplug:\n"
+        "    def __init__(self, session, n=0):\n"
+        "        self.n = n\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    a, _ = s.plugins.get_plugin("statefulplug", {"class_kwargs": {"n": 1}})
+    b, _ = s.plugins.get_plugin("statefulplug", {"class_kwargs": {"n": 1}})
+    assert a is not b and a.n == b.n == 1
+
+    imports = []
+    import_module = importlib.import_module
+
+    def counting_import(name, *args, **kwargs):
+        imports.append(name)
+        return import_module(name, *args, **kwargs)
+    monkeypatch.setattr(importlib, "import_module", counting_import)
+    for _ in range(3):
+        with pytest.raises(ValueError, match="No plugin found"):
+            s.plugins.get_plugin("missingplug")
+        s.plugins.get_plugin("statefulplug")
+    assert imports == ["missingplug"]
+
+    (tmp_path / "missingplug.py").write_text("class missingplug:\n    def __init__(self, session):\n        pass\n")
+    s.plugins.clear_cache()
+    assert type(s.plugins.get_plugin("missingplug")[0]).__name__ == "missingplug"
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import threading
+
+import pandas as pd
+from tests.global_fixtures import std_maeve_init_kwargs
+from maeve import Session
+from maeve.planner import CookError, ListExecutor
+
+
+def test_acook_awaits_async_plugins_once(tmp_path, monkeypatch):
+    (tmp_path / "asyncplug.py").write_text(
+        "import asyncio\n"
+        "calls = []\n"
+        "class asyncplug:\n"
+        "    def __init__(self, session):\n"
+        "        self.s = session\n"
+        "    async def amain(self, recipe, obj=None):\n"
+        "        calls.append(recipe['n'])\n"
+        "        await asyncio.sleep(0.05)\n"
+        "        return [recipe['n']]\n"
+        "    main = amain\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    import asyncplug
+    s = Session(conf=json.dumps({"env": {}}))
+    recipe = {"recipe_type": "asyncplug", "n": 1}
+
+    async def main():
+        return await asyncio.gather(*[s.acook(recipe) for _ in range(5)], s.acook({**recipe, "n": 2}))
+
+    results = asyncio.run(main())
+    assert results == [[1]] * 5 + [[2]]
+    assert sorted(asyncplug.calls) == [1, 2]
+    # from the catalogue this time
+    assert asyncio.run(s.acook(recipe)) == [1] and len(asyncplug.calls) == 2
+    # sync cooks of async plugins run the coroutine
+    assert s.cook({**recipe, "n": 3}) == [3]
+
+    async def from_running_loop():
+        # e.g. in a Jupyter cell
+        return s.cook({**recipe, "n": 4})
+    assert asyncio.run(from_running_loop()) == [4]
+
+
+def test_acook_many_offloads_sync_loaders(std_maeve_init_kwargs, monkeypatch):
+    s = Session(**std_maeve_init_kwargs)
+
+    loads = []
+    read_csv = pd.read_csv
+    # only passed if all 4 loads are running at once
+    overlap = threading.Barrier(4)
+
+    def overlapping_read_csv(*args, **kwargs):
+        loads.append(args[0])
+        overlap.wait(10)
+        return read_csv(*args, **kwargs)
+    monkeypatch.setattr(pd, "read_csv", overlapping_read_csv)
+
+    dfs = asyncio.run(s.acook_many([f"TestLoadPart{i}" for i in range(4)] + ["TestLoadPart0"]))
+    assert [df["i"].iloc[0] for df in dfs] == [0, 1, 2, 3, 0] and len(loads) == 4
+
+    # DataLoader.aload cooks the files concurrently, without keeping their frames
+    monkeypatch.setattr(pd, "read_csv", lambda *a, **kw: loads.append(a[0]) or read_csv(*a, **kw))
+    df = asyncio.run(s.acook("TestLoadPartsConcat"))
+    assert sorted(df["i"].unique()) == list(range(8)) and len(loads) == 12
+    assert len(s.c.obj) == 6  # the 4 loads, the concat and the session log
+
+    results = asyncio.run(s.acook_many(["TestLoadPart1", "Missing"], return_exceptions=True))
+    assert results[0]["i"].iloc[0] == 1 and isinstance(results[1], Exception)
+
+
+def test_cook_list_in_parallel(std_maeve_init_kwargs, monkeypatch):
+    s = Session(**std_maeve_init_kwargs)
+
+    read_csv = pd.read_csv
+    # only passed if the other 7 loads are all running at once
+    overlap = threading.Barrier(7)
+    release = threading.Event()
+
+    def blocking_read_csv(*args, **kwargs):
+        if args[0].endswith("part_7.csv"):
+            release.wait(10)
+        else:
+            overlap.wait(10)
+        return read_csv(*args, **kwargs)
+    monkeypatch.setattr(pd, "read_csv", blocking_read_csv)
+
+    try:
+        results = s.cook([f"TestLoadPart{i}" for i in range(7)] + ["Missing", "TestLoadPart7"],
+                         list_mode="parallel", workers=9, timeout=2)
+    finally:
+        release.set()
+    assert [df["i"].iloc[0] for df in results[:7]] == list(range(7))
+    assert isinstance(results[7], CookError) and results[7].index == 7 and not results[7].timed_out
+    assert isinstance(results[8], CookError) and results[8].timed_out and results[8].recipe == "TestLoadPart7"
+
+    # in sequence failures are left out
+    monkeypatch.setattr(pd, "read_csv", read_csv)
+    assert len(s.cook(["TestLoadPart0", "Missing"])) == 1
+
+
+def test_cook_list_auto_executor(std_maeve_init_kwargs):
+    s = Session(**std_maeve_init_kwargs)
+    split = {"recipe_type": "function", "namespace": "a,b", "function": "split", "args": [","]}
+    df, parts = s.cook(["TestLoadPart0", split], list_mode="parallel", workers=2)
+    assert df["i"].iloc[0] == 0 and parts == ["a", "b"]
+    # cooked in a worker process and then catalogued here
+    assert s.cook(split) == parts and s.c.stats()["hits"] == 1
+
+    # recipes given an obj aren't sent to processes
+    head = {"recipe_type": "function", "function": "head", "args": [1]}
+    assert ListExecutor(s)._executor_for(head, with_obj=True) == "thread"
+    assert len(s.cook([head], list_mode="parallel", obj=df)[0]) == 1
+
+
+def test_cook_list_as_pipeline(std_maeve_init_kwargs):
+    s = Session(**std_maeve_init_kwargs)
+    df = s.cook(["TestLoaderPandasCSV", "TestFunctionRename"], list_mode="pipeline")
+    assert "dummy" in df.columns
+
+
+def test_cook_list_in_processes_with_overrides(std_maeve_init_kwargs):
+    s = Session(**std_maeve_init_kwargs)
+    in_processes = {"list_mode": "parallel", "executor": "process"}
+    assert s.cook(["TestFunctionSplit"], overrides={"namespace": "x,y"}, **in_processes) == [["x", "y"]]
+    assert s.cook("TestFunctionSplit") == ["a", "b", "c"]
+    assert s.cook(["TestFunctionSplit"], merge={"kwargs": {"maxsplit": 1}}, **in_processes) == [["a", "b,c"]]
+    assert s.cook("TestFunctionSplit") == ["a", "b", "c"]
@@ -34,6 +34,19 @@ def std_maeve_init_kwargs():
         "log_location": "stdout"
     }
 
+@pytest.fixture
+def tmp_recipes_conf(tmp_path):
+    """
+    For tests that need recipes of their own, e.g. to change them. Returns a function that
+    writes recipes to tmp_path/recipes/recipes.hjson and returns a session conf using them.
+    """
+    def write(recipes: dict, **env) -> str:
+        root = tmp_path / "recipes"
+        root.mkdir(exist_ok=True)
+        (root / "recipes.hjson").write_text(json.dumps(recipes))
+        return json.dumps({"env": {"recipes_root": str(root), **env}})
+    return write
+
 @pytest.fixture
 def test_recipe_path():
     return test_recipe_path_
@@ -47,4 +60,5 @@ pytest_plugins = [
     "std_maeve_init_kwargs",
     "test_recipe_path",
     "test_data_path",
+    "tmp_recipes_conf",
 ]